@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+# Los ajustes se cargan mientras se importa este módulo, lo que les indica que se ejecutan bajo ASGI
+# (ver CONN_MAX_AGE en settings)
 
 application = get_asgi_application()
@@ -0,0 +1,172 @@
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuración de la instrumentación (INSTRUMENTATION en settings) con sus valores por defecto
+def get_instrumentation_settings():
+    config = {
+        'ENABLED': True,
+        'SAMPLE_RATE': 0.1,
+        'SERVER_TIMING': True,
+        'DUPLICATE_QUERY_THRESHOLD': 5,
+        'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+        'METRICS_TOKEN': '',
+        'METRICS_ALLOWED_IPS': [],
+    }
+    config.update(getattr(settings, 'INSTRUMENTATION', {}))
+    return config
+
+
+# Registra las consultas SQL de una solicitud (se instala con connection.execute_wrapper):
+# número, tiempo total y repeticiones de cada sentencia para detectar patrones N+1
+class QueryCollector:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    # Sentencias ejecutadas al menos 'threshold' veces: [(sql, veces)]
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+# Avisa en el log de las sentencias repetidas de una solicitud
+def warn_duplicates(view, duplicates):
+    for sql, count in duplicates:
+        logger.warning('Duplicate query in %s (%d times): %s', view, count, sql)
+
+
+# Histograma acumulativo con límites fijos, en el formato de Prometheus
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Métricas de las solicitudes en este proceso. Todas las solicitudes cuentan en el total y en el
+# histograma de latencia; las consultas, el tiempo de SQL y de renderizado, el tamaño de la
+# respuesta y las consultas duplicadas solo se miden en las solicitudes muestreadas.
+_requests = Counter()
+_histograms = {}
+_sampled = Counter()
+_lock = threading.Lock()
+
+# Métricas de las solicitudes muestreadas: (nombre en Prometheus, descripción)
+SAMPLED_METRICS = {
+    'sampled_requests': ('api_sampled_requests_total', 'Sampled requests per view'),
+    'sql_queries': ('api_sql_queries_total', 'SQL queries executed by sampled requests'),
+    'sql_seconds': ('api_sql_duration_seconds_total', 'Time spent in SQL by sampled requests'),
+    'render_seconds': ('api_render_duration_seconds_total', 'Time spent rendering (serializing) sampled responses'),
+    'response_bytes': ('api_response_bytes_total', 'Size of sampled non-streaming responses'),
+    'duplicate_queries': ('api_duplicate_queries_total', 'Repeated SQL statements above the threshold in sampled requests'),
+}
+
+
+def record_request(view, method, status_code, duration, buckets):
+    with _lock:
+        _requests[(view, method, str(status_code))] += 1
+        if view not in _histograms:
+            _histograms[view] = Histogram(buckets)
+        _histograms[view].observe(duration)
+
+
+def record_sample(view, **values):
+    with _lock:
+        _sampled[('sampled_requests', view)] += 1
+        for name, value in values.items():
+            _sampled[(name, view)] += value
+
+
+def reset_metrics():
+    with _lock:
+        _requests.clear()
+        _histograms.clear()
+        _sampled.clear()
+
+
+# Devuelve una copia de las métricas de las solicitudes muestreadas: {view: {métrica: valor}}
+def get_sampled_metrics():
+    with _lock:
+        metrics = {}
+        for (name, view), value in _sampled.items():
+            metrics.setdefault(view, {})[name] = value
+        return metrics
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+# Genera las métricas en el formato de texto de Prometheus
+def render_metrics():
+    with _lock:
+        requests = sorted(_requests.items())
+        histograms = sorted((view, histogram.buckets, list(histogram.counts), histogram.sum, histogram.count) for view, histogram in _histograms.items())
+        sampled = sorted(_sampled.items())
+
+    lines = [
+        '# HELP api_requests_total Requests per view, method and status',
+        '# TYPE api_requests_total counter',
+    ]
+    for (view, method, status_code), value in requests:
+        lines.append(f'api_requests_total{_labels(view=view, method=method, status=status_code)} {value}')
+
+    lines += [
+        '# HELP api_request_duration_seconds Wall time per view',
+        '# TYPE api_request_duration_seconds histogram',
+    ]
+    for view, buckets, counts, total, count in histograms:
+        cumulative = 0
+        for bound, bucket_count in zip([*buckets, '+Inf'], counts):
+            cumulative += bucket_count
+            lines.append(f'api_request_duration_seconds_bucket{_labels(view=view, le=bound)} {cumulative}')
+        lines.append(f'api_request_duration_seconds_sum{_labels(view=view)} {total}')
+        lines.append(f'api_request_duration_seconds_count{_labels(view=view)} {count}')
+
+    for name, (metric, description) in SAMPLED_METRICS.items():
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+        for (sample_name, view), value in sampled:
+            if sample_name == name:
+                lines.append(f'{metric}{_labels(view=view)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+# Vista con las métricas para Prometheus. Exige la cabecera 'Authorization: Bearer <METRICS_TOKEN>'
+# o una solicitud desde una de las direcciones de METRICS_ALLOWED_IPS: sin ninguno de los dos
+# configurado, el endpoint no es accesible.
+def metrics_view(request):
+    config = get_instrumentation_settings()
+    token = config['METRICS_TOKEN']
+    authorized = bool(token) and hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    if not authorized and request.META.get('REMOTE_ADDR') not in config['METRICS_ALLOWED_IPS']:
+        return HttpResponseForbidden()
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
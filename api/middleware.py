@@ -0,0 +1,404 @@
+import random
+import time
+import zlib
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from .routers import SAFE_METHODS, get_replicas, mark_sticky, set_current_request
+from .instrumentation import QueryCollector, get_instrumentation_settings, record_request, record_sample, warn_duplicates
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compresor incremental gzip: compress() devuelve lo que zlib ya tiene listo y finish() el resto
+class GzipCompressor:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+# Codificaciones disponibles en este entorno: brotli y zstd solo si sus paquetes están instalados
+COMPRESSORS = {'gzip': GzipCompressor}
+if brotli is not None:
+    COMPRESSORS['br'] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = ZstdCompressor
+
+
+# Niveles por defecto: rápidos para respuestas generadas en cada solicitud
+DEFAULT_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+
+
+# Configuración de la compresión (RESPONSE_COMPRESSION en settings) con sus valores por defecto
+def get_compression_settings():
+    config = {
+        'ENCODINGS': ['zstd', 'br', 'gzip'],
+        'MIN_SIZE': 1024,
+        'CONTENT_TYPES': ['application/json', 'application/x-ndjson', 'text/csv'],
+    }
+    config.update(getattr(settings, 'RESPONSE_COMPRESSION', {}))
+    config['LEVELS'] = {**DEFAULT_LEVELS, **config.get('LEVELS', {})}
+    return config
+
+
+# Elige la codificación a partir de Accept-Encoding: la de mayor peso (q) entre las aceptadas por
+# el cliente y disponibles, y a igual peso la primera de 'encodings' (preferencia del servidor).
+# Devuelve None si el cliente no acepta ninguna.
+def choose_encoding(accept_encoding, encodings):
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip().lower()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best = None
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+
+    return best[0] if best else None
+
+
+# Tamaño mínimo de los bloques que se pasan al compresor en las respuestas en streaming
+STREAM_BUFFER_SIZE = 16 * 1024
+
+
+# Comprime un iterador de fragmentos de forma incremental. Los fragmentos pequeños (por ejemplo las
+# líneas de la exportación NDJSON) se agrupan en bloques de STREAM_BUFFER_SIZE bytes antes de
+# comprimirlos, ya que algunos compresores (brotli en niveles bajos) emiten un bloque por llamada y
+# apenas comprimen fragmentos sueltos; nunca se acumula más de un bloque de la respuesta.
+def compress_sequence(chunks, compressor):
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= STREAM_BUFFER_SIZE:
+            data = compressor.compress(b''.join(buffer))
+            buffer, buffered = [], 0
+            if data:
+                yield data
+    yield compressor.compress(b''.join(buffer)) + compressor.finish()
+
+
+async def acompress_sequence(chunks, compressor):
+    buffer = []
+    buffered = 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= STREAM_BUFFER_SIZE:
+            data = compressor.compress(b''.join(buffer))
+            buffer, buffered = [], 0
+            if data:
+                yield data
+    yield compressor.compress(b''.join(buffer)) + compressor.finish()
+
+
+# Middleware de compresión de respuestas con gzip, brotli o zstd según Accept-Encoding.
+# Solo comprime los tipos de contenido permitidos y, salvo las respuestas en streaming (que se
+# comprimen fragmento a fragmento), las que superan el tamaño mínimo.
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        config = get_compression_settings()
+
+        if response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in config['CONTENT_TYPES']:
+            return response
+
+        if not response.streaming and len(response.content) < config['MIN_SIZE']:
+            return response
+
+        # La respuesta varía según Accept-Encoding aunque este cliente no pida compresión
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encodings = [encoding for encoding in config['ENCODINGS'] if encoding in COMPRESSORS]
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), encodings)
+        if encoding is None:
+            return response
+
+        compressor = COMPRESSORS[encoding](config['LEVELS'][encoding])
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_sequence(response.streaming_content, compressor)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content, compressor)
+            # El tamaño comprimido no se conoce hasta terminar de transmitir
+            del response.headers['Content-Length']
+        else:
+            content = compressor.compress(response.content) + compressor.finish()
+            # Solo se devuelve el contenido comprimido si es más pequeño
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        # La representación comprimida no es idéntica byte a byte: la ETag fuerte pasa a ser débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+
+        return response
+
+
+# Datos de instrumentación de una solicitud en curso
+class RequestMetrics:
+    def __init__(self, sampled):
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.collector = QueryCollector() if sampled else None
+        self.render_start = None
+        self.render_duration = 0.0
+
+    def stop_render(self, response):
+        self.render_duration = time.perf_counter() - self.render_start
+
+
+# Iteradores sobre los fragmentos de una respuesta en streaming que llaman una sola vez a 'finish'
+# con el número de bytes enviados al terminar de generarlos o al cerrarse la respuesta (Django llama
+# a close() aunque el cuerpo no se llegue a enviar o se interrumpa)
+class FinishAfterSequence:
+    def __init__(self, chunks, finish):
+        self.chunks = iter(chunks)
+        self.finish = finish
+        self.size = 0
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.close()
+            raise
+        self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        if not self.finished:
+            self.finished = True
+            self.finish(self.size)
+
+
+class AsyncFinishAfterSequence:
+    def __init__(self, chunks, finish):
+        self.chunks = aiter(chunks)
+        self.finish = finish
+        self.size = 0
+        self.finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = await anext(self.chunks)
+        except StopAsyncIteration:
+            self.close()
+            raise
+        self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        if not self.finished:
+            self.finished = True
+            self.finish(self.size)
+
+
+# Middleware de instrumentación: registra por vista (nombre de la URL) la duración de cada solicitud
+# y, en una muestra de ellas (SAMPLE_RATE), el número y el tiempo de las consultas SQL, el tiempo de
+# renderizado de la respuesta y su tamaño. En las solicitudes muestreadas añade la cabecera
+# Server-Timing y avisa de las sentencias SQL repetidas (patrones N+1). Debe ser el primer middleware
+# para incluir en la duración el resto de middlewares (por ejemplo la compresión).
+class InstrumentationMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        config = get_instrumentation_settings()
+        if not config['ENABLED']:
+            return None
+
+        request._metrics = metrics = RequestMetrics(random.random() < config['SAMPLE_RATE'])
+        if metrics.sampled:
+            for alias in connections:
+                connections[alias].execute_wrappers.append(metrics.collector)
+        return None
+
+    # Las respuestas de DRF se renderizan (se codifican en JSON) después de la vista
+    def process_template_response(self, request, response):
+        metrics = getattr(request, '_metrics', None)
+        if metrics is not None and metrics.sampled:
+            metrics.render_start = time.perf_counter()
+            response.add_post_render_callback(metrics.stop_render)
+        return response
+
+    def process_response(self, request, response):
+        metrics = getattr(request, '_metrics', None)
+        if metrics is None:
+            return response
+
+        duration = time.perf_counter() - metrics.start
+        config = get_instrumentation_settings()
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+
+        record_request(view, request.method, response.status_code, duration, config['BUCKETS'])
+        if not metrics.sampled:
+            return response
+
+        # Las cabeceras se envían antes que el cuerpo: en streaming solo cubren lo ejecutado hasta aquí
+        collector = metrics.collector
+        if config['SERVER_TIMING']:
+            application = max(duration - collector.duration - metrics.render_duration, 0)
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={collector.duration * 1000:.3f};desc="{collector.count} queries"',
+                f'render;dur={metrics.render_duration * 1000:.3f}',
+                f'app;dur={application * 1000:.3f}',
+                f'total;dur={duration * 1000:.3f}',
+            ])
+
+        def finish(response_bytes):
+            self.finish_sample(view, metrics, config, response_bytes)
+
+        # El cuerpo de una respuesta en streaming (la exportación) ejecuta sus consultas al enviarse:
+        # el colector se mantiene instalado hasta terminar de generarlo
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = AsyncFinishAfterSequence(response.streaming_content, finish)
+            else:
+                response.streaming_content = FinishAfterSequence(response.streaming_content, finish)
+        else:
+            finish(len(response.content))
+
+        return response
+
+    # Retira el colector de consultas de la solicitud y registra su muestra
+    def finish_sample(self, view, metrics, config, response_bytes):
+        collector = metrics.collector
+        for alias in connections:
+            wrappers = connections[alias].execute_wrappers
+            if collector in wrappers:
+                wrappers.remove(collector)
+
+        duplicates = collector.duplicates(config['DUPLICATE_QUERY_THRESHOLD'])
+        warn_duplicates(view, duplicates)
+
+        record_sample(
+            view,
+            sql_queries=collector.count,
+            sql_seconds=collector.duration,
+            render_seconds=metrics.render_duration,
+            response_bytes=response_bytes,
+            duplicate_queries=sum(count for _, count in duplicates)
+        )
+
+
+# Iteradores sobre los fragmentos de una respuesta en streaming que fijan la solicitud para el router
+# mientras se genera cada fragmento: el cuerpo se genera después de process_response, cuando la
+# solicitud ya no está fijada y sus lecturas irían a la base principal
+class RequestBoundSequence:
+    def __init__(self, chunks, request):
+        self.chunks = iter(chunks)
+        self.request = request
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        set_current_request(self.request)
+        try:
+            return next(self.chunks)
+        finally:
+            set_current_request(None)
+
+
+class AsyncRequestBoundSequence:
+    def __init__(self, chunks, request):
+        self.chunks = aiter(chunks)
+        self.request = request
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        set_current_request(self.request)
+        try:
+            return await anext(self.chunks)
+        finally:
+            set_current_request(None)
+
+
+# Middleware de las réplicas de lectura: expone la solicitud en curso al router (api.routers.ReplicaRouter),
+# también mientras se genera el cuerpo de las respuestas en streaming (la exportación), y, tras una
+# solicitud que escribe de un usuario autenticado, dirige sus lecturas a la base principal durante unos
+# segundos (lectura de las propias escrituras)
+class ReplicaMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        set_current_request(request)
+
+    def process_response(self, request, response):
+        set_current_request(None)
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = AsyncRequestBoundSequence(response.streaming_content, request)
+            else:
+                response.streaming_content = RequestBoundSequence(response.streaming_content, request)
+
+        if request.method not in SAFE_METHODS and get_replicas():
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                mark_sticky(user.pk)
+
+        return response
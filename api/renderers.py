@@ -0,0 +1,42 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Opciones de orjson: las fechas y dataclasses se delegan en el codificador de DRF,
+# que las formatea de otra manera (por ejemplo, milisegundos y 'Z' en las fechas)
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson is not None else 0
+
+# Separadores de línea que DRF siempre escapa para que el JSON sea un subconjunto válido de JavaScript
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+# Renderer JSON que codifica con orjson cuando está instalado y produce los mismos bytes que
+# JSONRenderer con la configuración por defecto de DRF (compacto y UTF-8). Sin orjson,
+# con sangría (?indent= o la API navegable) o con valores que orjson no admite (enteros de más
+# de 64 bits, claves que no son cadenas...) usa el codificador de la biblioteca estándar.
+# Solo difieren los float: algunos exponentes ('1e-7' frente a '1e-07') y NaN/Infinity, que orjson
+# codifica como null en lugar de fallar; la API no devuelve valores float.
+class FastJSONRenderer(JSONRenderer):
+    def __init__(self):
+        self.default = self.encoder_class().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
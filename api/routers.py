@@ -0,0 +1,114 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Métodos que solo leen: sus consultas pueden ir a una réplica
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Aplicaciones que siempre se leen de la base principal: la autenticación debe ver de inmediato
+# los usuarios y tokens recién creados (signUp, signIn) aunque la réplica vaya con retraso
+PRIMARY_APP_LABELS = {'auth', 'authtoken', 'sessions', 'contenttypes'}
+
+# Solicitud en curso, fijada por api.middleware.ReplicaMiddleware
+_current_request = ContextVar('replica_request', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+# Backends de caché propios de cada proceso
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+# Caché de la marca de lectura de las propias escrituras. Debe ser compartida por todos los procesos:
+# con una caché local, las lecturas que atiende otro proceso irían a la réplica justo después de
+# una escritura, así que las réplicas no se pueden usar sin ella.
+def _cache():
+    alias = getattr(settings, 'REPLICA_STICKY_CACHE_ALIAS', 'default')
+    cache = caches[alias]
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        raise ImproperlyConfigured(
+            f"Read replicas require REPLICA_STICKY_CACHE_ALIAS to be a cache shared between processes, "
+            f"'{alias}' is {type(cache).__name__}"
+        )
+    return cache
+
+
+def _sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+# Tras una escritura, las lecturas del usuario van a la base principal durante
+# REPLICA_STICKY_SECONDS para que vea sus propios cambios aunque la réplica vaya con retraso
+def mark_sticky(user_id):
+    _cache().set(_sticky_key(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def is_sticky(user_id):
+    return _cache().get(_sticky_key(user_id)) is not None
+
+
+# Fija la solicitud en curso (None al terminar)
+def set_current_request(request):
+    _current_request.set(request)
+
+
+# Base de datos de lectura de una solicitud: la principal para los métodos que escriben y para los
+# usuarios con escrituras recientes, y una réplica elegida al azar para el resto. La elección se
+# guarda en la solicitud una vez autenticado el usuario, para que todas sus lecturas usen la misma réplica.
+def get_read_database(request):
+    database = getattr(request, '_read_database', None)
+    if database is not None:
+        return database
+
+    replicas = get_replicas()
+    if not replicas or request.method not in SAFE_METHODS:
+        return DEFAULT_DB_ALIAS
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return random.choice(replicas)
+
+    request._read_database = DEFAULT_DB_ALIAS if is_sticky(user.pk) else random.choice(replicas)
+    return request._read_database
+
+
+# Router de réplicas de lectura: las escrituras (y las lecturas que preceden a una escritura, como
+# select_for_update o get_or_create) van siempre a la base principal y las lecturas de las solicitudes
+# GET a una réplica, salvo lo indicado en get_read_database. Fuera de una solicitud (comandos de
+# gestión, migraciones, shell) todo va a la base principal.
+class ReplicaRouter:
+    # Con réplicas configuradas, comprueba al arrancar que la caché de la marca es compartida
+    def __init__(self):
+        if get_replicas():
+            _cache()
+
+    def db_for_read(self, model, **hints):
+        request = _current_request.get()
+        if request is None or model._meta.app_label in PRIMARY_APP_LABELS:
+            return DEFAULT_DB_ALIAS
+        return get_read_database(request)
+
+    # Las instancias leídas de una réplica también se guardan en la base principal
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    # Principal y réplicas contienen los mismos datos
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    # Las réplicas reciben los cambios de esquema por replicación
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
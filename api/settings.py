@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import sys
+import tempfile
+from itertools import zip_longest
 from pathlib import Path
 from dotenv import load_dotenv
 from os import environ
@@ -20,6 +23,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Leer las varibales del entorno
 load_dotenv()
 
+# Ejecución bajo un servidor ASGI: los ajustes se cargan al importar api.asgi
+ASGI = 'api.asgi' in sys.modules
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
@@ -41,15 +47,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'users',
     'books_management',
-    'book_search'
+    'book_search',
+    'benchmarks'
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,6 +69,57 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    # Clase de autenticación usada por todas las vistas protegidas por token
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        environ.get('TOKEN_AUTHENTICATION_CLASS', 'users.authentication.CachedTokenAuthentication'),
+    ],
+    # Renderer JSON (orjson si está instalado, con la misma salida que el JSONRenderer de DRF) y API navegable
+    'DEFAULT_RENDERER_CLASSES': [
+        environ.get('JSON_RENDERER_CLASS', 'api.renderers.FastJSONRenderer'),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Compresión de respuestas (api.middleware.CompressionMiddleware): codificaciones por orden de
+# preferencia (brotli y zstd solo si están instalados), nivel de cada una, tamaño mínimo en bytes
+# de las respuestas no transmitidas en streaming y tipos de contenido que se comprimen
+RESPONSE_COMPRESSION = {
+    'ENCODINGS': environ.get('RESPONSE_COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(','),
+    'LEVELS': {
+        'gzip': int(environ.get('RESPONSE_COMPRESSION_GZIP_LEVEL', 6)),
+        'br': int(environ.get('RESPONSE_COMPRESSION_BR_LEVEL', 4)),
+        'zstd': int(environ.get('RESPONSE_COMPRESSION_ZSTD_LEVEL', 3)),
+    },
+    'MIN_SIZE': int(environ.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024)),
+    'CONTENT_TYPES': environ.get('RESPONSE_COMPRESSION_CONTENT_TYPES', 'application/json,application/x-ndjson,text/csv').split(','),
+}
+
+# Instrumentación por vista (api.middleware.InstrumentationMiddleware): fracción de solicitudes
+# muestreadas en las que se miden las consultas SQL y el renderizado, cabecera Server-Timing, número
+# de repeticiones de una misma sentencia SQL a partir del cual se avisa, límites del histograma de
+# latencia en segundos, y token y direcciones que permiten el acceso al endpoint de métricas
+# (/metrics), que sin ninguno de los dos no es accesible
+INSTRUMENTATION = {
+    'ENABLED': environ.get('INSTRUMENTATION_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': float(environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.1)),
+    'SERVER_TIMING': environ.get('INSTRUMENTATION_SERVER_TIMING', 'True') == 'True',
+    'DUPLICATE_QUERY_THRESHOLD': int(environ.get('INSTRUMENTATION_DUPLICATE_QUERY_THRESHOLD', 5)),
+    'BUCKETS': [float(bound) for bound in environ.get('INSTRUMENTATION_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(',')],
+    'METRICS_TOKEN': environ.get('METRICS_TOKEN', ''),
+    'METRICS_ALLOWED_IPS': [address for address in environ.get('METRICS_ALLOWED_IPS', '').split(',') if address],
+}
+
+# Caché de tokens de CachedTokenAuthentication: LRU en memoria del proceso con tiempo de vida, cuyas
+# entradas se validan contra la generación del token en la caché compartida 'token_auth'
+TOKEN_AUTH_CACHE = {
+    'LOCAL_SIZE': int(environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'LOCAL_TTL': int(environ.get('TOKEN_AUTH_CACHE_TTL', 30)),
+}
+
 ROOT_URLCONF = 'api.urls'
 
 TEMPLATES = [
@@ -90,9 +152,86 @@ DATABASES = {
         'PASSWORD': environ.get('PASSWORD'),
         'HOST': environ.get('HOST'),
         'PORT': environ.get('PORT'),
+        # Conexiones persistentes: segundos que se reutiliza una conexión entre solicitudes (0 abre una
+        # conexión por solicitud y None no las cierra nunca). Por defecto 60, o 0 bajo ASGI: las consultas
+        # se ejecutan en hilos distintos del que cierra las conexiones caducadas y se acumularían.
+        'CONN_MAX_AGE': None if environ.get('CONN_MAX_AGE') == 'None' else int(environ.get('CONN_MAX_AGE') or (0 if ASGI else 60)),
+        # Comprueba al inicio de cada solicitud que la conexión reutilizada sigue siendo válida
+        'CONN_HEALTH_CHECKS': environ.get('CONN_HEALTH_CHECKS', 'True') == 'True',
+        'OPTIONS': {},
     }
 }
 
+# Opciones de conexión de PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Tiempo máximo para establecer una conexión, en segundos
+    if environ.get('DB_CONNECT_TIMEOUT'):
+        DATABASES['default']['OPTIONS']['connect_timeout'] = int(environ['DB_CONNECT_TIMEOUT'])
+
+    if environ.get('DB_POOL_MODE') == 'pgbouncer':
+        # Detrás de PgBouncer en modo transacción cada transacción puede usar una conexión distinta del
+        # servidor: los cursores del lado del servidor (QuerySet.iterator) se desactivan y los parámetros
+        # de sesión como statement_timeout se configuran en PgBouncer o en el rol de la base de datos
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    else:
+        # Tiempo máximo de ejecución de una sentencia en milisegundos (0 sin límite)
+        statement_timeout = int(environ.get('DB_STATEMENT_TIMEOUT', 30000))
+        if statement_timeout:
+            DATABASES['default']['OPTIONS']['options'] = f'-c statement_timeout={statement_timeout}'
+
+# Réplicas de lectura: una por cada host de REPLICA_HOSTS y/o nombre de base de datos de REPLICA_NAMES
+# (listas separadas por comas; lo que no se indica se toma de la base principal). En los tests son
+# espejos de la base principal.
+REPLICA_DATABASES = []
+for index, (host, name) in enumerate(zip_longest(
+    [host for host in environ.get('REPLICA_HOSTS', '').split(',') if host],
+    [name for name in environ.get('REPLICA_NAMES', '').split(',') if name]
+), start=1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Segundos durante los que las lecturas de un usuario van a la base principal tras una escritura
+REPLICA_STICKY_SECONDS = int(environ.get('REPLICA_STICKY_SECONDS', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Caché de la marca de lectura de las propias escrituras con réplicas, que debe ser compartida entre
+# procesos (con LocMemCache las réplicas no se activan): 'default' o, con REPLICA_STICKY_CACHE_BACKEND,
+# una caché propia
+REPLICA_STICKY_CACHE_ALIAS = 'default'
+if environ.get('REPLICA_STICKY_CACHE_BACKEND'):
+    CACHES['replica_sticky'] = {
+        'BACKEND': environ['REPLICA_STICKY_CACHE_BACKEND'],
+        'LOCATION': environ.get('REPLICA_STICKY_CACHE_LOCATION', ''),
+    }
+    REPLICA_STICKY_CACHE_ALIAS = 'replica_sticky'
+
+# Caché de las generaciones de los tokens (ver TOKEN_AUTH_CACHE), que debe ser compartida entre procesos
+# (con LocMemCache la autenticación falla con ImproperlyConfigured): por defecto en ficheros, compartida
+# por los procesos de un mismo servidor; con varios servidores, Redis o Memcached
+CACHES['token_auth'] = {
+    'BACKEND': environ.get('TOKEN_AUTH_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+    'LOCATION': environ.get('TOKEN_AUTH_CACHE_LOCATION', str(Path(tempfile.gettempdir()) / 'api_token_auth')),
+    'OPTIONS': {'MAX_ENTRIES': TOKEN_AUTH_CACHE['LOCAL_SIZE']},
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -113,6 +252,34 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.0/topics/auth/passwords/
+# El primer hasher se usa para las contraseñas nuevas; los demás solo verifican las existentes,
+# que se vuelven a calcular con el primero en el siguiente inicio de sesión.
+
+PASSWORD_HASHERS = environ.get('PASSWORD_HASHERS', ','.join([
+    'users.hashers.PBKDF2PasswordHasher',
+    'users.hashers.BCryptSHA256PasswordHasher',
+])).split(',')
+
+# Después de los configurados se añaden los hashers de Django que faltan (mismo nombre de clase),
+# solo para verificar las contraseñas guardadas en cualquiera de sus formatos
+PASSWORD_HASHERS += [
+    hasher for hasher in [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.BCryptPasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ] if hasher.rsplit('.', 1)[1] not in {configured.rsplit('.', 1)[1] for configured in PASSWORD_HASHERS}
+]
+
+PASSWORD_PBKDF2_ITERATIONS = int(environ.get('PASSWORD_PBKDF2_ITERATIONS', 720000))
+
+PASSWORD_BCRYPT_ROUNDS = int(environ.get('PASSWORD_BCRYPT_ROUNDS', 12))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -134,3 +301,50 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Paginación por cursor del listado de libros
+BOOKS_PAGE_SIZE = int(environ.get('BOOKS_PAGE_SIZE', 50))
+
+BOOKS_MAX_PAGE_SIZE = int(environ.get('BOOKS_MAX_PAGE_SIZE', 500))
+
+
+# Número máximo de ids por solicitud en la lectura por lotes de libros
+BOOKS_BATCH_MAX_IDS = int(environ.get('BOOKS_BATCH_MAX_IDS', 100))
+
+
+# Número de resultados por página de la búsqueda de libros (paginada por cursor)
+BOOK_SEARCH_PAGE_SIZE = int(environ.get('BOOK_SEARCH_PAGE_SIZE', 100))
+
+# Umbral de similitud por defecto de la búsqueda difusa (pg_trgm)
+BOOK_SEARCH_SIMILARITY_THRESHOLD = float(environ.get('BOOK_SEARCH_SIMILARITY_THRESHOLD', 0.3))
+# Número máximo de valores por faceta (géneros y autores) en la búsqueda
+BOOK_SEARCH_FACET_LIMIT = int(environ.get('BOOK_SEARCH_FACET_LIMIT', 20))
+
+
+# Tamaño de bloque por defecto y máximo de la importación masiva de libros
+BOOKS_IMPORT_BATCH_SIZE = int(environ.get('BOOKS_IMPORT_BATCH_SIZE', 1000))
+
+BOOKS_IMPORT_MAX_BATCH_SIZE = int(environ.get('BOOKS_IMPORT_MAX_BATCH_SIZE', 5000))
+
+
+# Número máximo de ids por solicitud en la modificación y eliminación en bloque
+BOOKS_BULK_MAX_IDS = int(environ.get('BOOKS_BULK_MAX_IDS', 1000))
+
+
+# Días que se conservan los registros de libros eliminados del feed de cambios (prune_tombstones);
+# los clientes que no sincronicen en ese plazo necesitan una sincronización completa
+BOOKS_TOMBSTONE_RETENTION_DAYS = int(environ.get('BOOKS_TOMBSTONE_RETENTION_DAYS', 90))
+
+
+# Libros leídos por bloque al exportar la biblioteca
+BOOKS_EXPORT_CHUNK_SIZE = int(environ.get('BOOKS_EXPORT_CHUNK_SIZE', 2000))
+
+
+# Tiempo de vida (segundos) de las respuestas de libros guardadas en caché
+BOOKS_CACHE_TIMEOUT = int(environ.get('BOOKS_CACHE_TIMEOUT', 300))
+
+
+# Factor por el que se multiplican los tiempos máximos de respuesta de los tests de presupuesto
+# (api.testing). Por defecto 0, que desactiva la comprobación de tiempos: dependen de la máquina
+TEST_TIME_BUDGET_FACTOR = float(environ.get('TEST_TIME_BUDGET_FACTOR') or 0)
@@ -0,0 +1,96 @@
+import time
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from books_management.models import Book
+from books_management.normalization import upsert_authors, upsert_genres
+
+
+# Tamaños de la biblioteca (número de libros) con los que se comprueba cada presupuesto
+BUDGET_SIZES = (1, 10, 1000)
+
+
+# Ejecuta 'call' y devuelve la respuesta, las consultas SQL ejecutadas en 'using' y el tiempo en ms
+def measure_request(call, using=DEFAULT_DB_ALIAS):
+    with CaptureQueriesContext(connections[using]) as captured:
+        start = time.perf_counter()
+        response = call()
+        elapsed = (time.perf_counter() - start) * 1000
+    return response, [query['sql'] for query in captured.captured_queries], elapsed
+
+
+# Crea un usuario con una biblioteca de libros (un autor y 'genre_count' géneros por libro) y devuelve
+# los libros con autor y géneros cargados. Pensado para usarse dentro de una transacción que se deshace.
+# Con password=None la contraseña queda inutilizable y no se paga el coste del hash.
+def create_library(username, book_count, genre_count=3, password='bench-password'):
+    user = User.objects.create_user(username=username, password=password)
+    author, = upsert_authors([{'full_name': 'Bench Author', 'email': 'bench@example.com'}])
+    genres = upsert_genres([f'Bench Genre {index}' for index in range(genre_count)])
+    books = Book.objects.bulk_create([
+        Book(title=f'Bench Title {index}', user=user, author=author, publication_year=2000 + index % 25)
+        for index in range(book_count)
+    ])
+    Book.genre.through.objects.bulk_create([
+        Book.genre.through(book_id=book.id, genre_id=genre.id) for book in books for genre in genres
+    ])
+    return list(Book.objects.filter(user=user).select_related('author').prefetch_related('genre').order_by('id'))
+
+
+# Crea un usuario con 'size' libros y un cliente autenticado con su token. La contraseña queda
+# inutilizable salvo que se indique, para no pagar el coste del hash en cada tamaño.
+def create_budget_library(size, username=None, password=None):
+    books = create_library(username or f'budget_{size}', size, password=password)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=books[0].user).key)
+    return client, books
+
+
+# Mezcla para los TestCase que fija un presupuesto por endpoint: un máximo de consultas SQL y de
+# tiempo de respuesta. Con assertBudgetBySize el presupuesto se comprueba con bibliotecas de 1, 10
+# y 1000 libros y el test falla si el número de consultas crece con el tamaño (patrón N+1).
+# Los tiempos máximos solo se comprueban con TEST_TIME_BUDGET_FACTOR (0 por defecto), por el que se
+# multiplican para adaptarlos a cada máquina; los presupuestos de consultas se comprueban siempre.
+class QueryBudgetMixin:
+    budget_sizes = BUDGET_SIZES
+
+    def _check_time(self, elapsed, max_ms, label):
+        factor = getattr(settings, 'TEST_TIME_BUDGET_FACTOR', 0)
+        if max_ms is not None and factor:
+            self.assertLessEqual(elapsed, max_ms * factor, f'{label} took {elapsed:.1f} ms (budget {max_ms * factor:.0f} ms)')
+
+    def _format_queries(self, queries):
+        return '\n'.join(f'  {count}x {sql}' for sql, count in Counter(queries).most_common())
+
+    # Comprueba el presupuesto de una solicitud y devuelve la respuesta
+    def assertWithinBudget(self, call, max_queries, max_ms=None, using=DEFAULT_DB_ALIAS):
+        response, queries, elapsed = measure_request(call, using)
+        self.assertLessEqual(len(queries), max_queries, (
+            f'{len(queries)} queries (budget {max_queries}):\n{self._format_queries(queries)}'
+        ))
+        self._check_time(elapsed, max_ms, 'Request')
+        return response
+
+    # Comprueba el presupuesto para cada tamaño de biblioteca: 'setup(size)' prepara los datos y
+    # devuelve lo que recibe 'call', que hace la solicitud. Devuelve las respuestas por tamaño.
+    def assertBudgetBySize(self, setup, call, max_queries, max_ms=None, sizes=None, using=DEFAULT_DB_ALIAS):
+        sizes = sizes or self.budget_sizes
+        counts = {}
+        responses = {}
+
+        for size in sizes:
+            context = setup(size)
+            responses[size], queries, elapsed = measure_request(lambda: call(context), using)
+            counts[size] = len(queries)
+            self.assertLessEqual(counts[size], max_queries, (
+                f'{counts[size]} queries with {size} books (budget {max_queries}):\n{self._format_queries(queries)}'
+            ))
+            self._check_time(elapsed, max_ms, f'Request with {size} books')
+
+        smallest = counts[sizes[0]]
+        grown = {size: count for size, count in counts.items() if count > smallest}
+        self.assertFalse(grown, f'Query count grows with the number of books: {counts}\n{self._format_queries(queries)}')
+        return responses
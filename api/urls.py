@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from .instrumentation import metrics_view
 
 
 # Definimos las URLs globales
@@ -7,5 +8,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user', include('users.urls')),
     path('api/books/', include('books_management.urls')),
-    path('api/books/searchs/', include('book_search.urls'))
+    path('api/books/searchs/', include('book_search.urls')),
+    path('metrics', metrics_view, name='metrics')
 ]
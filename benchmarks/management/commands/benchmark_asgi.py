@@ -0,0 +1,115 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from books_management.models import Book
+from books_management.normalization import upsert_authors, upsert_genres
+from benchmarks.utils import allow_test_client, format_row, make_async_client, make_client, summarize
+
+
+# Pares de endpoints de lectura (síncrono WSGI, asíncrono ASGI) que se comparan
+ENDPOINTS = {
+    'get_all_books': ('/api/books/all', '/api/books/async/all', {'page_size': 50}),
+    'get_book_by_pk': ('/api/books/{pk}', '/api/books/async/{pk}', {}),
+    'search_books': ('/api/books/searchs/', '/api/books/searchs/async', {'query': 'Bench'}),
+}
+
+
+# Prueba de carga en proceso que compara los dos modos de despliegue de las vistas de lectura:
+# WSGI (vistas síncronas atendidas por un grupo de hilos, como un worker con --threads) frente a
+# ASGI (vistas asíncronas atendidas por un único bucle de eventos con muchas solicitudes a la vez).
+# Crea un usuario temporal 'bench_asgi' con sus libros y lo elimina al terminar.
+class Command(BaseCommand):
+    help = 'Load test the read endpoints under WSGI (thread pool) and ASGI (event loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=200, help='Books in the temporary library')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--threads', type=int, default=8, help='Threads of the WSGI worker')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent requests in flight')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+        parser.add_argument(
+            '--response-cache', action='store_true',
+            help='Keep the response cache of the sync views enabled (disabled by default for a fair comparison)'
+        )
+
+    def handle(self, *args, **options):
+        user, book_id = self.setup_library(options['books'])
+        headers = {'Authorization': 'Token ' + Token.objects.create(user=user).key}
+
+        # Las vistas asíncronas no usan la caché de respuestas: por defecto se desactiva también para las síncronas
+        caches = {} if options['response_cache'] else {'CACHES': {**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}}
+
+        try:
+            with allow_test_client(), override_settings(**caches):
+                self.run_endpoints(options, headers, book_id)
+        finally:
+            User.objects.filter(username='bench_asgi').delete()
+
+    def run_endpoints(self, options, headers, book_id):
+        for name in options['endpoints']:
+            sync_url, async_url, params = ENDPOINTS[name]
+            sync_url, async_url = sync_url.format(pk=book_id), async_url.format(pk=book_id)
+
+            wsgi = self.run_wsgi(sync_url, params, headers, options['requests'], options['threads'])
+            asgi = asyncio.run(self.run_asgi(async_url, params, headers, options['requests'], options['concurrency']))
+
+            self.stdout.write(format_row(f'{name} wsgi x{options["threads"]}', wsgi))
+            self.stdout.write(format_row(f'{name} asgi x{options["concurrency"]}', asgi))
+
+    def setup_library(self, book_count):
+        User.objects.filter(username='bench_asgi').delete()
+        user = User.objects.create_user(username='bench_asgi', password='bench-password')
+        author, = upsert_authors([{'full_name': 'Bench Author', 'email': 'bench@example.com'}])
+        genre, = upsert_genres(['Bench Genre'])
+        books = Book.objects.bulk_create([
+            Book(title=f'Bench Title {index}', user=user, author=author, publication_year=2000 + index % 25)
+            for index in range(book_count)
+        ])
+        Book.genre.through.objects.bulk_create([Book.genre.through(book_id=book.id, genre_id=genre.id) for book in books])
+        return user, books[0].id
+
+    # Envía todas las solicitudes a un grupo de hilos; la latencia incluye la espera en la cola
+    def run_wsgi(self, url, params, headers, request_count, threads):
+        def request(submitted):
+            client = make_client()
+            try:
+                response = client.get(url, params, headers=headers)
+                assert response.status_code == 200, response.content
+                return (time.perf_counter() - submitted) * 1000
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(request, time.perf_counter()) for _ in range(request_count)]
+            latencies = [future.result() for future in futures]
+
+        return self.result(latencies, time.perf_counter() - start)
+
+    # Lanza todas las solicitudes en un único bucle de eventos con un máximo de 'concurrency' a la vez
+    async def run_asgi(self, url, params, headers, request_count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        client = make_async_client()
+
+        async def request():
+            submitted = time.perf_counter()
+            async with semaphore:
+                response = await client.get(url, params, headers=headers)
+                assert response.status_code == 200, response.content
+            return (time.perf_counter() - submitted) * 1000
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[request() for _ in range(request_count)])
+
+        return self.result(latencies, time.perf_counter() - start)
+
+    def result(self, latencies, elapsed):
+        summary = summarize(latencies)
+        summary['throughput_rps'] = round(len(latencies) / elapsed, 1)
+        return summary
@@ -0,0 +1,99 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.middleware import COMPRESSORS, compress_sequence
+from api.renderers import FastJSONRenderer
+from books_management.serializers import serialize_book
+from book_search.search import serialize_books
+from api.testing import create_library
+from benchmarks.utils import format_row
+
+
+# Niveles comparados por defecto para cada codificación
+DEFAULT_LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 9], 'zstd': [1, 3, 9]}
+
+
+# Mide el coste en CPU y el ahorro de ancho de banda de cada codificación y nivel sobre respuestas
+# típicas de la biblioteca: páginas del listado, resultados de búsqueda y la exportación NDJSON
+# (comprimida línea a línea, como en streaming). Los libros se crean dentro de una transacción
+# que se deshace al terminar.
+class Command(BaseCommand):
+    help = 'Benchmark CPU time and compression ratio of each encoding and level on library payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=2000, help='Books in the temporary library (export size)')
+        parser.add_argument('--repeat', type=int, default=10, help='Compressions per payload, encoding and level')
+        parser.add_argument(
+            '--levels', nargs='+', default=[],
+            help='Levels to compare as encoding:level (for example gzip:6 br:4); defaults to a few per encoding'
+        )
+
+    def handle(self, *args, **options):
+        runs = self.get_runs(options['levels'])
+
+        with transaction.atomic():
+            books = create_library('bench_compression', options['books'])
+            payloads = self.build_payloads(books)
+
+            for name, chunks in payloads.items():
+                size = sum(len(chunk) for chunk in chunks)
+                self.stdout.write(f'{name}: {size} bytes in {len(chunks)} chunks')
+                for encoding, level in runs:
+                    summary = self.run(chunks, encoding, level, options['repeat'])
+                    self.stdout.write(format_row(f'  {encoding}:{level}', summary))
+
+            transaction.set_rollback(True)
+
+        missing = sorted(set(DEFAULT_LEVELS) - set(COMPRESSORS))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Not installed: {", ".join(missing)}'))
+
+    def get_runs(self, levels):
+        if not levels:
+            return [(encoding, level) for encoding in COMPRESSORS for level in DEFAULT_LEVELS[encoding]]
+
+        runs = []
+        for value in levels:
+            encoding, _, level = value.partition(':')
+            if encoding not in COMPRESSORS:
+                self.stderr.write(f'Skipping {value}: {encoding} is not available')
+                continue
+            runs.append((encoding, int(level)))
+        return runs
+
+    # Respuestas representativas ya codificadas como las envía la API (lista de fragmentos)
+    def build_payloads(self, books):
+        renderer = FastJSONRenderer()
+
+        def page(size):
+            return [renderer.render({
+                'message': 'Correctly obtained books for the current user',
+                'Books': [serialize_book(book) for book in books[:size]],
+                'next': 'cursor',
+                'previous': None
+            })]
+
+        return {
+            'list page 50': page(50),
+            'list page 500': page(500),
+            'search 100': [renderer.render({'message': 'Correctly obtained books', 'Books': serialize_books(books[:100])})],
+            f'export ndjson {len(books)}': [renderer.render(serialize_book(book)) + b'\n' for book in books],
+        }
+
+    def run(self, chunks, encoding, level, repeat):
+        size = sum(len(chunk) for chunk in chunks)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compressed = b''.join(compress_sequence(chunks, COMPRESSORS[encoding](level)))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        mean = statistics.fmean(timings)
+        return {
+            'mean_ms': round(mean, 3),
+            'mb_per_s': round(size / 1024 / 1024 / (mean / 1000), 1) if mean else 0.0,
+            'bytes': len(compressed),
+            'ratio': round(size / len(compressed), 2),
+            'saved_pct': round(100 - 100 * len(compressed) / size, 1),
+        }
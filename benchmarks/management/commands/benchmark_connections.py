@@ -0,0 +1,64 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from rest_framework.authtoken.models import Token
+from api.testing import create_library
+from benchmarks.utils import allow_test_client, format_row, make_client, summarize
+
+
+# Configuraciones de conexión comparadas: (CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+VARIANTS = {
+    'new connection per request': (0, False),
+    'persistent': (60, False),
+    'persistent + health checks': (60, True),
+}
+
+
+# Compara solicitudes por segundo de un endpoint barato (detalle de un libro) abriendo una conexión
+# por solicitud frente a conexiones persistentes, con y sin comprobación de salud. El cliente de pruebas
+# no cierra las conexiones al terminar cada solicitud, así que se simula el manejador de Django
+# llamando a close_old_connections() al empezar y al terminar cada una. Crea un usuario temporal
+# 'bench_connections' con sus libros y lo elimina al terminar.
+class Command(BaseCommand):
+    help = 'Benchmark requests/sec with per-request vs persistent database connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per configuration')
+
+    def handle(self, *args, **options):
+        User.objects.filter(username='bench_connections').delete()
+        books = create_library('bench_connections', 1)
+        headers = {'Authorization': 'Token ' + Token.objects.create(user=books[0].user).key}
+        url = f'/api/books/{books[0].id}'
+        original = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+
+        try:
+            with allow_test_client():
+                for name, (max_age, health_checks) in VARIANTS.items():
+                    connection.close()
+                    connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+                    self.stdout.write(format_row(name, self.run(url, headers, options['requests'])))
+        finally:
+            connection.close()
+            connection.settings_dict.update(original)
+            User.objects.filter(username='bench_connections').delete()
+
+    def run(self, url, headers, request_count):
+        client = make_client()
+        latencies = []
+        connections_opened = 0
+
+        for _ in range(request_count):
+            start = time.perf_counter()
+            close_old_connections()
+            if connection.connection is None:
+                connections_opened += 1
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200, response.content
+            close_old_connections()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        summary = summarize(latencies)
+        summary['connections'] = connections_opened
+        return summary
@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from api import renderers
+from api.renderers import FastJSONRenderer
+from books_management.serializers import BookSerializer, serialize_book
+from api.testing import create_library
+from benchmarks.utils import format_row, summarize
+
+
+# Micro-benchmark de la serialización y codificación JSON de una página de libros ya cargada
+# (sin consultas): compara BookSerializer + JSONRenderer de DRF con la serialización directa
+# y FastJSONRenderer. Los libros se crean dentro de una transacción que se deshace al terminar.
+class Command(BaseCommand):
+    help = 'Benchmark book serialization and JSON rendering per 1k books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000, help='Books serialized per iteration')
+        parser.add_argument('--genres', type=int, default=3, help='Genres per book')
+        parser.add_argument('--repeat', type=int, default=20, help='Iterations per variant')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            books = create_library('bench_rendering', options['books'], options['genres'])
+
+            variants = {
+                'drf serializer + drf json': (lambda: BookSerializer(books, many=True).data, JSONRenderer()),
+                'dict + drf json': (lambda: [serialize_book(book) for book in books], JSONRenderer()),
+                'dict + fast json': (lambda: [serialize_book(book) for book in books], FastJSONRenderer()),
+            }
+
+            expected = None
+            for name, (serialize, renderer) in variants.items():
+                content, summary = self.run(serialize, renderer, options['repeat'], options['books'])
+                if expected is not None and content != expected:
+                    raise AssertionError(f'{name} does not match the DRF output')
+                expected = content
+                self.stdout.write(format_row(name, summary))
+
+            if renderers.orjson is None:
+                self.stdout.write(self.style.WARNING('orjson is not installed: FastJSONRenderer uses the standard library'))
+
+            transaction.set_rollback(True)
+
+    # Serializa y codifica la respuesta completa del listado; las latencias se expresan por cada 1000 libros
+    def run(self, serialize, renderer, repeat, book_count):
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = renderer.render({'message': 'Correctly obtained books for the current user', 'Books': serialize()})
+            latencies.append((time.perf_counter() - start) * 1000 * 1000 / book_count)
+
+        summary = summarize(latencies)
+        del summary['throughput_rps']
+        summary['bytes'] = len(content)
+        return content, summary
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from benchmarks.utils import allow_test_client, format_row, make_client, measure, summarize
+
+
+# Mide el rendimiento de POST /api/user/signIn con distintos hashers de contraseña.
+# Crea usuarios temporales con prefijo 'bench_signin_' y los elimina al terminar.
+class Command(BaseCommand):
+    help = 'Benchmark signIn throughput for each configured password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of temporary users')
+        parser.add_argument('--requests', type=int, default=100, help='Logins per hasher')
+        parser.add_argument(
+            '--hashers', nargs='+',
+            default=['users.hashers.PBKDF2PasswordHasher', 'users.hashers.BCryptSHA256PasswordHasher'],
+            help='Hashers to compare (each one is used as the preferred hasher)'
+        )
+        parser.add_argument('--pbkdf2-iterations', type=int, nargs='*', default=[], help='Extra PBKDF2 iteration counts to compare')
+
+    def handle(self, *args, **options):
+        runs = [(hasher, {}) for hasher in options['hashers']]
+        runs += [
+            ('users.hashers.PBKDF2PasswordHasher', {'PASSWORD_PBKDF2_ITERATIONS': iterations})
+            for iterations in options['pbkdf2_iterations']
+        ]
+
+        for hasher, extra in runs:
+            name = hasher.rsplit('.', 1)[-1] + ''.join(f' {value}' for value in extra.values())
+            with allow_test_client(), override_settings(PASSWORD_HASHERS=[hasher], **extra):
+                self.stdout.write(format_row(name, self.run(options['users'], options['requests'])))
+
+    def run(self, user_count, request_count):
+        password = 'bench-password'
+        users = [
+            User.objects.create_user(username=f'bench_signin_{index}', password=password)
+            for index in range(user_count)
+        ]
+        client = make_client()
+        index = iter(range(request_count))
+
+        def login():
+            username = users[next(index) % user_count].username
+            response = client.post('/api/user/signIn', {'username': username, 'password': password}, content_type='application/json')
+            assert response.status_code == 200, response.content
+
+        # Primera ronda para crear los tokens; la medición refleja el estado estable
+        for user in users:
+            client.post('/api/user/signIn', {'username': user.username, 'password': password}, content_type='application/json')
+
+        try:
+            latencies, queries = measure(login, request_count)
+        finally:
+            User.objects.filter(username__startswith='bench_signin_').delete()
+
+        return summarize(latencies, queries)
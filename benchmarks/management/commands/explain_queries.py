@@ -0,0 +1,107 @@
+import re
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from book_search.search import full_text_search
+from books_management.models import Author, Book, Genre
+from books_management.pagination import build_keyset_page, paginate_keyset
+
+
+# Nodos del plan que indican un recorrido secuencial de la tabla:
+# 'Seq Scan on tabla' en PostgreSQL y 'SCAN tabla' (sin 'USING ... INDEX') en SQLite
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?!.*\bUSING\b)'),
+}
+
+
+# Ejecuta EXPLAIN (ANALYZE en PostgreSQL) sobre las consultas reales de la aplicación
+# e informa de las que recorren alguna tabla de forma secuencial.
+class Command(BaseCommand):
+    help = 'Run EXPLAIN ANALYZE on the project queries and report sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username whose library is used (default: the user with most books)')
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='PostgreSQL only: disable sequential scans so small tables still show whether an index can be used'
+        )
+        parser.add_argument('--plans', action='store_true', help='Print the full plan of every query')
+        parser.add_argument('--strict', action='store_true', help='Exit with an error if any query uses a sequential scan')
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Unsupported database vendor: {connection.vendor}')
+
+        user = self.get_user(options['user'])
+        tables = set(connection.introspection.table_names())
+        flagged = []
+
+        # Cada consulta se explica dentro de una transacción que se revierte
+        for name, queryset in self.get_queries(user):
+            with transaction.atomic():
+                if options['no_seqscan'] and connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain(analyze=True) if connection.vendor == 'postgresql' else queryset.explain()
+                transaction.set_rollback(True)
+
+            scans = sorted({table for table in pattern.findall(plan) if table in tables})
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f'{name}: sequential scan on {", ".join(scans)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+
+            if options['plans']:
+                self.stdout.write(plan + '\n')
+
+        if flagged and options['strict']:
+            raise CommandError(f'{len(flagged)} queries use sequential scans: {", ".join(flagged)}')
+
+    # Obtiene el usuario indicado, o el que tiene más libros
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User not found: {username}')
+
+        user = User.objects.annotate(book_count=Count('book')).order_by('-book_count').first()
+        if user is None:
+            raise CommandError('No users found')
+        return user
+
+    # Consultas que ejecutan las vistas, construidas con el mismo código que las vistas
+    def get_queries(self, user):
+        books = Book.objects.filter(user=user)
+        book = books.order_by('id').first()
+        author = book.author if book else Author.objects.first()
+        genre = book.genre.first() if book else Genre.objects.first()
+
+        # Paginación keyset: primera página y página siguiente para cada ordenamiento
+        for ordering in ('id', 'publication_year'):
+            queryset, _ = build_keyset_page(books, ordering=ordering, page_size=50)
+            yield f'get_all_books ordering={ordering}', queryset
+
+            _, next_cursor, _ = paginate_keyset(books, ordering=ordering, page_size=50)
+            if next_cursor:
+                queryset, _ = build_keyset_page(books, cursor=next_cursor, page_size=50)
+                yield f'get_all_books ordering={ordering} cursor', queryset
+
+        pk = book.pk if book else 0
+        yield 'get_book_by_pk owner lookup', Book.objects.filter(pk=pk, user=user)
+        yield 'get_book_by_pk exists check', Book.objects.filter(pk=pk)
+        yield 'genre prefetch', Genre.objects.filter(book__in=[pk])
+        yield 'export', books.select_related('author').order_by('id')
+
+        if author is not None:
+            yield 'author upsert lookup', Author.objects.filter(full_name_key__in=[author.full_name_key], email_key__in=[author.email_key])
+        if genre is not None:
+            yield 'genre upsert lookup', Genre.objects.filter(genre_key__in=[genre.genre_key])
+            yield 'books by genre', books.filter(genre=genre)
+
+        term = (book.title.split() or [''])[0] if book else 'book'
+        yield 'search_books', full_text_search(books, term)[:100]
@@ -0,0 +1,119 @@
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from books_management.models import Book, LibraryVersion
+from books_management.normalization import batched, upsert_authors, upsert_genres
+
+
+# Vocabulario de los títulos, nombres de autor y géneros generados
+TITLE_WORDS = (
+    'shadow night river garden empire silent last secret winter summer city stone fire glass storm '
+    'queen king journey house light dark lost ocean mountain forest dream memory war peace song '
+    'letter island road star moon sun wind iron golden broken hidden ancient first final'
+).split()
+FIRST_NAMES = 'Ana Luis Maria Carlos Elena Jorge Lucia Pablo Sofia Diego Laura Miguel Carmen Javier Isabel'.split()
+LAST_NAMES = 'Garcia Martinez Lopez Sanchez Perez Gomez Martin Jimenez Ruiz Hernandez Diaz Moreno Alvarez Romero'.split()
+GENRE_NAMES = (
+    'Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'Horror', 'History', 'Biography',
+    'Poetry', 'Drama', 'Adventure', 'Philosophy', 'Science', 'Travel', 'Humor', 'Classics',
+)
+
+
+# Genera una biblioteca sintética (usuarios, autores, géneros y libros) con inserciones en bloque,
+# desde miles hasta millones de libros, para las pruebas de carga y los benchmarks. Los libros se
+# reparten entre los usuarios y cada bloque se inserta en su propia transacción. Con la misma
+# semilla se generan los mismos datos.
+class Command(BaseCommand):
+    help = 'Generate synthetic users, authors, genres and books with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Users to create')
+        parser.add_argument('--books', type=int, default=10000, help='Total books, spread across the users')
+        parser.add_argument('--authors', type=int, default=1000, help='Distinct authors')
+        parser.add_argument('--genres', type=int, default=50, help='Distinct genres')
+        parser.add_argument('--max-genres', type=int, default=3, help='Maximum genres per book')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Books per bulk insert')
+        parser.add_argument('--prefix', default='synthetic', help='Username prefix (users are <prefix>_<n>)')
+        parser.add_argument('--password', default='synthetic-password', help='Password of the generated users')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--clear', action='store_true', help='Delete the users with the same prefix and their books first')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+
+        if options['clear']:
+            self.clear(prefix)
+        elif User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users with prefix {prefix!r} already exist; use --clear or another --prefix')
+
+        user_ids = self.create_users(prefix, options['users'], options['password'])
+        author_ids = [author.id for author in upsert_authors(self.make_authors(rng, options['authors']))]
+        genre_ids = [genre.id for genre in upsert_genres(self.make_genres(options['genres']))]
+        self.stdout.write(f'{len(user_ids)} users, {len(author_ids)} authors, {len(genre_ids)} genres')
+
+        created = 0
+        for batch in batched(range(options['books']), options['batch_size']):
+            self.create_books(rng, batch, user_ids, author_ids, genre_ids, options['max_genres'])
+            created += len(batch)
+            self.stdout.write(f'{created}/{options["books"]} books ({time.perf_counter() - start:.1f}s)')
+
+        # Actualiza las estadísticas del planificador tras la carga masiva
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in (User, Book, Book.genre.through):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Generated {created} books in {time.perf_counter() - start:.1f}s'))
+
+    # Elimina los libros de los usuarios generados sin recorrer las relaciones y después los usuarios
+    def clear(self, prefix):
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        with transaction.atomic():
+            Book.genre.through.objects.filter(book__user__in=users)._raw_delete(connection.alias)
+            Book.objects.filter(user__in=users)._raw_delete(connection.alias)
+            users.delete()
+
+    # Los usuarios comparten el hash de la contraseña, que se calcula una sola vez
+    def create_users(self, prefix, count, password):
+        password = make_password(password)
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}_{index}', password=password) for index in range(count)
+            ])
+            user_ids = list(
+                User.objects.filter(username__in=[user.username for user in users]).order_by('id').values_list('id', flat=True)
+            )
+            # bulk_create no envía post_save: las versiones de la biblioteca se crean aquí
+            LibraryVersion.objects.bulk_create([LibraryVersion(user_id=user_id) for user_id in user_ids])
+        return user_ids
+
+    def make_authors(self, rng, count):
+        return [{
+            'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email': f'author{index}@example.com'
+        } for index in range(count)]
+
+    def make_genres(self, count):
+        return [GENRE_NAMES[index] if index < len(GENRE_NAMES) else f'Genre {index}' for index in range(count)]
+
+    def create_books(self, rng, batch, user_ids, author_ids, genre_ids, max_genres):
+        with transaction.atomic():
+            books = Book.objects.bulk_create([
+                Book(
+                    title=' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(2, 5))).capitalize(),
+                    user_id=user_ids[index % len(user_ids)],
+                    author_id=rng.choice(author_ids),
+                    publication_year=rng.randint(1900, 2024)
+                )
+                for index in batch
+            ])
+            Book.genre.through.objects.bulk_create([
+                Book.genre.through(book_id=book.id, genre_id=genre_id)
+                for book in books
+                for genre_id in rng.sample(genre_ids, rng.randint(1, min(max_genres, len(genre_ids))))
+            ])
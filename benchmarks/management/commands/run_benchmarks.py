@@ -0,0 +1,225 @@
+import itertools
+import json
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from books_management.models import Book
+from api.testing import create_library
+from benchmarks.utils import allow_test_client, format_row, make_client, measure, summarize
+
+
+# Métricas comparadas con la línea base
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'alloc_kb')
+
+# Datos de los libros creados y actualizados por el benchmark
+BOOK_DATA = {
+    'title': 'Benchmark Title',
+    'author': {'full_name': 'Benchmark Author', 'email': 'benchmark@example.com'},
+    'genre': [{'genre': 'Benchmark Genre'}, {'genre': 'Fantasy'}],
+    'publication_year': 2000
+}
+
+
+# Ejecuta en proceso, con el cliente de pruebas de Django, cada endpoint de la API y mide la latencia
+# (p50/p95/p99), las consultas por solicitud y la memoria asignada por solicitud (tracemalloc, en
+# una pasada aparte para no afectar a las latencias). Puede guardar los resultados como línea base
+# en JSON y compararlos con una línea base anterior para detectar regresiones entre commits.
+# Sin --user crea un usuario temporal 'bench_runner' con --books libros y lo elimina al terminar.
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint in-process and save or compare a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Existing user whose library is used (for example one from generate_library)')
+        parser.add_argument('--password', default='synthetic-password', help='Password of --user (for signIn)')
+        parser.add_argument('--books', type=int, default=1000, help='Books in the temporary library when --user is not given')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint')
+        parser.add_argument('--signin-requests', type=int, default=20, help='Measured signIn requests (password hashing is slow)')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint')
+        parser.add_argument('--alloc-requests', type=int, default=10, help='Requests per endpoint traced with tracemalloc')
+        parser.add_argument('--response-cache', action='store_true', help='Keep the response cache enabled (disabled by default)')
+        parser.add_argument('--save', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Compare the results with this JSON baseline')
+        parser.add_argument('--threshold', type=float, default=20.0, help='Allowed increase in percent before reporting a regression')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error if a regression is found')
+
+    def handle(self, *args, **options):
+        temporary = options['user'] is None
+        if temporary:
+            User.objects.filter(username='bench_runner').delete()
+            user = create_library('bench_runner', options['books'])[0].user
+            password = 'bench-password'
+        else:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User not found: {options["user"]}')
+            password = options['password']
+
+        book_count = Book.objects.filter(user=user).count()
+        caches = {} if options['response_cache'] else {'CACHES': {**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}}
+
+        try:
+            with allow_test_client(), override_settings(**caches):
+                results = self.run_endpoints(user, password, options)
+        finally:
+            if temporary:
+                User.objects.filter(username='bench_runner').delete()
+
+        report = {'meta': self.get_meta(book_count, options), 'endpoints': results}
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(f'Saved results to {options["save"]}')
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(baseline, report, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regressions: {", ".join(regressions)}')
+
+    def run_endpoints(self, user, password, options):
+        client = make_client()
+        signin = client.post('/api/user/signIn', {'username': user.username, 'password': password}, content_type='application/json')
+        if signin.status_code != 200:
+            raise CommandError(f'signIn failed for {user.username}: check --password')
+        client.defaults['HTTP_AUTHORIZATION'] = 'Token ' + signin.json()['token']
+
+        sample = list(Book.objects.filter(user=user).order_by('id').values_list('id', 'title')[:1000])
+        if not sample:
+            raise CommandError(f'{user.username} has no books')
+        book_ids = [book_id for book_id, _ in sample]
+        # Las búsquedas usan palabras de los títulos de la biblioteca para que devuelvan resultados
+        words = sorted({word for _, title in sample for word in title.split() if len(word) > 2})
+
+        created = []
+        book_id = itertools.cycle(book_ids)
+        word = itertools.cycle(words)
+        update_index = itertools.count()
+        data = {**BOOK_DATA, 'user': user.id}
+
+        # create_book hace tantas solicitudes como delete_book: update_book modifica los libros
+        # creados y delete_book los elimina, dejando la biblioteca como estaba
+        def create():
+            response = client.post('/api/books/create', data, content_type='application/json')
+            created.append(response.json()['Book']['id'])
+            return response
+
+        def update():
+            return client.put(f'/api/books/update/{created[next(update_index) % len(created)]}', data, content_type='application/json')
+
+        delete_ids = iter(created)
+
+        endpoints = {
+            'signIn': (lambda: make_client().post(
+                '/api/user/signIn', {'username': user.username, 'password': password}, content_type='application/json'
+            ), options['signin_requests']),
+            'create_book': (create, options['requests']),
+            'get_all_books': (lambda: client.get('/api/books/all', {'page_size': 50}), options['requests']),
+            'get_book_by_pk': (lambda: client.get(f'/api/books/{next(book_id)}'), options['requests']),
+            'search_books': (lambda: client.get('/api/books/searchs/', {'query': next(word)}), options['requests']),
+            'update_book': (update, options['requests']),
+            'delete_book': (lambda: client.delete(f'/api/books/delete/{next(delete_ids)}'), options['requests']),
+        }
+
+        results = {}
+        for name, (call, requests) in endpoints.items():
+            results[name] = self.run_endpoint(call, requests, options['warmup'], options['alloc_requests'])
+            self.stdout.write(format_row(name, results[name]))
+
+        return results
+
+    def run_endpoint(self, call, requests, warmup, alloc_requests):
+        def checked():
+            response = call()
+            assert response.status_code < 400, (response.status_code, response.content)
+
+        for _ in range(warmup):
+            checked()
+
+        latencies, queries = measure(checked, requests)
+        summary = summarize(latencies, queries)
+        summary['alloc_kb'] = self.measure_allocations(checked, alloc_requests)
+        return summary
+
+    # Memoria máxima asignada durante cada solicitud (media, en KiB)
+    def measure_allocations(self, call, repeat):
+        if repeat <= 0:
+            return 0.0
+
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                call()
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+
+        return round(sum(peaks) / len(peaks) / 1024, 1)
+
+    def get_meta(self, book_count, options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            'commit': commit,
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'books': book_count,
+            'requests': options['requests'],
+            'response_cache': options['response_cache'],
+        }
+
+    # Compara cada métrica con la línea base y devuelve los endpoints con regresiones
+    def compare(self, baseline, report, threshold):
+        self.stdout.write(f'Comparing with baseline from commit {baseline["meta"].get("commit")} ({baseline["meta"].get("date")})')
+        for key in ('database', 'books', 'response_cache'):
+            if baseline['meta'].get(key) != report['meta'][key]:
+                self.stdout.write(self.style.WARNING(
+                    f'{key} differs from the baseline ({baseline["meta"].get(key)} -> {report["meta"][key]}): results are not comparable'
+                ))
+        regressions = []
+
+        for name, current in report['endpoints'].items():
+            previous = baseline['endpoints'].get(name)
+            if previous is None:
+                self.stdout.write(f'{name}: not in baseline')
+                continue
+
+            changes = []
+            regressed = False
+            for metric in COMPARED_METRICS:
+                before, after = previous.get(metric), current.get(metric)
+                if before is None or after is None:
+                    continue
+                change = (after - before) / before * 100 if before else 0.0
+                changes.append(f'{metric} {before} -> {after} ({change:+.1f}%)')
+                # Cualquier consulta adicional es una regresión; el resto de métricas admite el umbral
+                if metric == 'queries_per_request' and after > before:
+                    regressed = True
+                elif metric != 'queries_per_request' and change > threshold:
+                    regressed = True
+
+            line = f'{name}: ' + ', '.join(changes)
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(line)
+
+        return regressions
@@ -0,0 +1,68 @@
+import statistics
+import time
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+# Permite usar los clientes de pruebas (host 'testserver') fuera del test runner
+def allow_test_client():
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+
+
+# Cliente WSGI en proceso
+def make_client(**defaults):
+    return Client(**defaults)
+
+
+# Cliente ASGI en proceso
+def make_async_client(**defaults):
+    return AsyncClient(**defaults)
+
+
+# Percentil (0-100) de una lista de valores usando interpolación lineal
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+# Ejecuta 'call' el número de veces indicado y devuelve latencias (ms) y consultas por llamada
+def measure(call, repeat):
+    latencies = []
+    queries = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured.captured_queries))
+    return latencies, queries
+
+
+# Resume una serie de latencias en un diccionario de métricas
+def summarize(latencies, queries=None):
+    total = sum(latencies)
+    summary = {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        'throughput_rps': round(len(latencies) / (total / 1000), 1) if total else 0.0,
+    }
+    if queries is not None:
+        summary['queries_per_request'] = round(statistics.fmean(queries), 2) if queries else 0.0
+    return summary
+
+
+# Formatea una fila de resultados para la salida de los comandos
+def format_row(name, summary):
+    fields = ' '.join(f'{key}={value}' for key, value in summary.items())
+    return f'{name:<32} {fields}'
+
@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from books_management.models import Book
+from books_management.fieldsets import SEARCH_FIELDS, Fieldset, InvalidFieldset
+from books_management.pagination import InvalidCursor
+from users.authentication import async_token_required
+from .search import build_search_page, finish_search_page, full_text_search, get_similarity_threshold, run_search, serialize_books
+from .facets import apply_filters, facets_requested, get_search_filters
+
+
+# Versión asíncrona (ASGI) de la búsqueda de libros por título, autor o género
+@require_GET
+@async_token_required
+async def search_books(request):
+    # Obtener el parámetro de búsqueda de la solicitud
+    query = request.GET.get('query')
+    mode = request.GET.get('mode', 'text')
+
+    # Comprobar los parámetros de búsqueda
+    if not query or mode not in ('text', 'fuzzy'):
+        return JsonResponse({
+            'message': 'incorrect search parameters'
+        }, status=400)
+
+    # Obtener los filtros por género, autor y años de publicación
+    try:
+        filters = get_search_filters(request)
+        fieldset = Fieldset.from_request(request, SEARCH_FIELDS)
+        threshold = get_similarity_threshold(request) if mode == 'fuzzy' else None
+    except (ValueError, InvalidFieldset):
+        return JsonResponse({
+            'message': 'incorrect search parameters'
+        }, status=400)
+
+    books = apply_filters(Book.objects.filter(user=request.user), filters)
+    with_facets = facets_requested(request)
+    cursor = request.GET.get('cursor')
+
+    try:
+        if mode == 'fuzzy' or with_facets:
+            # La búsqueda difusa fija el umbral dentro de una transacción y las facetas usan SQL propio,
+            # por lo que se ejecutan en un hilo con el ORM síncrono
+            books, facets, next_cursor = await sync_to_async(run_search)(books, query, mode, threshold, with_facets, fieldset, cursor)
+        else:
+            matches = full_text_search(books, query)
+            page = build_search_page(matches, mode, cursor, fieldset)
+            books, next_cursor = finish_search_page([book async for book in page], matches, mode)
+            facets = None
+    except InvalidCursor:
+        return JsonResponse({
+            'message': 'incorrect search parameters'
+        }, status=400)
+
+    # Si la búsqueda no devuelve libros, devolver un mensaje de error
+    if not books and not cursor:
+        return JsonResponse({
+            'message': 'No books found matching your search'
+        }, status=404)
+
+    response = {
+        'message': 'Correctly obtained books',
+        'Books': [fieldset.render(book) for book in books] if fieldset is not None else serialize_books(books),
+        'next': next_cursor
+    }
+    if facets is not None:
+        response['facets'] = facets
+
+    return JsonResponse(response, status=200)
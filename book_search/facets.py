@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Exists, F, OuterRef
+from books_management.models import Author, Book, Genre, normalize_key
+
+
+# Valores aceptados para activar las facetas en la respuesta (?facets=true)
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+# Obtiene los filtros de la búsqueda (genre=, author=, year_from=, year_to=).
+# 'genre' y 'author' se pueden repetir; lanza ValueError si un año no es un entero.
+def get_search_filters(request):
+    filters = {
+        'genres': [normalize_key(genre) for genre in request.GET.getlist('genre') if genre.strip()],
+        'authors': [normalize_key(author) for author in request.GET.getlist('author') if author.strip()],
+    }
+    for name in ('year_from', 'year_to'):
+        value = request.GET.get(name)
+        filters[name] = int(value) if value not in (None, '') else None
+    return filters
+
+
+# Aplica los filtros sobre el queryset de libros. Los valores repetidos de un mismo filtro
+# se combinan con OR y los distintos filtros con AND. El filtro de género usa una subconsulta
+# EXISTS para no multiplicar las filas de los libros con varios géneros.
+def apply_filters(queryset, filters):
+    if filters['genres']:
+        queryset = queryset.filter(Exists(
+            Book.genre.through.objects.filter(book_id=OuterRef('pk'), genre__genre_key__in=filters['genres'])
+        ))
+    if filters['authors']:
+        queryset = queryset.filter(author__full_name_key__in=filters['authors'])
+    if filters['year_from'] is not None:
+        queryset = queryset.filter(publication_year__gte=filters['year_from'])
+    if filters['year_to'] is not None:
+        queryset = queryset.filter(publication_year__lte=filters['year_to'])
+    return queryset
+
+
+# Comprueba si la solicitud pide las facetas
+def facets_requested(request):
+    return request.GET.get('facets', '').lower() in TRUE_VALUES
+
+
+# Número máximo de valores devueltos por faceta
+def get_facet_limit():
+    return getattr(settings, 'BOOK_SEARCH_FACET_LIMIT', 20)
+
+
+# Cuenta los libros que coinciden con la búsqueda por género, autor y década de publicación.
+# En PostgreSQL las tres facetas se calculan en una única consulta con GROUPING SETS;
+# en otros motores se usa una consulta agrupada por faceta.
+def get_facets(queryset):
+    matches = queryset.order_by().values('id')
+
+    if connections[queryset.db].vendor == 'postgresql':
+        genres, authors, decades = _grouping_sets_facets(matches)
+    else:
+        genres, authors, decades = _grouped_facets(matches)
+
+    limit = get_facet_limit()
+    return {
+        'genres': sorted(genres, key=lambda item: (-item['count'], item['genre']))[:limit],
+        'authors': sorted(authors, key=lambda item: (-item['count'], item['full_name'] or '', item['id']))[:limit],
+        'decades': sorted(decades, key=lambda item: item['decade'])
+    }
+
+
+def _grouping_sets_facets(matches):
+    connection = connections[matches.db]
+    quote = connection.ops.quote_name
+    subquery, params = matches.query.get_compiler(using=matches.db).as_sql()
+
+    sql = f'''
+        SELECT GROUPING(g.id), GROUPING(a.id), g.id, g.genre, a.id, a.full_name,
+               b.publication_year / 10 * 10, COUNT(DISTINCT b.id)
+        FROM {quote(Book._meta.db_table)} b
+        JOIN {quote(Author._meta.db_table)} a ON a.id = b.author_id
+        LEFT JOIN {quote(Book.genre.through._meta.db_table)} bg ON bg.book_id = b.id
+        LEFT JOIN {quote(Genre._meta.db_table)} g ON g.id = bg.genre_id
+        WHERE b.id IN ({subquery})
+        GROUP BY GROUPING SETS ((g.id, g.genre), (a.id, a.full_name), (b.publication_year / 10 * 10))
+    '''
+
+    genres, authors, decades = [], [], []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for by_genre, by_author, genre_id, genre, author_id, full_name, decade, count in cursor.fetchall():
+            # GROUPING() vale 0 para las columnas que forman parte del conjunto de la fila
+            if by_genre == 0:
+                # Los libros sin géneros forman un grupo con g.id nulo que se descarta
+                if genre_id is not None:
+                    genres.append({'id': genre_id, 'genre': genre, 'count': count})
+            elif by_author == 0:
+                authors.append({'id': author_id, 'full_name': full_name, 'count': count})
+            else:
+                decades.append({'decade': decade, 'count': count})
+
+    return genres, authors, decades
+
+
+def _grouped_facets(matches):
+    genres = Genre.objects.filter(book__in=matches).values('id', 'genre').annotate(count=Count('book', distinct=True))
+    authors = Author.objects.filter(book__in=matches).values('id', 'full_name').annotate(count=Count('book', distinct=True))
+    decades = Book.objects.filter(id__in=matches).annotate(
+        decade=F('publication_year') / 10 * 10
+    ).values('decade').annotate(count=Count('id'))
+
+    return list(genres.order_by()), list(authors.order_by()), list(decades.order_by())
@@ -0,0 +1,226 @@
+import base64
+import binascii
+import json
+import re
+from contextlib import contextmanager, nullcontext
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections, transaction
+from django.db.models import Exists, F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Coalesce, Greatest, Upper
+from books_management.models import Genre
+from books_management.pagination import InvalidCursor
+from .facets import get_facets
+
+
+# Configuración de texto usada por los triggers que mantienen Book.search_vector
+SEARCH_CONFIG = 'simple'
+
+# Palabras de la consulta que se convierten en términos del tsquery
+SEARCH_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# Convierte la consulta del usuario en un tsquery con coincidencia por prefijo ("term:*")
+def build_search_query(query):
+    terms = SEARCH_TERM_RE.findall(query)
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), config=SEARCH_CONFIG, search_type='raw')
+
+
+# Búsqueda de respaldo para motores sin búsqueda de texto completo (por ejemplo SQLite)
+def substring_search(queryset, query):
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(author__full_name__icontains=query) |
+        Q(genre__genre__icontains=query)
+    ).distinct().order_by('id')
+
+
+# Busca libros sobre el índice GIN de Book.search_vector ordenando por relevancia (ts_rank).
+# En motores distintos de PostgreSQL se usa la búsqueda por subcadena. La relevancia se convierte
+# a double precision para que el valor leído sea exacto y se pueda comparar en el cursor.
+def full_text_search(queryset, query):
+    if connections[queryset.db].vendor != 'postgresql':
+        return substring_search(queryset, query)
+
+    search_query = build_search_query(query)
+    if search_query is None:
+        return queryset.none()
+
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+    ).order_by('-rank', 'id')
+
+
+# Comprueba (una vez por conexión) si la extensión pg_trgm está instalada en la base de datos
+def trigram_available(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return False
+
+    if not hasattr(connection, 'pg_trgm_installed'):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            connection.pg_trgm_installed = cursor.fetchone() is not None
+
+    return connection.pg_trgm_installed
+
+
+# Búsqueda difusa tolerante a errores tipográficos sobre los índices trigram de título, autor y género.
+# Los libros se ordenan por la mayor similitud de palabra (word_similarity) entre los tres campos.
+# En motores sin pg_trgm se usa la búsqueda por subcadena. El queryset devuelto debe evaluarse
+# dentro de similarity_threshold() para que se aplique el umbral solicitado.
+def fuzzy_matches(queryset, query):
+    if not trigram_available(queryset.db):
+        return substring_search(queryset, query)
+
+    genres = Genre.objects.alias(genre_upper=Upper('genre')).filter(book=OuterRef('pk'))
+    genre_similarity = genres.annotate(
+        similarity=TrigramWordSimilarity(query, Upper('genre'))
+    ).order_by('-similarity').values('similarity')[:1]
+
+    return queryset.alias(
+        title_upper=Upper('title'),
+        author_upper=Upper('author__full_name')
+    ).filter(
+        Q(title_upper__trigram_word_similar=query) |
+        Q(author_upper__trigram_word_similar=query) |
+        Exists(genres.filter(genre_upper__trigram_word_similar=query))
+    ).annotate(
+        similarity=Cast(Greatest(
+            TrigramWordSimilarity(query, Upper('title')),
+            Coalesce(TrigramWordSimilarity(query, Upper('author__full_name')), 0.0),
+            Coalesce(Subquery(genre_similarity), 0.0)
+        ), FloatField())
+    ).order_by('-similarity', 'id')
+
+
+# Fija el umbral del operador %> solo para la transacción abierta por el bloque
+@contextmanager
+def similarity_threshold(alias, threshold):
+    with transaction.atomic(using=alias):
+        if trigram_available(alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(threshold)])
+        yield
+
+
+# Puntuación por la que se ordenan las coincidencias (de mayor a menor y después por id), o None si
+# se ordenan solo por id (búsqueda por subcadena)
+def _score_field(matches):
+    for field in ('rank', 'similarity'):
+        if field in matches.query.annotations:
+            return field
+    return None
+
+
+# Codifica la posición de la página siguiente: el modo de búsqueda y la clave del último libro
+# devuelto, [puntuación, id] o [id]
+def encode_search_cursor(mode, values):
+    payload = json.dumps({'m': mode, 'v': list(values)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+# Decodifica un cursor de búsqueda y valida su contenido
+def decode_search_cursor(cursor, mode):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        cursor_mode, values = payload['m'], payload['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+    if cursor_mode != mode or not isinstance(values, list) or not 1 <= len(values) <= 2:
+        raise InvalidCursor(cursor)
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        raise InvalidCursor(cursor)
+    if not isinstance(values[-1], int):
+        raise InvalidCursor(cursor)
+
+    return values
+
+
+# Prepara la consulta de una página de resultados: los libros posteriores al cursor en el orden de
+# la búsqueda, con las columnas del fieldset, y uno de más para saber si existe otra página.
+# Lanza InvalidCursor si el cursor no es válido para esta búsqueda.
+def build_search_page(matches, mode, cursor=None, fieldset=None):
+    page = matches
+    if cursor:
+        values = decode_search_cursor(cursor, mode)
+        field = _score_field(matches)
+        if len(values) != (2 if field else 1):
+            raise InvalidCursor(cursor)
+        if field:
+            page = page.filter(Q(**{f'{field}__lt': values[0]}) | Q(**{field: values[0], 'id__gt': values[1]}))
+        else:
+            page = page.filter(id__gt=values[0])
+
+    page = fieldset.apply(page) if fieldset is not None else page.select_related('author').prefetch_related('genre')
+    return page[:get_page_size() + 1]
+
+
+# Construye la página a partir de los libros obtenidos y devuelve (libros, cursor siguiente o None)
+def finish_search_page(results, matches, mode):
+    page_size = get_page_size()
+    results = list(results)
+    if len(results) <= page_size:
+        return results, None
+
+    results = results[:page_size]
+    last = results[-1]
+    field = _score_field(matches)
+    return results, encode_search_cursor(mode, [getattr(last, field), last.id] if field else [last.id])
+
+
+# Ejecuta la búsqueda en el modo indicado ('text' o 'fuzzy') sobre los libros ya filtrados y
+# devuelve la página que sigue al cursor y, si se piden, las facetas calculadas sobre todas las
+# coincidencias (no solo las de la página). Con un fieldset solo se leen las columnas y relaciones
+# que éste necesita. Devuelve (libros, facetas o None, cursor siguiente o None).
+# Lanza InvalidCursor si el cursor no es válido para esta búsqueda.
+def run_search(books, query, mode, threshold=None, with_facets=False, fieldset=None, cursor=None):
+    if mode == 'fuzzy':
+        matches = fuzzy_matches(books, query)
+        context = similarity_threshold(books.db, threshold)
+    else:
+        matches = full_text_search(books, query)
+        context = nullcontext()
+
+    with context:
+        results, next_cursor = finish_search_page(build_search_page(matches, mode, cursor, fieldset), matches, mode)
+        facets = get_facets(matches) if results and with_facets else None
+
+    return results, facets, next_cursor
+
+
+# Obtiene el umbral de similitud solicitado, o el configurado por defecto
+def get_similarity_threshold(request):
+    default = getattr(settings, 'BOOK_SEARCH_SIMILARITY_THRESHOLD', 0.3)
+    value = request.GET.get('similarity')
+    if value is None:
+        return default
+
+    threshold = float(value)
+    if not 0 <= threshold <= 1:
+        raise ValueError(value)
+    return threshold
+
+
+# Número de resultados por página de una búsqueda
+def get_page_size():
+    return getattr(settings, 'BOOK_SEARCH_PAGE_SIZE', 100)
+
+
+# Serializa los libros encontrados (con autor y géneros ya cargados) para la respuesta de búsqueda
+def serialize_books(books):
+    return [{
+        'id': book.id,
+        'title': book.title,
+        'author': {
+            'id': book.author.id,
+            'full_name': book.author.full_name,
+            'email': book.author.email
+        },
+        'genres': [{'id': genre.id, 'genre': genre.genre} for genre in book.genre.all()],
+        'publication_year': book.publication_year
+    } for book in books]
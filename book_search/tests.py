@@ -3,21 +3,45 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from django.urls import reverse
 from django.test import TestCase
+from django.db import connection
+from unittest import skipUnless
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
 from books_management.models import Book, Author, Genre
+from api.testing import QueryBudgetMixin, create_budget_library
+from .search import encode_search_cursor, trigram_available
+
+
+# Recorre los resultados de una búsqueda por páginas
+class PaginatedSearchMixin:
+    # Recorre todas las páginas de una búsqueda siguiendo el cursor 'next' y devuelve los ids
+    def search_all_pages(self, url_name, params):
+        ids = []
+        params = dict(params)
+        for _ in range(10):
+            response = self.client.get(reverse(url_name), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertLessEqual(len(data['Books']), settings.BOOK_SEARCH_PAGE_SIZE)
+            ids += [book['id'] for book in data['Books']]
+            if data['next'] is None:
+                return ids
+            params['cursor'] = data['next']
+        self.fail('The cursor did not reach the last page')
 
 
 # Test para la busqueda de libros
-class SearchBooksAPITestCase(TestCase):
+class SearchBooksAPITestCase(PaginatedSearchMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
         self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
         self.genre1 = Genre.objects.create(genre='Test Genre 1')
         self.genre2 = Genre.objects.create(genre='Test Genre 2')
-        self.book1 = Book.objects.create(title='Book Title 1', author=self.author, publication_year=2000)
+        self.book1 = Book.objects.create(title='Book Title 1', author=self.author, publication_year=2000, user=self.user)
         self.book1.genre.add(self.genre1)
-        self.book2 = Book.objects.create(title='Book Title 2', author=self.author, publication_year=2005)
+        self.book2 = Book.objects.create(title='Book Title 2', author=self.author, publication_year=2005, user=self.user)
         self.book2.genre.add(self.genre2)
 
     # Prueba para la busqueda de libros autenticado
@@ -60,3 +84,324 @@ class SearchBooksAPITestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.data['message'], 'No books found matching your search')
+
+    # Prueba para la busqueda de libros por prefijo del nombre del autor
+    def test_search_books_prefix(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('search_books') + '?query=Auth'
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['Books']), 2)
+
+    # Prueba para comprobar que la busqueda solo devuelve libros del usuario actual
+    def test_search_books_other_user(self):
+        other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        token = Token.objects.create(user=other)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('search_books') + '?query=Test'
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    # Prueba para la busqueda difusa con un umbral de similitud inválido
+    def test_search_books_fuzzy_invalid_similarity(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('search_books') + '?query=Test&mode=fuzzy&similarity=2'
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba para la busqueda con un modo desconocido
+    def test_search_books_unknown_mode(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('search_books') + '?query=Test&mode=regex'
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba para comprobar que la caché de búsqueda se invalida al crear un libro
+    def test_search_books_cache_invalidated(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('search_books') + '?query=Test'
+        self.assertEqual(len(self.client.get(url).data['Books']), 2)
+
+        Book.objects.create(title='Test Book 3', author=self.author, publication_year=2010, user=self.user)
+
+        self.assertEqual(len(self.client.get(url).data['Books']), 3)
+
+    # Prueba para recorrer los resultados por páginas con el cursor, con relevancias iguales y distintas
+    def test_search_books_pagination(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        Book.objects.create(title='Book Title 3', author=self.author, publication_year=2010, user=self.user)
+        Book.objects.create(title='Test Test Book', author=self.author, publication_year=2010, user=self.user)
+        Book.objects.create(title='Test Book', author=self.author, publication_year=2010, user=self.user)
+
+        expected = [book['id'] for book in self.client.get(reverse('search_books'), {'query': 'Test'}).data['Books']]
+        self.assertEqual(len(expected), 5)
+
+        for url_name in ('search_books', 'async_search_books'):
+            cache.clear()
+            with self.settings(BOOK_SEARCH_PAGE_SIZE=2):
+                self.assertEqual(self.search_all_pages(url_name, {'query': 'Test'}), expected)
+
+    # Prueba para la búsqueda con un cursor inválido o de otro modo de búsqueda
+    def test_search_books_invalid_cursor(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        for cursor in ['invalid', encode_search_cursor('fuzzy', [1]), encode_search_cursor('text', ['a', 1]), encode_search_cursor('text', [1, 2, 3])]:
+            for url_name in ('search_books', 'async_search_books'):
+                response = self.client.get(reverse(url_name), {'query': 'Test', 'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba para la búsqueda asíncrona
+    async def test_async_search_books(self):
+        token = await Token.objects.acreate(user=self.user)
+        headers = {'Authorization': 'Token ' + token.key}
+
+        response = await self.async_client.get(reverse('async_search_books'), {'query': 'Test'}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['Books']), 2)
+
+        response = await self.async_client.get(reverse('async_search_books'), {'query': 'NonExistent'}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = await self.async_client.get(reverse('async_search_books'), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# Tests para los filtros y las facetas de la búsqueda
+class FacetedSearchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.novel = Genre.objects.create(genre='Novela')
+        self.story = Genre.objects.create(genre='Cuento')
+        self.borges = Author.objects.create(full_name='Jorge Luis Borges', email='borges@example.com')
+        self.cortazar = Author.objects.create(full_name='Julio Cortazar', email='cortazar@example.com')
+        for title, author, year, genres in (
+            ('Ficciones libro', self.borges, 1944, [self.story]),
+            ('El Aleph libro', self.borges, 1949, [self.story, self.novel]),
+            ('Rayuela libro', self.cortazar, 1963, [self.novel]),
+            ('Bestiario libro', self.cortazar, 1951, [self.story]),
+        ):
+            Book.objects.create(title=title, author=author, publication_year=year, user=self.user).genre.set(genres)
+
+    def search(self, **params):
+        return self.client.get(reverse('search_books'), {'query': 'libro', **params})
+
+    # Prueba que las facetas cuentan los libros por género, autor y década
+    def test_facets(self):
+        response = self.search(facets='true')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        facets = response.data['facets']
+        self.assertEqual(facets['genres'], [
+            {'id': self.story.id, 'genre': 'Cuento', 'count': 3},
+            {'id': self.novel.id, 'genre': 'Novela', 'count': 2},
+        ])
+        self.assertEqual(facets['authors'], [
+            {'id': self.borges.id, 'full_name': 'Jorge Luis Borges', 'count': 2},
+            {'id': self.cortazar.id, 'full_name': 'Julio Cortazar', 'count': 2},
+        ])
+        self.assertEqual(facets['decades'], [
+            {'decade': 1940, 'count': 2},
+            {'decade': 1950, 'count': 1},
+            {'decade': 1960, 'count': 1},
+        ])
+
+    # Prueba que las facetas solo se calculan cuando se solicitan
+    def test_facets_not_requested(self):
+        response = self.search()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('facets', response.data)
+
+    # Prueba que los filtros se combinan y también restringen las facetas
+    def test_filters(self):
+        response = self.search(genre='CUENTO', author='jorge luis borges', facets='1')
+
+        self.assertEqual(sorted(book['title'] for book in response.data['Books']), ['El Aleph libro', 'Ficciones libro'])
+        self.assertEqual(response.data['facets']['authors'][0]['count'], 2)
+
+        response = self.search(year_from=1950, year_to=1970)
+        self.assertEqual(sorted(book['title'] for book in response.data['Books']), ['Bestiario libro', 'Rayuela libro'])
+
+        response = self.client.get(reverse('search_books') + '?query=libro&genre=Novela&genre=Cuento')
+        self.assertEqual(len(response.data['Books']), 4)
+
+    # Prueba que la búsqueda admite ?fields= y ?expand= con la clave 'genres'
+    def test_fields(self):
+        response = self.search(fields='id,title', author='Julio Cortazar')
+        self.assertEqual(sorted(response.data['Books'][0]), ['id', 'title'])
+
+        response = self.search(fields='id', expand='genres', author='Julio Cortazar', year_from=1960)
+        self.assertEqual(response.data['Books'], [{'id': Book.objects.get(title='Rayuela libro').id, 'genres': [{'id': self.novel.id, 'genre': 'Novela'}]}])
+
+        response = self.search(fields='genre')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba que un año no numérico devuelve un error
+    def test_invalid_year(self):
+        response = self.search(year_from='abc')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba que la búsqueda asíncrona admite los mismos filtros y facetas
+    async def test_async_facets(self):
+        token = await Token.objects.aget(user=self.user)
+        response = await self.async_client.get(
+            reverse('async_search_books'), {'query': 'libro', 'author': 'Julio Cortazar', 'facets': 'true'},
+            headers={'Authorization': 'Token ' + token.key}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['Books']), 2)
+        self.assertEqual(response.json()['facets']['authors'], [
+            {'id': self.cortazar.id, 'full_name': 'Julio Cortazar', 'count': 2}
+        ])
+
+
+# Tests para la busqueda difusa con pg_trgm
+class FuzzySearchTestCase(PaginatedSearchMixin, TestCase):
+    def setUp(self):
+        if not trigram_available('default'):
+            self.skipTest('Fuzzy search requires the pg_trgm extension')
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Gabriel Garcia Marquez', email='author@example.com')
+        self.book = Book.objects.create(title='Cien años de soledad', author=self.author, publication_year=1967, user=self.user)
+        self.other = Book.objects.create(title='Rayuela', author=Author.objects.create(full_name='Julio Cortazar'), publication_year=1963, user=self.user)
+
+    # Prueba para encontrar un autor mal escrito
+    def test_fuzzy_search_misspelled_author(self):
+        response = self.client.get(reverse('search_books'), {'query': 'Garcia Marques', 'mode': 'fuzzy'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data['Books']], [self.book.id])
+
+    # Prueba para comprobar que un umbral alto descarta coincidencias lejanas
+    def test_fuzzy_search_threshold(self):
+        response = self.client.get(reverse('search_books'), {'query': 'Rayuelo', 'mode': 'fuzzy', 'similarity': 0.99})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('search_books'), {'query': 'Rayuelo', 'mode': 'fuzzy', 'similarity': 0.3})
+
+        self.assertEqual([book['id'] for book in response.data['Books']], [self.other.id])
+
+
+    # Prueba para recorrer por páginas los resultados ordenados por similitud
+    def test_fuzzy_search_pagination(self):
+        for title in ('Cien anos', 'Cien años de soledad', 'Cien sonetos'):
+            Book.objects.create(title=title, author=self.author, publication_year=1970, user=self.user)
+        params = {'query': 'Cien años', 'mode': 'fuzzy'}
+
+        expected = [book['id'] for book in self.client.get(reverse('search_books'), params).data['Books']]
+        self.assertGreater(len(expected), 2)
+
+        cache.clear()
+        with self.settings(BOOK_SEARCH_PAGE_SIZE=2):
+            self.assertEqual(self.search_all_pages('search_books', params), expected)
+
+# Tests para el documento de búsqueda de texto completo mantenido por triggers
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search requires PostgreSQL')
+class FullTextSearchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Gabriel Garcia', email='author@example.com')
+        self.genre = Genre.objects.create(genre='Realismo')
+        self.book = Book.objects.create(title='Cien años de soledad', author=self.author, publication_year=1967, user=self.user)
+
+    def search(self, query):
+        response = self.client.get(reverse('search_books'), {'query': query})
+        return [book['id'] for book in response.data.get('Books', [])]
+
+    # Prueba para comprobar que el documento se actualiza al cambiar los géneros del libro
+    def test_genre_changes_update_document(self):
+        self.assertEqual(self.search('Realismo'), [])
+
+        self.book.genre.add(self.genre)
+        self.assertEqual(self.search('Realismo'), [self.book.id])
+
+        self.book.genre.remove(self.genre)
+        self.assertEqual(self.search('Realismo'), [])
+
+    # Prueba para comprobar que renombrar autor o género actualiza el documento
+    def test_rename_author_and_genre_update_document(self):
+        self.book.genre.add(self.genre)
+
+        self.author.full_name = 'Gabo'
+        self.author.save()
+        self.genre.genre = 'Magico'
+        self.genre.save()
+
+        self.assertEqual(self.search('Gabo'), [self.book.id])
+        self.assertEqual(self.search('Magi'), [self.book.id])
+        self.assertEqual(self.search('Garcia'), [])
+
+    # Prueba para comprobar que los títulos coincidentes se ordenan primero
+    def test_results_ranked_by_relevance(self):
+        other = Book.objects.create(title='Otro libro', author=Author.objects.create(full_name='Soledad Perez'), publication_year=2000, user=self.user)
+
+        self.assertEqual(self.search('soledad'), [self.book.id, other.id])
+
+
+# Presupuestos de consultas y tiempo de respuesta de la búsqueda con bibliotecas de 1, 10 y 1000
+# libros en las que todos los libros coinciden: los resultados se paginan de BOOK_SEARCH_PAGE_SIZE en BOOK_SEARCH_PAGE_SIZE
+# y el número de consultas no debe crecer con el tamaño de la biblioteca
+class SearchQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def search(self, client, **params):
+        return client.get(reverse('search_books'), {'query': 'Bench', **params})
+
+    # Token + libros encontrados con autor + géneros de los resultados
+    def test_search_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library, lambda context: self.search(context[0]), max_queries=3, max_ms=1000
+        )
+
+        for size, response in responses.items():
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['Books']), min(size, settings.BOOK_SEARCH_PAGE_SIZE))
+
+    # Las facetas añaden una consulta por género, autor y década
+    def test_search_facets_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library, lambda context: self.search(context[0], facets='true'), max_queries=6, max_ms=1000
+        )
+
+        for response in responses.values():
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_fuzzy_search_budget(self):
+        if not trigram_available('default'):
+            self.skipTest('Fuzzy search requires the pg_trgm extension')
+
+        responses = self.assertBudgetBySize(
+            create_budget_library, lambda context: self.search(context[0], mode='fuzzy'), max_queries=3, max_ms=1000
+        )
+
+        for response in responses.values():
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,8 +1,9 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 
 # Definimos la URL de la aplicación
 urlpatterns = [
     path('', views.search_books, name='search_books'),
+    path('async', async_views.search_books, name='async_search_books'),
 ]
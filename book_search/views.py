@@ -3,15 +3,21 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from django.db.models import Q
+from rest_framework.settings import api_settings
 from books_management.models import Book
+from books_management.cache import cached_response
+from books_management.versions import library_etag
+from books_management.fieldsets import SEARCH_FIELDS, Fieldset, InvalidFieldset
+from books_management.pagination import InvalidCursor
+from .search import get_similarity_threshold, run_search, serialize_books
+from .facets import apply_filters, facets_requested, get_search_filters
 
 
 # Logica para buscar libros por titulo, autor o genero
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response('search', library_etag)
 def search_books(request):
     # Obtener el parámetro de búsqueda de la solicitud
     query = request.GET.get('query')
@@ -22,38 +28,64 @@ def search_books(request):
             'message': 'incorrect search parameters'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Realizar la consulta para encontrar libros que coincidan con el título, autor o género
-    books = Book.objects.filter(
-        Q(title__icontains=query) |
-        Q(author__full_name__icontains=query) |
-        Q(genre__genre__icontains=query),
-        user=request.user
-    ).distinct()
+    # Obtener el modo de búsqueda: texto completo (por defecto) o difusa
+    mode = request.GET.get('mode', 'text')
+    if mode not in ('text', 'fuzzy'):
+        return Response({
+            'message': 'incorrect search parameters'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Obtener los filtros por género, autor y años de publicación y los campos solicitados
+    try:
+        filters = get_search_filters(request)
+        fieldset = Fieldset.from_request(request, SEARCH_FIELDS)
+    except (ValueError, InvalidFieldset):
+        return Response({
+            'message': 'incorrect search parameters'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Los filtros se aplican sobre la misma consulta acotada al usuario que la búsqueda
+    books = apply_filters(Book.objects.filter(user=request.user), filters)
+    threshold = None
+
+    if mode == 'fuzzy':
+        # Validar el umbral de similitud solicitado
+        try:
+            threshold = get_similarity_threshold(request)
+        except ValueError:
+            return Response({
+                'message': 'incorrect search parameters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Realizar la búsqueda de texto completo (ordenada por relevancia) o difusa (ordenada por similitud),
+    # obtener la página que sigue al cursor y contar los resultados por género, autor y década si se solicita
+    cursor = request.GET.get('cursor')
+    try:
+        books, facets, next_cursor = run_search(books, query, mode, threshold, facets_requested(request), fieldset, cursor)
+    except InvalidCursor:
+        return Response({
+            'message': 'incorrect search parameters'
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     # Si el parametro de busqueda devuelve libros que no existe, devolver un mensaje de error
-    if not books:
+    if not books and not cursor:
         return Response({
             'message': 'No books found matching your search'
         }, status=status.HTTP_404_NOT_FOUND)
     
     # Serializar los libros encontrados para prepararlos para la respuesta
-    serialized_books = []
-    for book in books:
-        serialized_book = {
-            'id': book.id,
-            'title': book.title,
-            'author': {
-                'id': book.author.id,
-                'full_name': book.author.full_name,
-                'email': book.author.email
-            },
-            'genres': [{'id': genre.id, 'genre': genre.genre} for genre in book.genre.all()],
-            'publication_year': book.publication_year
-        }
-        serialized_books.append(serialized_book)
+    if fieldset is not None:
+        serialized_books = [fieldset.render(book) for book in books]
+    else:
+        serialized_books = serialize_books(books)
 
     # Devolver los detalles de los libros junto con un mensaje de éxito
-    return Response({
+    response = {
         'message': 'Correctly obtained books',
-        'Books': serialized_books
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+        'Books': serialized_books,
+        'next': next_cursor
+    }
+    if facets is not None:
+        response['facets'] = facets
+
+    return Response(response, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BooksManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books_management'
+
+    def ready(self):
+        # Conecta las señales que invalidan la caché de libros
+        from . import signals  # noqa: F401
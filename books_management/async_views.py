@@ -0,0 +1,106 @@
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from users.authentication import async_token_required
+from .models import Book
+from .pagination import InvalidCursor, apaginate_keyset, get_page_size
+from .serializers import serialize_book
+from .fieldsets import KEYSET_FIELDS, Fieldset, InvalidFieldset
+from .versions import abook_validators, alibrary_validators, async_condition
+
+
+# Versiones asíncronas (ASGI) de las vistas de lectura. Usan el ORM asíncrono, de modo que bajo
+# un servidor ASGI las consultas no bloquean un hilo por solicitud. Devuelven el mismo contenido
+# JSON y las mismas cabeceras ETag y Last-Modified que las vistas síncronas equivalentes.
+
+
+# Vista asíncrona para obtener todos los libros del usuario actual, paginados por cursor
+@require_GET
+@async_token_required
+@async_condition(alibrary_validators)
+async def get_all_books(request):
+    # Obtiene los campos solicitados con ?fields= y ?expand= (por defecto, la representación completa)
+    try:
+        fieldset = Fieldset.from_request(request)
+    except InvalidFieldset:
+        return JsonResponse({
+            'message': 'Invalid fields or expand parameter'
+        }, status=400)
+
+    # Filtra los libros pertenecientes al usuario actual cargando autor y géneros en bloque,
+    # o solo las columnas y relaciones que pide el fieldset
+    books = Book.objects.filter(user=request.user)
+    if fieldset is not None:
+        books = fieldset.apply(books, extra=KEYSET_FIELDS)
+    else:
+        books = books.select_related('author').prefetch_related('genre')
+
+    cursor = request.GET.get('cursor')
+
+    # Obtiene la página solicitada con paginación keyset sobre el ordenamiento indicado
+    try:
+        books, next_cursor, previous_cursor = await apaginate_keyset(
+            books,
+            ordering=request.GET.get('ordering', 'id'),
+            cursor=cursor,
+            page_size=get_page_size(request)
+        )
+    except InvalidCursor:
+        return JsonResponse({
+            'message': 'Invalid cursor or ordering'
+        }, status=400)
+
+    # Si no se encuentran libros en la primera página, devuelve un mensaje de error
+    if not books and not cursor:
+        return JsonResponse({
+            'message': 'Books not found for the current user'
+        }, status=404)
+
+    # Autor y géneros ya están cargados, por lo que serializar no consulta la base de datos
+    if fieldset is not None:
+        data = [fieldset.render(book) for book in books]
+    else:
+        data = [serialize_book(book) for book in books]
+
+    return JsonResponse({
+        'message': 'Correctly obtained books for the current user',
+        'Books': data,
+        'next': next_cursor,
+        'previous': previous_cursor
+    }, status=200)
+
+
+# Vista asíncrona para obtener un libro específico por su clave primaria (pk)
+@require_GET
+@async_token_required
+@async_condition(abook_validators)
+async def get_book_by_pk(request, pk):
+    try:
+        fieldset = Fieldset.from_request(request)
+    except InvalidFieldset:
+        return JsonResponse({
+            'message': 'Invalid fields or expand parameter'
+        }, status=400)
+
+    # Busca el libro en una única consulta acotada al propietario
+    books = Book.objects.filter(pk=pk, user=request.user)
+    if fieldset is not None:
+        books = fieldset.apply(books)
+    else:
+        books = books.select_related('author').prefetch_related('genre')
+    book = await books.afirst()
+
+    if book is None:
+        # Distingue entre un libro inexistente y un libro de otro usuario
+        if await Book.objects.filter(pk=pk).aexists():
+            return JsonResponse({
+                'message': 'You are not allowed to access this book'
+            }, status=403)
+
+        return JsonResponse({
+            'message': 'Book not found'
+        }, status=404)
+
+    return JsonResponse({
+        'message': 'Correctly obtained book',
+        'Book': fieldset.render(book) if fieldset is not None else serialize_book(book)
+    }, status=200)
@@ -0,0 +1,134 @@
+from django.db import router, transaction
+from django.utils import timezone
+from book_search.facets import apply_filters
+from .models import Book, normalize_key
+from .serializers import BookImportSerializer
+from .permissions import missing_book_errors
+from .versions import mark_changed
+from .normalization import batched, upsert_authors, upsert_genres
+
+
+# Importa una lista de libros para el usuario indicado.
+# Cada fila se valida por separado; las filas inválidas se devuelven como errores sin abortar
+# la importación. Las filas válidas se insertan en bloques de 'batch_size' dentro de una
+# única transacción: unas pocas consultas por bloque para autores y géneros, un bulk_create
+# para los libros y otro para las filas de la tabla intermedia de géneros.
+def import_books(user, rows, batch_size):
+    valid = []
+    errors = []
+
+    for index, row in enumerate(rows):
+        serializer = BookImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    created = []
+    BookGenre = Book.genre.through
+
+    with transaction.atomic():
+        for batch in batched(valid, batch_size):
+            # Obtiene o crea en bloque los autores y géneros del bloque (alineados con las filas)
+            authors = upsert_authors(data['author'] for data in batch)
+            genres = iter(upsert_genres(genre['genre'] for data in batch for genre in data['genre']))
+
+            books = Book.objects.bulk_create([
+                Book(
+                    user=user,
+                    title=data['title'],
+                    publication_year=data['publication_year'],
+                    author_id=author.id
+                )
+                for data, author in zip(batch, authors)
+            ])
+
+            BookGenre.objects.bulk_create([
+                BookGenre(book_id=book.id, genre_id=genre_id)
+                for book, data in zip(books, batch)
+                for genre_id in {next(genres).id for _ in data['genre']}
+            ])
+
+            created.extend(book.id for book in books)
+
+        # bulk_create no envía señales: se registra el cambio en la biblioteca del usuario y en los
+        # libros creados, en la misma transacción que los libros
+        if created:
+            mark_changed(user_ids=[user.pk], book_ids=created)
+
+    return created, errors
+
+
+# Selecciona los libros del usuario por ids o por filtro (los mismos criterios que la búsqueda) y
+# bloquea sus filas hasta el final de la transacción. Devuelve los ids seleccionados y los errores
+# de los ids pedidos que no son del usuario.
+def select_books(user, selection):
+    books = Book.objects.filter(user=user)
+    if 'ids' in selection:
+        books = books.filter(pk__in=selection['ids'])
+    else:
+        books = apply_filters(books, {
+            'genres': [normalize_key(genre) for genre in selection['filter']['genre']],
+            'authors': [normalize_key(author) for author in selection['filter']['author']],
+            'year_from': selection['filter']['year_from'],
+            'year_to': selection['filter']['year_to'],
+        })
+
+    ids = list(books.select_for_update().order_by('pk').values_list('pk', flat=True))
+    errors = missing_book_errors(selection['ids'], set(ids)) if 'ids' in selection else []
+    return ids, errors
+
+
+# Elimina en bloque los libros seleccionados del usuario en una única transacción: una consulta para
+# seleccionarlos, otra para registrar sus eliminaciones para el feed de cambios y un DELETE para los
+# libros y otro para sus filas de la tabla intermedia, sin cargar las instancias ni enviar señales.
+# Los libros se borran antes que la tabla intermedia: la clave foránea de la tabla
+# intermedia se comprueba al confirmar y así el trigger de búsqueda de esa tabla no recalcula
+# libros que ya no existen.
+def delete_books(user, selection):
+    using = router.db_for_write(Book)
+
+    with transaction.atomic(using=using):
+        ids, errors = select_books(user, selection)
+        if ids:
+            mark_changed(user_ids=[user.pk], deleted_ids=ids)
+            Book.objects.filter(pk__in=ids)._raw_delete(using)
+            Book.genre.through.objects.filter(book_id__in=ids)._raw_delete(using)
+
+    return ids, errors
+
+
+# Modifica en bloque los libros seleccionados del usuario ('changes' incluye también la selección,
+# por ids o por filtro) en una única transacción: un UPDATE para el año de publicación y unas pocas
+# sentencias por conjunto para los géneros (borrado de las filas de la tabla intermedia y un
+# bulk_create para las nuevas).
+def update_books(user, changes):
+    using = router.db_for_write(Book)
+    BookGenre = Book.genre.through
+
+    with transaction.atomic(using=using):
+        ids, errors = select_books(user, changes)
+        if not ids:
+            return ids, errors
+
+        if 'publication_year' in changes:
+            Book.objects.filter(pk__in=ids).update(publication_year=changes['publication_year'], updated_at=timezone.now())
+
+        if 'genre' in changes:
+            BookGenre.objects.filter(book_id__in=ids)._raw_delete(using)
+        if 'remove_genre' in changes:
+            keys = [normalize_key(genre['genre']) for genre in changes['remove_genre']]
+            BookGenre.objects.filter(book_id__in=ids, genre__genre_key__in=keys)._raw_delete(using)
+
+        genres = changes.get('genre') or changes.get('add_genre')
+        if genres:
+            genre_ids = {genre.id for genre in upsert_genres(genre['genre'] for genre in genres)}
+            BookGenre.objects.bulk_create(
+                [BookGenre(book_id=book_id, genre_id=genre_id) for book_id in ids for genre_id in genre_ids],
+                ignore_conflicts=True
+            )
+
+        # El UPDATE del año ya actualiza updated_at; los cambios de géneros lo actualizan aquí
+        mark_changed(user_ids=[user.pk], book_ids=ids, touch_books='publication_year' not in changes)
+
+    return ids, errors
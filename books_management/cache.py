@@ -0,0 +1,123 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Book
+
+
+# Contadores de aciertos y fallos de la caché por tipo de respuesta (en este proceso)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'BOOKS_CACHE_ALIAS', 'default')]
+
+
+def _record(kind, result):
+    with _stats_lock:
+        _stats[(kind, result)] += 1
+
+
+# Devuelve los contadores de aciertos y fallos: {kind: {'hits': n, 'misses': n}}
+def get_cache_stats():
+    with _stats_lock:
+        kinds = {kind for kind, _ in _stats}
+        return {kind: {'hits': _stats[(kind, 'hit')], 'misses': _stats[(kind, 'miss')]} for kind in kinds}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+# Obtiene el valor actual de un contador de versión. Si no existe (o fue desalojado) se inicializa
+# con la hora actual en nanosegundos, de modo que nunca se reutiliza un valor ya usado en una clave.
+def _get_counter(key):
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def _bump_counter(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+# Incrementa la generación de la biblioteca del usuario (invalida listados y búsquedas)
+# y la versión de los libros indicados (invalida su detalle). Se incrementa de inmediato y otra
+# vez al confirmar la transacción, para que una lectura concurrente no vuelva a guardar datos antiguos.
+def invalidate(user_ids=(), book_ids=()):
+    keys = [f'books:gen:{user_id}' for user_id in set(user_ids)]
+    keys += [f'books:ver:{book_id}' for book_id in set(book_ids)]
+    if not keys:
+        return
+
+    def bump():
+        for key in keys:
+            _bump_counter(key)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+# Construye la clave de caché de una respuesta. Los listados y búsquedas dependen de la generación
+# de la biblioteca del usuario y el detalle de la versión del libro; ambos incluyen los parámetros de la
+# solicitud (cursor, ?fields=...). La fecha de alta del usuario evita colisiones si un id de usuario se reutiliza.
+# Si la solicitud lee de una réplica, la generación (que cambia al escribir en la principal) no basta:
+# una réplica con retraso devolvería datos antiguos que se guardarían con la generación nueva. La clave
+# incluye entonces la ETag de 'etag_func', calculada con la versión leída de la misma réplica.
+def make_key(kind, request, kwargs, etag_func=None):
+    user = request.user
+    owner = f'{user.pk}.{int(user.date_joined.timestamp() * 1000000)}'
+
+    params = hashlib.md5(request.GET.urlencode().encode()).hexdigest() if request.GET else '-'
+    if etag_func is not None and router.db_for_read(Book) != router.db_for_write(Book):
+        params += ':' + str(etag_func(request, **kwargs)).strip('"')
+
+    if 'pk' in kwargs:
+        version = _get_counter(f'books:ver:{kwargs["pk"]}')
+        return f'books:{kind}:{owner}:{kwargs["pk"]}:{version}:{params}'
+
+    generation = _get_counter(f'books:gen:{user.pk}')
+    return f'books:{kind}:{owner}:{generation}:{params}'
+
+
+# Decorador de caché de lectura: devuelve la representación guardada si existe y, si no, ejecuta
+# la vista y guarda su respuesta cuando es correcta (200). Debe aplicarse después de api_view y de
+# las clases de autenticación/permisos, y antes de check_book_owner para evitar su consulta.
+# 'etag_func' es la función de la ETag de la vista (ver make_key).
+def cached_response(kind, etag_func=None):
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = make_key(kind, request, kwargs, etag_func)
+            data = _cache().get(key)
+
+            if data is not None:
+                _record(kind, 'hit')
+                return Response(data, status=status.HTTP_200_OK)
+
+            _record(kind, 'miss')
+            response = view_func(request, *args, **kwargs)
+
+            if response.status_code == status.HTTP_200_OK:
+                _cache().set(key, response.data, getattr(settings, 'BOOKS_CACHE_TIMEOUT', 300))
+
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+from django.db import router, transaction
+from django.db.models import Max, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Greatest
+from .models import Book, BookTombstone, Genre, LibraryVersion
+from .serializers import serialize_book
+
+
+# Excepción lanzada cuando el token 'since' no se puede interpretar
+class InvalidSyncToken(Exception):
+    pass
+
+
+# Excepción lanzada cuando los registros de eliminaciones posteriores al token ya se han purgado y el
+# cliente necesita una sincronización completa
+class SyncTokenExpired(Exception):
+    pass
+
+
+# Codifica la posición en el feed de cambios: la versión de la biblioteca y, si la página terminó a
+# mitad de una versión, el último libro devuelto de esa versión
+def encode_token(version, book_id=None):
+    payload = {'v': version} if book_id is None else {'v': version, 'i': book_id}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+# Decodifica un token opaco y valida su contenido: devuelve (versión, id del libro o None)
+def decode_token(token):
+    try:
+        padding = '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(token + padding))
+        version, book_id = payload['v'], payload.get('i')
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidSyncToken(token)
+
+    if not isinstance(version, int) or version < 0 or not (book_id is None or isinstance(book_id, int)):
+        raise InvalidSyncToken(token)
+
+    return version, book_id
+
+
+# Filtro "(versión, id) > (v, i)" sobre los campos indicados
+def _after(version_field, id_field, version, book_id):
+    if book_id is None:
+        return Q(**{f'{version_field}__gt': version})
+    return Q(**{f'{version_field}__gt': version}) | Q(**{version_field: version, f'{id_field}__gt': book_id})
+
+
+# Obtiene una página del feed de cambios de la biblioteca de 'library' (LibraryVersion del usuario):
+# los libros creados o modificados y los eliminados después de la posición del token, ordenados por
+# (versión, id) y hasta la versión actual de la biblioteca, de modo que una versión solo se devuelve
+# cuando todas las anteriores están confirmadas. Sin token devuelve la biblioteca completa (sin
+# eliminaciones) para la sincronización inicial. Son dos consultas keyset limitadas (más la de
+# géneros), así que el coste depende de los cambios, no del tamaño de la biblioteca. Todo se lee de
+# la base principal, de donde se lee también la versión (get_or_create): una réplica con retraso
+# podría no tener todavía los libros o eliminaciones de versiones ya incluidas en el token.
+# Devuelve (cambios, token siguiente, hay más).
+# Lanza InvalidSyncToken o SyncTokenExpired si el token no es válido o ha caducado.
+def get_changes(library, token, page_size):
+    using = router.db_for_write(LibraryVersion)
+    current = library.version
+    books = Book.objects.using(using).filter(user_id=library.user_id, change_version__lte=current)
+    tombstones = BookTombstone.objects.using(using).none()
+
+    if token is not None:
+        version, book_id = decode_token(token)
+        # Con la versión purgada a medias (token con id) también pueden faltar eliminaciones. Los
+        # registros empiezan en la versión 1, así que con pruned_version 0 no se ha purgado nada.
+        pruned = library.pruned_version
+        if version < pruned or (pruned and version == pruned and book_id is not None):
+            raise SyncTokenExpired(token)
+        books = books.filter(_after('change_version', 'id', version, book_id))
+        tombstones = BookTombstone.objects.using(using).filter(
+            _after('version', 'book_id', version, book_id), user_id=library.user_id, version__lte=current
+        )
+
+    books = books.select_related('author').prefetch_related(
+        Prefetch('genre', queryset=Genre.objects.using(using))
+    ).order_by('change_version', 'id')[:page_size + 1]
+    tombstones = tombstones.order_by('version', 'book_id').values_list('version', 'book_id')[:page_size + 1]
+
+    changes = sorted(
+        [((book.change_version, book.id), {'id': book.id, 'deleted': False, 'Book': serialize_book(book)}) for book in books] +
+        [((version, book_id), {'id': book_id, 'deleted': True}) for version, book_id in tombstones],
+        key=lambda change: change[0]
+    )
+
+    has_more = len(changes) > page_size
+    changes = changes[:page_size]
+    if has_more:
+        next_token = encode_token(*changes[-1][0])
+    else:
+        next_token = encode_token(current)
+
+    return [change for _, change in changes], next_token, has_more
+
+
+# Elimina los registros de eliminaciones anteriores a 'before' y guarda en la versión de cada
+# biblioteca afectada la última versión purgada, a partir de la cual los tokens anteriores caducan.
+# Devuelve el número de registros eliminados.
+def prune_tombstones(before):
+    old = BookTombstone.objects.filter(deleted_at__lt=before)
+    pruned = old.filter(user_id=OuterRef('user_id')).values('user_id').annotate(last=Max('version')).values('last')
+
+    with transaction.atomic(using=router.db_for_write(BookTombstone)):
+        LibraryVersion.objects.filter(user_id__in=old.values('user_id')).update(
+            pruned_version=Greatest('pruned_version', Subquery(pruned))
+        )
+        deleted, _ = old.delete()
+
+    return deleted
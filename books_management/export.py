@@ -0,0 +1,73 @@
+import csv
+from django.conf import settings
+from django.db import connections
+from django.db.models import Prefetch
+from api.renderers import FastJSONRenderer
+from .models import Genre
+from .serializers import serialize_book
+
+
+# Columnas de la exportación en CSV
+CSV_COLUMNS = ['id', 'title', 'author_full_name', 'author_email', 'genres', 'publication_year']
+
+
+# Objeto tipo archivo que devuelve la línea escrita en lugar de almacenarla
+class Echo:
+    def write(self, value):
+        return value
+
+
+# Recorre los libros con un cursor del lado del servidor, precargando autor y géneros por bloque,
+# de modo que solo un bloque de libros permanece en memoria en cada momento. Si los cursores del
+# lado del servidor están desactivados (PgBouncer en modo transacción) los bloques se leen con
+# consultas independientes paginadas por id. Los géneros de cada libro se ordenan por id para que
+# dos exportaciones de la misma biblioteca sean idénticas.
+def iter_books(queryset):
+    chunk_size = getattr(settings, 'BOOKS_EXPORT_CHUNK_SIZE', 2000)
+    genres = Prefetch('genre', queryset=Genre.objects.order_by('id'))
+    books = queryset.select_related('author').prefetch_related(genres).order_by('id')
+
+    connection = connections[books.db]
+    if connection.vendor == 'postgresql' and connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        return iter_keyset_chunks(books, chunk_size)
+    return books.iterator(chunk_size=chunk_size)
+
+
+def iter_keyset_chunks(books, chunk_size):
+    last_id = 0
+    while True:
+        chunk = list(books.filter(id__gt=last_id)[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1].id
+
+
+# Genera una línea JSON por libro con la misma forma que BookSerializer, codificada como las respuestas de la API
+def export_ndjson(queryset):
+    renderer = FastJSONRenderer()
+    for book in iter_books(queryset):
+        yield renderer.render(serialize_book(book)) + b'\n'
+
+
+# Genera una fila CSV por libro, con los géneros separados por ';'
+def export_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+
+    for book in iter_books(queryset):
+        yield writer.writerow([
+            book.id,
+            book.title,
+            book.author.full_name,
+            book.author.email,
+            ';'.join(genre.genre for genre in book.genre.all()),
+            book.publication_year
+        ])
+
+
+# Formatos de exportación disponibles: (generador, tipo de contenido)
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+}
@@ -0,0 +1,92 @@
+from django.db.models import Prefetch
+from .models import Genre
+from .pagination import KEYSET_ORDERINGS
+
+
+# Campos de la representación de un libro en las vistas de libros y en la búsqueda
+BOOK_FIELDS = ('id', 'user', 'title', 'author', 'genre', 'publication_year')
+SEARCH_FIELDS = ('id', 'title', 'author', 'genres', 'publication_year')
+
+# Columnas necesarias para la paginación keyset con cualquier ordenamiento
+KEYSET_FIELDS = tuple(sorted({field for fields in KEYSET_ORDERINGS.values() for field in fields}))
+
+
+# Excepción lanzada cuando ?fields= o ?expand= contienen campos desconocidos
+class InvalidFieldset(Exception):
+    pass
+
+
+def _split(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+# Representación parcial de un libro solicitada con ?fields= y ?expand=.
+# 'fields' selecciona los campos de primer nivel (por defecto todos) y las relaciones (autor y
+# géneros) se devuelven como ids salvo que aparezcan en 'expand', que además las incluye.
+# La consulta solo lee las columnas necesarias y solo une o precarga las relaciones pedidas.
+class Fieldset:
+    def __init__(self, fields, expand, genre_field):
+        self.fields = fields
+        self.expand = expand
+        self.genre_field = genre_field
+
+    # Construye el fieldset de la solicitud, o devuelve None si no se usa ?fields= ni ?expand=
+    @classmethod
+    def from_request(cls, request, available=BOOK_FIELDS):
+        if 'fields' not in request.GET and 'expand' not in request.GET:
+            return None
+
+        genre_field = 'genres' if 'genres' in available else 'genre'
+        requested = _split(request.GET.get('fields')) or set(available)
+        expand = _split(request.GET.get('expand'))
+
+        unknown = (requested - set(available)) | (expand - {'author', genre_field})
+        if unknown:
+            raise InvalidFieldset(', '.join(sorted(unknown)))
+
+        requested |= expand
+        return cls(tuple(field for field in available if field in requested), expand, genre_field)
+
+    # Restringe el queryset a las columnas y relaciones del fieldset.
+    # 'extra' añade columnas que la vista necesita aunque no se devuelvan (por ejemplo el ordenamiento).
+    def apply(self, queryset, extra=()):
+        columns = {'id', *extra}
+
+        for field in self.fields:
+            if field == 'author':
+                if 'author' in self.expand:
+                    queryset = queryset.select_related('author')
+                    columns.update(('author__id', 'author__full_name', 'author__email'))
+                else:
+                    columns.add('author')
+            elif field == self.genre_field:
+                genres = Genre.objects.only('id', 'genre') if field in self.expand else Genre.objects.only('id')
+                queryset = queryset.prefetch_related(Prefetch('genre', queryset=genres))
+            else:
+                columns.add(field)
+
+        return queryset.only(*columns)
+
+    # Representa un libro con los campos del fieldset como diccionario
+    def render(self, book):
+        data = {}
+        for field in self.fields:
+            if field == 'author':
+                if 'author' in self.expand:
+                    data['author'] = {
+                        'id': book.author.id,
+                        'full_name': book.author.full_name,
+                        'email': book.author.email
+                    }
+                else:
+                    data['author'] = book.author_id
+            elif field == self.genre_field:
+                if field in self.expand:
+                    data[field] = [{'id': genre.id, 'genre': genre.genre} for genre in book.genre.all()]
+                else:
+                    data[field] = [genre.id for genre in book.genre.all()]
+            elif field == 'user':
+                data['user'] = book.user_id
+            else:
+                data[field] = getattr(book, field)
+        return data
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from books_management.normalization import BATCH_SIZE, fill_keys, merge_duplicates
+
+
+# Fusiona los autores y géneros duplicados (mismo nombre sin distinguir mayúsculas ni espacios)
+# reasignando en bloque sus libros y filas de la tabla intermedia al registro con menor id
+class Command(BaseCommand):
+    help = 'Merge duplicate authors and genres into a single row per normalized key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many duplicates would be merged')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per bulk statement')
+
+    def handle(self, *args, **options):
+        authors, genres = merge_duplicates(batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        if not options['dry_run']:
+            # Recalcula las claves de los registros conservados por si se modificaron sin pasar por save()
+            fill_keys(batch_size=options['batch_size'])
+
+        verb = 'Would merge' if options['dry_run'] else 'Merged'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {authors} duplicate authors and {genres} duplicate genres'))
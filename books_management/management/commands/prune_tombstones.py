@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from books_management.changes import prune_tombstones
+
+
+# Purga los registros de libros eliminados más antiguos que el plazo de retención. Los clientes
+# cuyo token sea anterior a lo purgado reciben 410 y deben hacer una sincronización completa.
+class Command(BaseCommand):
+    help = 'Delete change feed tombstones older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.BOOKS_TOMBSTONE_RETENTION_DAYS, help='Days of tombstones to keep'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones'))
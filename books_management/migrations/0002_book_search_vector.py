@@ -0,0 +1,139 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:34
+
+import django.contrib.postgres.search
+from django.db import migrations
+from books_management.operations import RunPostgreSQL
+
+
+# Documento de búsqueda de un libro: título (peso A), nombre del autor (peso B) y géneros (peso C)
+BOOK_DOCUMENT_FUNCTION = '''
+CREATE OR REPLACE FUNCTION books_management_book_document(p_title text, p_author_id bigint, p_book_id bigint)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(
+            (SELECT full_name FROM books_management_author WHERE id = p_author_id), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(
+            (SELECT string_agg(g.genre, ' ')
+               FROM books_management_book_genre bg
+               JOIN books_management_genre g ON g.id = bg.genre_id
+              WHERE bg.book_id = p_book_id), '')), 'C')
+$$ LANGUAGE sql STABLE;
+'''
+
+# El propio libro recalcula su documento al insertarse o al cambiar título o autor
+BOOK_TRIGGER = '''
+CREATE OR REPLACE FUNCTION books_management_book_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := books_management_book_document(NEW.title, NEW.author_id, NEW.id);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_management_book_search_vector
+    BEFORE INSERT OR UPDATE OF title, author_id ON books_management_book
+    FOR EACH ROW EXECUTE FUNCTION books_management_book_search_vector_trigger();
+'''
+
+# Altas y bajas en la tabla intermedia de géneros, a nivel de sentencia para que los
+# bulk_create y los borrados masivos recalculen cada libro afectado una sola vez
+BOOK_GENRE_TRIGGERS = '''
+CREATE OR REPLACE FUNCTION books_management_book_genre_inserted() RETURNS trigger AS $$
+BEGIN
+    UPDATE books_management_book b
+       SET search_vector = books_management_book_document(b.title, b.author_id, b.id)
+     WHERE b.id IN (SELECT DISTINCT book_id FROM changed_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION books_management_book_genre_deleted() RETURNS trigger AS $$
+BEGIN
+    UPDATE books_management_book b
+       SET search_vector = books_management_book_document(b.title, b.author_id, b.id)
+     WHERE b.id IN (SELECT DISTINCT book_id FROM changed_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_management_book_genre_search_vector_insert
+    AFTER INSERT ON books_management_book_genre
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION books_management_book_genre_inserted();
+
+CREATE TRIGGER books_management_book_genre_search_vector_delete
+    AFTER DELETE ON books_management_book_genre
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION books_management_book_genre_deleted();
+'''
+
+# Cambios de nombre de autores y géneros se propagan a todos los libros que los usan
+AUTHOR_GENRE_TRIGGERS = '''
+CREATE OR REPLACE FUNCTION books_management_author_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE books_management_book b
+       SET search_vector = books_management_book_document(b.title, b.author_id, b.id)
+     WHERE b.author_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_management_author_search_vector
+    AFTER UPDATE OF full_name ON books_management_author
+    FOR EACH ROW WHEN (OLD.full_name IS DISTINCT FROM NEW.full_name)
+    EXECUTE FUNCTION books_management_author_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION books_management_genre_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE books_management_book b
+       SET search_vector = books_management_book_document(b.title, b.author_id, b.id)
+     WHERE b.id IN (SELECT book_id FROM books_management_book_genre WHERE genre_id = NEW.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_management_genre_search_vector
+    AFTER UPDATE OF genre ON books_management_genre
+    FOR EACH ROW WHEN (OLD.genre IS DISTINCT FROM NEW.genre)
+    EXECUTE FUNCTION books_management_genre_search_vector_trigger();
+'''
+
+DROP_TRIGGERS = '''
+DROP TRIGGER IF EXISTS books_management_genre_search_vector ON books_management_genre;
+DROP TRIGGER IF EXISTS books_management_author_search_vector ON books_management_author;
+DROP TRIGGER IF EXISTS books_management_book_genre_search_vector_delete ON books_management_book_genre;
+DROP TRIGGER IF EXISTS books_management_book_genre_search_vector_insert ON books_management_book_genre;
+DROP TRIGGER IF EXISTS books_management_book_search_vector ON books_management_book;
+DROP FUNCTION IF EXISTS books_management_genre_search_vector_trigger();
+DROP FUNCTION IF EXISTS books_management_author_search_vector_trigger();
+DROP FUNCTION IF EXISTS books_management_book_genre_deleted();
+DROP FUNCTION IF EXISTS books_management_book_genre_inserted();
+DROP FUNCTION IF EXISTS books_management_book_search_vector_trigger();
+DROP FUNCTION IF EXISTS books_management_book_document(text, bigint, bigint);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        RunPostgreSQL(
+            sql=[BOOK_DOCUMENT_FUNCTION, BOOK_TRIGGER, BOOK_GENRE_TRIGGERS, AUTHOR_GENRE_TRIGGERS],
+            reverse_sql=DROP_TRIGGERS,
+        ),
+        RunPostgreSQL(
+            sql='UPDATE books_management_book SET search_vector = books_management_book_document(title, author_id, id);',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        RunPostgreSQL(
+            sql='CREATE INDEX books_management_book_search_vector_gin ON books_management_book USING gin (search_vector);',
+            reverse_sql='DROP INDEX IF EXISTS books_management_book_search_vector_gin;',
+        ),
+    ]
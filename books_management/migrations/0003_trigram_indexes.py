@@ -0,0 +1,44 @@
+from django.db import migrations
+from books_management.operations import RunPostgreSQL
+
+
+# Índices trigram sobre las mismas expresiones que genera icontains en PostgreSQL
+# (UPPER(columna::text)), de modo que sirven tanto para la búsqueda difusa como para
+# las búsquedas por subcadena. Si el servidor no dispone de pg_trgm se omiten con un aviso.
+CREATE_TRIGRAM_INDEXES = '''
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS books_management_book_title_trgm
+            ON books_management_book USING gin (UPPER(title::text) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS books_management_author_full_name_trgm
+            ON books_management_author USING gin (UPPER(full_name::text) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS books_management_genre_genre_trgm
+            ON books_management_genre USING gin (UPPER(genre::text) gin_trgm_ops);
+    ELSE
+        RAISE WARNING 'pg_trgm is not available: fuzzy search and trigram indexes are disabled';
+    END IF;
+END
+$$;
+'''
+
+DROP_TRIGRAM_INDEXES = '''
+DROP INDEX IF EXISTS books_management_genre_genre_trgm;
+DROP INDEX IF EXISTS books_management_author_full_name_trgm;
+DROP INDEX IF EXISTS books_management_book_title_trgm;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books_management', '0002_book_search_vector'),
+    ]
+
+    operations = [
+        RunPostgreSQL(
+            sql=CREATE_TRIGRAM_INDEXES,
+            reverse_sql=DROP_TRIGRAM_INDEXES,
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:54
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books_management', '0003_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['full_name', 'email'], name='author_name_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['user', 'id'], name='book_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['user', 'publication_year', 'id'], name='book_user_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(models.F('user'), django.db.models.functions.text.Lower('title'), name='book_user_title_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['genre'], name='genre_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(django.db.models.functions.text.Lower('genre'), name='genre_lower_idx'),
+        ),
+        # Índice inverso de la tabla intermedia Book.genre: la restricción única ya cubre
+        # (book_id, genre_id); este índice resuelve los libros de un género sin leer la tabla
+        migrations.RunSQL(
+            'CREATE INDEX book_genre_genre_book_idx ON books_management_book_genre (genre_id, book_id)',
+            reverse_sql='DROP INDEX book_genre_genre_book_idx',
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:59
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+# Copia de la normalización de books_management.models en el momento de esta migración (la migración
+# no debe depender del código de la aplicación)
+def normalize_key(value):
+    return ' '.join((value or '').split()).casefold()
+
+
+# Agrupa los ids por clave y devuelve {id duplicado: id conservado}, conservando el de menor id
+def find_duplicates(rows):
+    keepers = {}
+    duplicates = {}
+    for pk, key in sorted(rows):
+        if key in keepers:
+            duplicates[pk] = keepers[key]
+        else:
+            keepers[key] = pk
+    return duplicates
+
+
+def batched(items, size=1000):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Calcula las claves normalizadas y fusiona los duplicados en el de menor id: reasigna los libros y
+# las filas de la tabla intermedia y elimina los duplicados. Las restricciones únicas se crean en la
+# migración siguiente: en PostgreSQL las claves ajenas son diferidas y no se puede alterar una tabla
+# con comprobaciones pendientes en la misma transacción.
+def normalize_authors_and_genres(apps, schema_editor):
+    Author = apps.get_model('books_management', 'Author')
+    Genre = apps.get_model('books_management', 'Genre')
+    Book = apps.get_model('books_management', 'Book')
+    BookGenre = Book.genre.through
+
+    authors = list(Author.objects.only('full_name', 'email'))
+    for author in authors:
+        author.full_name_key = normalize_key(author.full_name)
+        author.email_key = normalize_key(author.email)
+    Author.objects.bulk_update(authors, ['full_name_key', 'email_key'], batch_size=1000)
+
+    genres = list(Genre.objects.only('genre'))
+    for genre in genres:
+        genre.genre_key = normalize_key(genre.genre)
+    Genre.objects.bulk_update(genres, ['genre_key'], batch_size=1000)
+
+    author_duplicates = find_duplicates((author.pk, (author.full_name_key, author.email_key)) for author in authors)
+    genre_duplicates = find_duplicates((genre.pk, genre.genre_key) for genre in genres)
+
+    for batch in batched(list(author_duplicates.items())):
+        Book.objects.filter(author_id__in=[duplicate for duplicate, _ in batch]).update(
+            author_id=Case(*[When(author_id=duplicate, then=Value(keeper)) for duplicate, keeper in batch])
+        )
+    for batch in batched(list(genre_duplicates)):
+        rows = BookGenre.objects.filter(genre_id__in=batch).values_list('book_id', 'genre_id')
+        BookGenre.objects.bulk_create(
+            [BookGenre(book_id=book_id, genre_id=genre_duplicates[genre_id]) for book_id, genre_id in rows],
+            ignore_conflicts=True
+        )
+        BookGenre.objects.filter(genre_id__in=batch).delete()
+
+    for batch in batched(list(author_duplicates)):
+        Author.objects.filter(id__in=batch).delete()
+    for batch in batched(list(genre_duplicates)):
+        Genre.objects.filter(id__in=batch).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books_management', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='author',
+            name='author_name_email_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='genre',
+            name='genre_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='genre',
+            name='genre_lower_idx',
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='email_key',
+            field=models.CharField(default='', editable=False, max_length=762),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='full_name_key',
+            field=models.CharField(default='', editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='genre_key',
+            field=models.CharField(default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(normalize_authors_and_genres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books_management', '0005_normalized_keys'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='author',
+            constraint=models.UniqueConstraint(fields=('full_name_key', 'email_key'), name='author_unique_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='genre',
+            constraint=models.UniqueConstraint(fields=('genre_key',), name='genre_unique_key'),
+        ),
+    ]
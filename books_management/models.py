@@ -1,11 +1,32 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Lower
+
+
+# Normaliza un nombre para compararlo: sin espacios sobrantes ni distinción de mayúsculas
+def normalize_key(value):
+    return ' '.join((value or '').split()).casefold()
 
 
 # Modelo para los autores de los libros
 class Author(models.Model):
     full_name = models.CharField(max_length=100, null=True)
     email = models.EmailField(null=True)
+    # Claves normalizadas que identifican al autor sin duplicados. casefold() puede multiplicar por
+    # tres la longitud (por ejemplo 'ΐ'), así que admiten el triple que los campos de origen.
+    full_name_key = models.CharField(max_length=300, editable=False, default='')
+    email_key = models.CharField(max_length=762, editable=False, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['full_name_key', 'email_key'], name='author_unique_key'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.full_name_key = normalize_key(self.full_name)
+        self.email_key = normalize_key(self.email)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.full_name
@@ -14,6 +35,17 @@ class Author(models.Model):
 # Modelo para el genero de los libors
 class Genre(models.Model):
     genre = models.CharField(max_length=50, null=False)
+    # Clave normalizada que identifica al género sin duplicados (hasta el triple del nombre, como en Author)
+    genre_key = models.CharField(max_length=150, editable=False, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['genre_key'], name='genre_unique_key'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.genre_key = normalize_key(self.genre)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.genre
@@ -26,6 +58,56 @@ class Book(models.Model):
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
     genre = models.ManyToManyField(Genre)
     publication_year = models.PositiveIntegerField(null=False)
+    # Documento de búsqueda (título, autor y géneros) mantenido por triggers en PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Fecha de la última modificación del libro (incluidos cambios en sus géneros o en su autor)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Versión de la biblioteca del propietario en la última modificación del libro (feed de cambios)
+    change_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Todas las consultas se acotan al usuario y después se ordenan o filtran por id,
+        # año de publicación o título
+        indexes = [
+            models.Index(fields=['user', 'id'], name='book_user_id_idx'),
+            models.Index(fields=['user', 'publication_year', 'id'], name='book_user_year_idx'),
+            models.Index('user', Lower('title'), name='book_user_title_lower_idx'),
+            models.Index(fields=['user', 'change_version', 'id'], name='book_user_change_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    # Recuerda el propietario con el que se leyó el libro, para detectar en pre_save si cambia sin
+    # consultarlo de nuevo
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        return instance
+
+
+# Versión de la biblioteca de cada usuario: cambia con cualquier modificación de sus libros
+# y permite responder a las peticiones condicionales del listado sin consultar los libros
+class LibraryVersion(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Versión de los registros de libros eliminados más reciente ya purgada: los tokens del feed de
+    # cambios anteriores a ella ya no son válidos
+    pruned_version = models.PositiveBigIntegerField(default=0)
+
+
+# Registro de un libro eliminado, con la versión de la biblioteca en la que se eliminó, para que el
+# feed de cambios pueda informar de las eliminaciones. Se purgan con el comando prune_tombstones.
+class BookTombstone(models.Model):
+    book_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    version = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'version', 'book_id'], name='tombstone_user_version_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
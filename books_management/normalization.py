@@ -0,0 +1,167 @@
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from .models import Author, Book, Genre, normalize_key
+from .versions import mark_changed
+
+
+# Tamaño de bloque de las inserciones y actualizaciones en bloque
+BATCH_SIZE = 1000
+
+
+# Divide una lista en bloques del tamaño indicado
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Clave normalizada de un autor a partir de sus datos ({'full_name': ..., 'email': ...})
+def author_key(data):
+    return normalize_key(data.get('full_name')), normalize_key(data.get('email'))
+
+
+# Obtiene o crea los autores indicados (diccionarios con full_name y email) y los devuelve
+# en el mismo orden. Los existentes se leen en una consulta; los que faltan se insertan en
+# bloque con ON CONFLICT DO NOTHING sobre la clave única y se vuelven a leer, de modo que dos
+# solicitudes concurrentes con el mismo autor terminan usando la misma fila.
+def upsert_authors(authors, batch_size=BATCH_SIZE):
+    authors = list(authors)
+    pending = {}
+    for data in authors:
+        pending.setdefault(author_key(data), data)
+
+    def lookup(keys):
+        names = {name for name, _ in keys}
+        emails = {email for _, email in keys}
+        return {
+            (author.full_name_key, author.email_key): author
+            for author in Author.objects.filter(full_name_key__in=names, email_key__in=emails)
+            if (author.full_name_key, author.email_key) in keys
+        }
+
+    found = {}
+    for keys in batched(list(pending), batch_size):
+        keys = set(keys)
+        found.update(lookup(keys))
+        missing = keys - found.keys()
+        if missing:
+            Author.objects.bulk_create([
+                Author(
+                    full_name=pending[key].get('full_name'),
+                    email=pending[key].get('email'),
+                    full_name_key=key[0],
+                    email_key=key[1]
+                )
+                for key in missing
+            ], ignore_conflicts=True)
+            found.update(lookup(missing))
+
+    return [found[author_key(data)] for data in authors]
+
+
+# Obtiene o crea los géneros indicados por nombre y los devuelve en el mismo orden,
+# con el mismo esquema de inserción en bloque que upsert_authors
+def upsert_genres(names, batch_size=BATCH_SIZE):
+    names = list(names)
+    pending = {}
+    for name in names:
+        pending.setdefault(normalize_key(name), name)
+
+    def lookup(keys):
+        return {genre.genre_key: genre for genre in Genre.objects.filter(genre_key__in=keys)}
+
+    found = {}
+    for keys in batched(list(pending), batch_size):
+        keys = set(keys)
+        found.update(lookup(keys))
+        missing = keys - found.keys()
+        if missing:
+            Genre.objects.bulk_create(
+                [Genre(genre=pending[key], genre_key=key) for key in missing],
+                ignore_conflicts=True
+            )
+            found.update(lookup(missing))
+
+    return [found[normalize_key(name)] for name in names]
+
+
+# Calcula las claves normalizadas de todos los autores y géneros
+def fill_keys(batch_size=BATCH_SIZE):
+    authors = list(Author.objects.only('full_name', 'email'))
+    for author in authors:
+        author.full_name_key = normalize_key(author.full_name)
+        author.email_key = normalize_key(author.email)
+    Author.objects.bulk_update(authors, ['full_name_key', 'email_key'], batch_size=batch_size)
+
+    genres = list(Genre.objects.only('genre'))
+    for genre in genres:
+        genre.genre_key = normalize_key(genre.genre)
+    Genre.objects.bulk_update(genres, ['genre_key'], batch_size=batch_size)
+
+
+# Agrupa los ids por clave normalizada y devuelve {id duplicado: id conservado},
+# conservando en cada grupo el registro con menor id
+def find_duplicates(rows):
+    keepers = {}
+    duplicates = {}
+    for pk, key in sorted(rows):
+        if key in keepers:
+            duplicates[pk] = keepers[key]
+        else:
+            keepers[key] = pk
+    return duplicates
+
+
+# Fusiona los autores y géneros duplicados (misma clave normalizada) en el de menor id.
+# Los libros y las filas de la tabla intermedia se reasignan con unas pocas sentencias por
+# bloque y los duplicados se eliminan después. Devuelve (autores fusionados, géneros fusionados).
+def merge_duplicates(batch_size=BATCH_SIZE, dry_run=False):
+    BookGenre = Book.genre.through
+
+    # Las claves se calculan aquí para que la fusión no dependa de que estén guardadas
+    authors = find_duplicates(
+        (pk, (normalize_key(full_name), normalize_key(email)))
+        for pk, full_name, email in Author.objects.values_list('id', 'full_name', 'email')
+    )
+    genres = find_duplicates(
+        (pk, normalize_key(genre)) for pk, genre in Genre.objects.values_list('id', 'genre')
+    )
+
+    if dry_run or not (authors or genres):
+        return len(authors), len(genres)
+
+    with transaction.atomic():
+        affected = list(
+            Book.objects.filter(Q(author_id__in=list(authors)) | Q(genre__in=list(genres)))
+            .values_list('id', 'user_id').distinct()
+        )
+
+        # Reasigna el autor de los libros con un UPDATE ... CASE por bloque de duplicados
+        for batch in batched(list(authors.items()), batch_size):
+            Book.objects.filter(author_id__in=[duplicate for duplicate, _ in batch]).update(
+                author_id=Case(*[When(author_id=duplicate, then=Value(keeper)) for duplicate, keeper in batch])
+            )
+
+        # Copia las filas de la tabla intermedia al género conservado (ignorando las que ya existen)
+        # y elimina las filas de los duplicados
+        for batch in batched(list(genres), batch_size):
+            rows = BookGenre.objects.filter(genre_id__in=batch).values_list('book_id', 'genre_id')
+            BookGenre.objects.bulk_create(
+                [BookGenre(book_id=book_id, genre_id=genres[genre_id]) for book_id, genre_id in rows],
+                batch_size=batch_size,
+                ignore_conflicts=True
+            )
+            BookGenre.objects.filter(genre_id__in=batch)._raw_delete(BookGenre.objects.db)
+
+        # Sin libros que los referencien, los duplicados se eliminan sin recorrer relaciones
+        for batch in batched(list(authors), batch_size):
+            Author.objects.filter(id__in=batch)._raw_delete(Author.objects.db)
+        for batch in batched(list(genres), batch_size):
+            Genre.objects.filter(id__in=batch)._raw_delete(Genre.objects.db)
+
+    mark_changed(
+        user_ids=[user_id for _, user_id in affected],
+        book_ids=[book_id for book_id, _ in affected],
+        touch_books=True
+    )
+
+    return len(authors), len(genres)
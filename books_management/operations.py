@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# Operación de migración que ejecuta SQL únicamente sobre PostgreSQL.
+# En otros motores (por ejemplo SQLite en desarrollo) no hace nada, de modo que
+# los índices, extensiones y triggers específicos de PostgreSQL no rompen las migraciones.
+class RunPostgreSQL(migrations.RunSQL):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return 'Raw SQL operation (PostgreSQL only)'
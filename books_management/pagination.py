@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+from django.conf import settings
+from django.db.models import Q
+
+
+# Ordenamientos permitidos para la paginación por cursor (keyset).
+# Cada ordenamiento termina en 'id' para que la clave sea única y estable.
+KEYSET_ORDERINGS = {
+    'id': ('id',),
+    'publication_year': ('publication_year', 'id'),
+}
+
+
+# Excepción lanzada cuando el cursor recibido no se puede interpretar
+class InvalidCursor(Exception):
+    pass
+
+
+# Codifica la posición de la página en un cursor opaco
+def encode_cursor(ordering, values, direction):
+    payload = json.dumps({'o': ordering, 'v': list(values), 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+# Decodifica un cursor opaco y valida su contenido
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        ordering, values, direction = payload['o'], payload['v'], payload['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(ordering, str) or not isinstance(direction, str):
+        raise InvalidCursor(cursor)
+    if ordering not in KEYSET_ORDERINGS or direction not in ('next', 'prev'):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != len(KEYSET_ORDERINGS[ordering]):
+        raise InvalidCursor(cursor)
+    if not all(isinstance(value, int) for value in values):
+        raise InvalidCursor(cursor)
+
+    return ordering, values, direction
+
+
+# Obtiene el tamaño de página solicitado respetando el máximo configurado
+def get_page_size(request):
+    default = getattr(settings, 'BOOKS_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'BOOKS_MAX_PAGE_SIZE', 500)
+
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except ValueError:
+        return default
+
+    return max(1, min(page_size, maximum))
+
+
+# Construye el filtro keyset "(f1, f2, ...) > (v1, v2, ...)" para los campos dados
+def _keyset_filter(fields, values, operator):
+    condition = Q()
+    for position, field in enumerate(fields):
+        branch = Q(**{f'{field}__{operator}': values[position]})
+        for previous_field, previous_value in zip(fields[:position], values[:position]):
+            branch &= Q(**{previous_field: previous_value})
+        condition |= branch
+    return condition
+
+
+# Prepara la consulta de una página keyset: devuelve el queryset limitado (con un elemento de más
+# para saber si existe otra página) y el estado necesario para construir los cursores.
+# Cada página ejecuta una única consulta limitada, sin OFFSET ni COUNT, por lo que su coste
+# no depende del número total de filas.
+def build_keyset_page(queryset, ordering='id', cursor=None, page_size=50):
+    direction = 'next'
+    values = None
+
+    if cursor:
+        ordering, values, direction = decode_cursor(cursor)
+    elif ordering not in KEYSET_ORDERINGS:
+        raise InvalidCursor(ordering)
+
+    fields = KEYSET_ORDERINGS[ordering]
+
+    # Para retroceder se recorre el índice en sentido inverso y luego se invierte la página
+    if direction == 'next':
+        queryset = queryset.order_by(*fields)
+        if values is not None:
+            queryset = queryset.filter(_keyset_filter(fields, values, 'gt'))
+    else:
+        queryset = queryset.order_by(*[f'-{field}' for field in fields])
+        queryset = queryset.filter(_keyset_filter(fields, values, 'lt'))
+
+    return queryset[:page_size + 1], (ordering, values, direction, page_size)
+
+
+# Construye la página a partir de las filas obtenidas y devuelve (elementos, cursor siguiente, cursor anterior)
+def finish_keyset_page(items, state):
+    ordering, values, direction, page_size = state
+    fields = KEYSET_ORDERINGS[ordering]
+
+    items = list(items)
+    has_more = len(items) > page_size
+    items = items[:page_size]
+
+    if direction == 'prev':
+        items.reverse()
+        has_next, has_previous = values is not None, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    def key(item):
+        return [getattr(item, field) for field in fields]
+
+    next_cursor = encode_cursor(ordering, key(items[-1]), 'next') if items and has_next else None
+    previous_cursor = encode_cursor(ordering, key(items[0]), 'prev') if items and has_previous else None
+
+    return items, next_cursor, previous_cursor
+
+
+# Pagina un queryset por keyset y devuelve los elementos junto con los cursores siguiente y anterior
+def paginate_keyset(queryset, ordering='id', cursor=None, page_size=50):
+    queryset, state = build_keyset_page(queryset, ordering, cursor, page_size)
+    return finish_keyset_page(queryset, state)
+
+
+# Versión asíncrona de paginate_keyset para las vistas ASGI
+async def apaginate_keyset(queryset, ordering='id', cursor=None, page_size=50):
+    queryset, state = build_keyset_page(queryset, ordering, cursor, page_size)
+    return finish_keyset_page([item async for item in queryset], state)
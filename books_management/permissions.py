@@ -0,0 +1,92 @@
+from functools import partial, wraps
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Book
+from .fieldsets import Fieldset, InvalidFieldset
+
+
+# Busca un libro del usuario actual en una única consulta acotada al propietario.
+# Devuelve (libro, None) si existe, o (None, respuesta de error) distinguiendo entre
+# un libro inexistente (404) y un libro de otro usuario (403). La comprobación extra
+# solo se ejecuta cuando la consulta acotada no devuelve nada. Con un fieldset solo se leen
+# las columnas y relaciones que éste necesita.
+def get_owned_book(request, pk, select_related=('author',), prefetch_related=('genre',), fieldset=None):
+    books = Book.objects.filter(pk=pk, user=request.user)
+    if fieldset is not None:
+        books = fieldset.apply(books)
+    elif select_related:
+        books = books.select_related(*select_related)
+    if prefetch_related and fieldset is None:
+        books = books.prefetch_related(*prefetch_related)
+
+    book = next(iter(books), None)
+    if book is not None:
+        return book, None
+
+    if Book.objects.filter(pk=pk).exists():
+        return None, Response({
+            'message': 'You are not allowed to access this book'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    return None, Response({
+        'message': 'Book not found'
+    }, status=status.HTTP_404_NOT_FOUND)
+
+
+# Busca varios libros del usuario actual en una única consulta acotada al propietario (id__in) con
+# sus relaciones cargadas en bloque. Devuelve los libros encontrados en el orden de 'ids' y los errores
+# de los que faltan, distinguiendo entre inexistentes (404) y de otro usuario (403) con una consulta
+# extra que solo se ejecuta si falta alguno.
+def get_owned_books(request, ids, fieldset=None):
+    books = Book.objects.filter(pk__in=ids, user=request.user)
+    if fieldset is not None:
+        books = fieldset.apply(books)
+    else:
+        books = books.select_related('author').prefetch_related('genre')
+
+    found = {book.pk: book for book in books}
+    return [found[pk] for pk in ids if pk in found], missing_book_errors(ids, found)
+
+
+# Errores de los ids pedidos que no están entre los libros encontrados del usuario: 404 si el libro
+# no existe y 403 si es de otro usuario. Solo consulta la base de datos si falta alguno.
+def missing_book_errors(ids, found):
+    missing = [pk for pk in ids if pk not in found]
+    foreign = set(Book.objects.filter(pk__in=missing).values_list('pk', flat=True)) if missing else set()
+
+    return [
+        {'id': pk, 'status': status.HTTP_403_FORBIDDEN, 'message': 'You are not allowed to access this book'}
+        if pk in foreign else
+        {'id': pk, 'status': status.HTTP_404_NOT_FOUND, 'message': 'Book not found'}
+        for pk in missing
+    ]
+
+
+# Decorador que verifica que el usuario es propietario del libro y lo pasa a la vista como 'book'.
+# Se puede usar directamente (@check_book_owner) o indicando qué relaciones cargar:
+# @check_book_owner(select_related=(), prefetch_related=())
+# Con fieldsets=True admite ?fields= y ?expand= y pasa también el fieldset a la vista como 'fieldset'.
+def check_book_owner(view_func=None, *, select_related=('author',), prefetch_related=('genre',), fieldsets=False):
+    if view_func is None:
+        return partial(check_book_owner, select_related=select_related, prefetch_related=prefetch_related, fieldsets=fieldsets)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        fieldset = None
+        if fieldsets:
+            try:
+                fieldset = Fieldset.from_request(request)
+            except InvalidFieldset:
+                return Response({
+                    'message': 'Invalid fields or expand parameter'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            kwargs['fieldset'] = fieldset
+
+        book, error = get_owned_book(request, kwargs['pk'], select_related, prefetch_related, fieldset)
+        if error is not None:
+            return error
+
+        # Si el usuario es propietario, llama a la vista original pasándole el libro ya cargado
+        return view_func(request, *args, book=book, **kwargs)
+
+    return wrapper
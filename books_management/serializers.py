@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from .models import Author, Genre, Book
+from .normalization import upsert_authors, upsert_genres
+from .signals import set_saved_book_genres
 
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -41,11 +45,15 @@ class BookSerializer(serializers.ModelSerializer):
         genres_data = validated_data.pop('genre')
         user = validated_data.pop('user')
 
-        author, _ = Author.objects.get_or_create(**author_data)
-        genres = [Genre.objects.get_or_create(**genre_data)[0] for genre_data in genres_data]
+        # Reutiliza el autor y los géneros existentes (comparando sus claves normalizadas) o los crea
+        author, = upsert_authors([author_data])
+        genres = upsert_genres(genre_data['genre'] for genre_data in genres_data)
 
-        book = Book.objects.create(author=author, user=user, **validated_data)
-        book.genre.set(genres)
+        # El libro se guarda antes que sus géneros y el cambio se registra una sola vez (al guardarlo),
+        # en la misma transacción que los géneros
+        with transaction.atomic(savepoint=False):
+            book = Book.objects.create(author=author, user=user, **validated_data)
+            set_saved_book_genres(book, genres)
 
         return book
     
@@ -58,12 +66,90 @@ class BookSerializer(serializers.ModelSerializer):
         instance.publication_year = validated_data.get('publication_year', instance.publication_year)
         instance.user = user
 
-        author, _ = Author.objects.get_or_create(**author_data)
-        instance.author = author
+        instance.author, = upsert_authors([author_data])
 
-        genres = [Genre.objects.get_or_create(**genre_data)[0] for genre_data in genres_data]
-        instance.genre.set(genres)
+        genres = upsert_genres(genre_data['genre'] for genre_data in genres_data)
 
-        instance.save()
+        with transaction.atomic(savepoint=False):
+            instance.save()
+            set_saved_book_genres(instance, genres)
 
         return instance
+
+
+# Serializador para la importación masiva: el propietario es siempre el usuario de la solicitud
+class BookImportSerializer(BookSerializer):
+    class Meta(BookSerializer.Meta):
+        fields = [
+            'title',
+            'author',
+            'genre',
+            'publication_year'
+        ]
+
+
+# Filtro de las operaciones masivas, con los mismos criterios que la búsqueda. Los valores de
+# 'genre' y 'author' se combinan con OR y los distintos criterios con AND.
+class BookFilterSerializer(serializers.Serializer):
+    genre = serializers.ListField(child=serializers.CharField(max_length=50), required=False, default=list)
+    author = serializers.ListField(child=serializers.CharField(max_length=100), required=False, default=list)
+    year_from = serializers.IntegerField(required=False, allow_null=True, default=None)
+    year_to = serializers.IntegerField(required=False, allow_null=True, default=None)
+
+    # Un filtro vacío seleccionaría toda la biblioteca
+    def validate(self, data):
+        if not data['genre'] and not data['author'] and data['year_from'] is None and data['year_to'] is None:
+            raise serializers.ValidationError('At least one filter is required')
+        return data
+
+
+# Selección de los libros de una operación masiva: por ids (hasta BOOKS_BULK_MAX_IDS) o por filtro
+class BookBulkSelectionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    filter = BookFilterSerializer(required=False)
+
+    def validate_ids(self, ids):
+        if len(ids) > settings.BOOKS_BULK_MAX_IDS:
+            raise serializers.ValidationError(f'Too many ids (maximum {settings.BOOKS_BULK_MAX_IDS})')
+        return list(dict.fromkeys(ids))
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Either ids or filter is required')
+        return data
+
+
+# Modificación parcial en bloque: año de publicación y géneros ('genre' sustituye los géneros de
+# los libros; 'add_genre' y 'remove_genre' añaden o quitan los indicados)
+class BookBulkUpdateSerializer(BookBulkSelectionSerializer):
+    publication_year = serializers.IntegerField(min_value=0, required=False)
+    genre = GenreSerializer(many=True, required=False)
+    add_genre = GenreSerializer(many=True, required=False, allow_empty=False)
+    remove_genre = GenreSerializer(many=True, required=False, allow_empty=False)
+
+    def validate(self, data):
+        data = super().validate(data)
+        if not any(field in data for field in ('publication_year', 'genre', 'add_genre', 'remove_genre')):
+            raise serializers.ValidationError('No changes requested')
+        if 'genre' in data and ('add_genre' in data or 'remove_genre' in data):
+            raise serializers.ValidationError('genre cannot be combined with add_genre or remove_genre')
+        return data
+
+
+# Representación de un libro (con autor y géneros ya cargados) idéntica a la de BookSerializer,
+# construida directamente como diccionario para las respuestas de solo lectura, sin pasar por los
+# campos de DRF
+def serialize_book(book):
+    author = book.author
+    return {
+        'id': book.id,
+        'user': book.user_id,
+        'title': book.title,
+        'author': {
+            'id': author.id,
+            'full_name': author.full_name,
+            'email': author.email
+        },
+        'genre': [{'id': genre.id, 'genre': genre.genre} for genre in book.genre.all()],
+        'publication_year': book.publication_year
+    }
@@ -0,0 +1,113 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .cache import invalidate
+from .models import Author, Genre, Book, LibraryVersion
+from .versions import mark_changed
+
+
+# Crea la versión de la biblioteca de cada usuario nuevo
+@receiver(post_save, sender=User)
+def create_library_version(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        LibraryVersion.objects.get_or_create(user=instance)
+
+
+# Si el libro cambia de propietario, registra el cambio en la biblioteca del propietario anterior
+# (su versión y su caché) antes de guardarlo, mientras la fila todavía es suya. Para su feed de
+# cambios el libro se ha eliminado, así que también deja un registro de eliminación.
+@receiver(pre_save, sender=Book)
+def invalidate_previous_owner(sender, instance, raw=False, **kwargs):
+    previous_user_id = getattr(instance, '_loaded_user_id', None)
+    if raw or previous_user_id is None or previous_user_id == instance.user_id:
+        return
+
+    mark_changed(user_ids=[previous_user_id], deleted_ids=[instance.pk])
+
+
+# Invalida la caché de un libro y la biblioteca de su propietario al guardarlo, y guarda en el libro
+# la nueva versión de la biblioteca. Book.save() ya actualiza updated_at.
+@receiver(post_save, sender=Book)
+def invalidate_book(sender, instance, **kwargs):
+    instance._loaded_user_id = instance.user_id
+    mark_changed(user_ids=[instance.user_id], book_ids=[instance.pk])
+
+
+# Registra la eliminación de un libro para el feed de cambios antes de borrarlo, mientras la fila
+# todavía existe. Al eliminar el propio usuario también se eliminan su versión y sus registros, así
+# que basta con invalidar la caché.
+@receiver(pre_delete, sender=Book)
+def record_deleted_book(sender, instance, origin=None, **kwargs):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is User:
+        invalidate(user_ids=[instance.user_id], book_ids=[instance.pk])
+        return
+
+    mark_changed(user_ids=[instance.user_id], deleted_ids=[instance.pk])
+
+
+# Invalida los libros cuyos géneros cambian, tanto desde el libro como desde el género
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+
+    if not reverse:
+        if action != 'pre_clear' and not getattr(instance, '_genres_recorded', False):
+            mark_changed(user_ids=[instance.user_id], book_ids=[instance.pk], touch_books=True)
+        return
+
+    # Desde el género: en 'clear' los libros afectados solo se conocen antes de borrar las filas
+    if action == 'pre_clear':
+        instance._affected_books = list(Book.objects.filter(genre=instance).values_list('id', 'user_id'))
+        return
+    if action == 'post_clear':
+        affected = getattr(instance, '_affected_books', [])
+    else:
+        affected = Book.objects.filter(pk__in=pk_set).values_list('id', 'user_id')
+
+    _invalidate_affected(affected)
+
+
+# Cambia los géneros de un libro que se acaba de guardar en la misma transacción sin registrar otro
+# cambio: la versión de la biblioteca, la del libro y la caché ya se actualizaron al guardarlo
+def set_saved_book_genres(book, genres):
+    book._genres_recorded = True
+    try:
+        book.genre.set(genres)
+    finally:
+        del book._genres_recorded
+
+
+# Invalida los libros que usan un autor cuando éste cambia
+@receiver(post_save, sender=Author)
+def invalidate_author(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_affected(Book.objects.filter(author=instance).values_list('id', 'user_id'))
+
+
+# Invalida los libros que usan un género cuando éste cambia o se elimina
+@receiver(post_save, sender=Genre)
+def invalidate_genre(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_affected(Book.objects.filter(genre=instance).values_list('id', 'user_id'))
+
+
+@receiver(pre_delete, sender=Genre)
+def collect_genre_books(sender, instance, **kwargs):
+    instance._affected_books = list(Book.objects.filter(genre=instance).values_list('id', 'user_id'))
+
+
+@receiver(post_delete, sender=Genre)
+def invalidate_deleted_genre(sender, instance, **kwargs):
+    _invalidate_affected(getattr(instance, '_affected_books', []))
+
+
+def _invalidate_affected(affected):
+    affected = list(affected)
+    mark_changed(
+        user_ids=[user_id for _, user_id in affected],
+        book_ids=[book_id for book_id, _ in affected],
+        touch_books=True
+    )
@@ -1,10 +1,43 @@
+import base64
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from asgiref.sync import async_to_sync
+from unittest import mock, skipUnless
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Author, Book
+from django.utils import timezone
+from .models import Author, Book, BookTombstone, Genre, LibraryVersion
+from .cache import get_cache_stats, make_key, reset_cache_stats
+from .bulk import import_books
+from .changes import encode_token
+from .normalization import merge_duplicates, upsert_authors, upsert_genres
+from .serializers import BookSerializer, serialize_book
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from api import middleware, renderers
+from api.routers import ReplicaRouter, is_sticky, mark_sticky, set_current_request
+from api.instrumentation import QueryCollector, get_sampled_metrics, reset_metrics, warn_duplicates
+from api.middleware import choose_encoding
+from api.renderers import FastJSONRenderer
+from api.testing import QueryBudgetMixin, create_budget_library
+from users.authentication import token_cache
 
 
 # Tests para crear libros
@@ -35,6 +68,27 @@ class BookAPICreateTestCase(TestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
     
+    # Prueba que crear un libro con géneros registra un único cambio en la biblioteca
+    def test_create_book_records_one_change(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        version = LibraryVersion.objects.get(user=self.user).version
+
+        data = {
+            "title": "Test Title",
+            "user": self.user.id,
+            "author": {"full_name": "Test full name", "email": "test@example.com"},
+            "genre": [{"genre": "Test Genre 1"}, {"genre": "Test Genre 2"}],
+            "publication_year": 1999
+        }
+        response = self.client.post(reverse('create_book'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        book = Book.objects.get(user=self.user)
+        self.assertEqual(LibraryVersion.objects.get(user=self.user).version, version + 1)
+        self.assertEqual(book.change_version, version + 1)
+        self.assertEqual(sorted(book.genre.values_list('genre', flat=True)), ['Test Genre 1', 'Test Genre 2'])
+
     # Prueba para crear libro con datos faltantes
     def test_create_book_missing_data(self):
         token = Token.objects.create(user=self.user)
@@ -56,6 +110,149 @@ class BookAPICreateTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+# Tests para la importación masiva de libros
+class ImportBooksAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def make_rows(self, count):
+        return [{
+            "title": f"Title {i}",
+            "author": {"full_name": f"Author {i % 3}", "email": "author@example.com"},
+            "genre": [{"genre": f"Genre {i % 4}"}, {"genre": "Common"}],
+            "publication_year": 1990 + i
+        } for i in range(count)]
+
+    # Prueba para importar libros a partir de un array JSON
+    def test_import_books_json(self):
+        existing = Author.objects.create(full_name='Author 0', email='author@example.com')
+
+        response = self.client.post(reverse('import_books'), self.make_rows(10), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 10)
+        self.assertEqual(Book.objects.filter(user=self.user).count(), 10)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Genre.objects.count(), 5)
+        self.assertEqual(Book.objects.get(title='Title 3').author, existing)
+        self.assertEqual(Book.objects.get(title='Title 1').genre.count(), 2)
+
+    # Prueba para importar libros en formato NDJSON
+    def test_import_books_ndjson(self):
+        body = '\n'.join(json.dumps(row) for row in self.make_rows(3)) + '\n'
+
+        response = self.client.post(reverse('import_books'), body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+
+    # Prueba para comprobar que las filas inválidas no abortan la importación
+    def test_import_books_row_errors(self):
+        rows = self.make_rows(3)
+        del rows[1]['title']
+
+        response = self.client.post(reverse('import_books'), rows, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('title', response.data['errors'][0]['errors'])
+
+    # Prueba para una importación sin filas válidas
+    def test_import_books_all_invalid(self):
+        response = self.client.post(reverse('import_books'), [{"title": "Only title"}], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Book.objects.exists())
+
+    # Prueba para comprobar que el número de consultas depende de los bloques y no de las filas
+    def test_import_books_constant_queries(self):
+        url = reverse('import_books') + '?batch_size=1000'
+
+        # La primera solicitud incluye la consulta del token; después se sirve desde la caché de autenticación.
+        # Las dos últimas incrementan la versión de la biblioteca del usuario y la guardan en los libros creados
+        with self.assertNumQueries(13):
+            self.client.post(url, self.make_rows(5), format='json')
+
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        Genre.objects.all().delete()
+
+        with self.assertNumQueries(12):
+            self.client.post(url, self.make_rows(100), format='json')
+
+
+# Tests para la exportación de la biblioteca
+class ExportBooksAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        genres = [Genre.objects.create(genre='Genre 1'), Genre.objects.create(genre='Genre 2')]
+        self.books = []
+        for i in range(5):
+            book = Book.objects.create(title=f'Título {i}', author=author, publication_year=2000 + i, user=self.user)
+            book.genre.set(genres)
+            self.books.append(book)
+
+    # Prueba para exportar la biblioteca en NDJSON
+    def test_export_books_ndjson(self):
+        response = self.client.get(reverse('export_books', args=['ndjson']))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [book.id for book in self.books])
+        self.assertEqual(rows[0]['title'], 'Título 0')
+        self.assertEqual(rows[0]['author']['full_name'], 'Test Author')
+        self.assertEqual([genre['genre'] for genre in rows[0]['genre']], ['Genre 1', 'Genre 2'])
+
+    # Prueba para exportar la biblioteca en CSV
+    def test_export_books_csv(self):
+        response = self.client.get(reverse('export_books', args=['csv']))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,title,author_full_name,author_email,genres,publication_year')
+        self.assertEqual(lines[1], f'{self.books[0].id},Título 0,Test Author,author@example.com,Genre 1;Genre 2,2000')
+        self.assertEqual(len(lines), 6)
+
+    # Prueba para un formato de exportación no soportado
+    def test_export_books_unsupported_format(self):
+        response = self.client.get(reverse('export_books', args=['xml']))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba para comprobar que autores y géneros se precargan por bloque
+    @override_settings(BOOKS_EXPORT_CHUNK_SIZE=2)
+    def test_export_books_prefetch_per_chunk(self):
+        response = self.client.get(reverse('export_books', args=['ndjson']))
+
+        # Libros + una consulta de géneros por cada bloque de 2 libros
+        with self.assertNumQueries(4):
+            b''.join(response.streaming_content)
+
+    # Prueba la exportación sin cursores del lado del servidor (PgBouncer en modo transacción)
+    @skipUnless(connection.vendor == 'postgresql', 'Server-side cursors are only used with PostgreSQL')
+    @override_settings(BOOKS_EXPORT_CHUNK_SIZE=2)
+    def test_export_books_without_server_side_cursors(self):
+        expected = b''.join(self.client.get(reverse('export_books', args=['ndjson'])).streaming_content)
+
+        with mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            response = self.client.get(reverse('export_books', args=['ndjson']))
+
+            # Una consulta de libros y otra de géneros por cada bloque de 2 libros (3 bloques)
+            with self.assertNumQueries(6):
+                content = b''.join(response.streaming_content)
+
+        self.assertEqual(content, expected)
+
+
 # Tests para obtener todos los libros
 class GetAllBooksAPITestCase(TestCase):
     def setUp(self):
@@ -82,6 +279,100 @@ class GetAllBooksAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.data['message'], 'Books not found for the current user')
 
+    # Prueba para recorrer todos los libros página a página con el cursor
+    def test_get_all_books_paginated(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        books = [Book.objects.create(title=f'Title {i}', author=author, publication_year=2000 + i % 3, user=self.user) for i in range(5)]
+
+        url = reverse('get_all_books')
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data['Books']], [books[0].id, books[1].id])
+        self.assertIsNone(response.data['previous'])
+
+        seen = []
+        while True:
+            seen.extend(book['id'] for book in response.data['Books'])
+            if not response.data['next']:
+                break
+            response = self.client.get(url, {'page_size': 2, 'cursor': response.data['next']})
+
+        self.assertEqual(seen, [book.id for book in books])
+
+        # Retrocede desde la última página
+        response = self.client.get(url, {'page_size': 2, 'cursor': response.data['previous']})
+        self.assertEqual([book['id'] for book in response.data['Books']], [books[2].id, books[3].id])
+
+    # Prueba para paginar ordenando por año de publicación
+    def test_get_all_books_ordered_by_publication_year(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        for i in range(6):
+            Book.objects.create(title=f'Title {i}', author=author, publication_year=2005 - i % 3, user=self.user)
+
+        url = reverse('get_all_books')
+        response = self.client.get(url, {'page_size': 4, 'ordering': 'publication_year'})
+        second = self.client.get(url, {'page_size': 4, 'cursor': response.data['next']})
+
+        years = [book['publication_year'] for book in response.data['Books'] + second.data['Books']]
+        self.assertEqual(years, sorted(years))
+        self.assertEqual(len(years), 6)
+        self.assertIsNone(second.data['next'])
+
+    # Prueba para un cursor inválido
+    def test_get_all_books_invalid_cursor(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.get(reverse('get_all_books'), {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba para un cursor bien codificado con un contenido de tipos inesperados
+    def test_get_all_books_malformed_cursor_payload(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        payloads = [
+            {'o': [], 'v': [1], 'd': 'next'},
+            {'o': 'id', 'v': [1], 'd': {}},
+            {'o': 'id', 'v': '1', 'd': 'next'},
+            ['id', [1], 'next'],
+        ]
+
+        for payload in payloads:
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            for url_name in ('get_all_books', 'async_get_all_books'):
+                response = self.client.get(reverse(url_name), {'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba para comprobar que el número de consultas por página no depende del número de libros
+    def test_get_all_books_constant_queries(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        genre = Genre.objects.create(genre='Test Genre')
+        for i in range(30):
+            author = Author.objects.create(full_name=f'Author {i}', email='author@example.com')
+            book = Book.objects.create(title=f'Title {i}', author=author, publication_year=2000, user=self.user)
+            book.genre.add(genre)
+
+        url = reverse('get_all_books')
+
+        self.client.get(url, {'page_size': 1})
+
+        # Versión de la biblioteca (ETag) + página de libros con autor + géneros prefetch (el token ya está en caché)
+        with self.assertNumQueries(3):
+            self.client.get(url, {'page_size': 5})
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'page_size': 25})
+
+        self.assertEqual(len(response.data['Books']), 25)
+
 
 # Test para obtener libro por su PK
 class GetBookByPkAPITestCase(TestCase):
@@ -158,6 +449,27 @@ class UpdateBookAPITestCase(TestCase):
         self.assertEqual(response.data['Book']['title'], 'Updated Title')
         self.assertEqual(response.data['Book']['publication_year'], 2020)
 
+    # Prueba que actualizar un libro y sus géneros registra un único cambio en la biblioteca
+    def test_update_book_records_one_change(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        version = LibraryVersion.objects.get(user=self.user).version
+
+        data = {
+            "title": "Updated Title",
+            "user": self.user.id,
+            "author": {"full_name": "Test full name", "email": "test@example.com"},
+            "genre": [{"genre": "Test Genre 1"}],
+            "publication_year": 2020
+        }
+        response = self.client.put(reverse('update_book', args=[self.book.id]), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.book.refresh_from_db()
+        self.assertEqual(LibraryVersion.objects.get(user=self.user).version, version + 1)
+        self.assertEqual(self.book.change_version, version + 1)
+        self.assertEqual(list(self.book.genre.values_list('genre', flat=True)), ['Test Genre 1'])
+
     # Prueba para actualizar libro no auntenticado
     def test_update_book_unauthenticated(self):
         url = reverse('update_book', args=[self.book.id])
@@ -339,3 +651,1530 @@ class DeleteBookUnauthorizedAPITestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(response.data['message'], 'You are not allowed to access this book')
+
+
+# Tests para la caché de lectura de libros
+class BookCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        self.genre = Genre.objects.create(genre='Test Genre')
+        self.book = Book.objects.create(title='Test Title', author=self.author, publication_year=2000, user=self.user)
+        self.book.genre.add(self.genre)
+        reset_cache_stats()
+
+    # Prueba para comprobar que el detalle se sirve desde la caché sin consultar los libros
+    def test_detail_cache_hit(self):
+        url = reverse('get_book_by_pk', args=[self.book.id])
+        first = self.client.get(url)
+
+        # Ni el token ni el libro se consultan; solo su fecha de modificación para la ETag
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_cache_stats()['detail'], {'hits': 1, 'misses': 1})
+
+    # Prueba para comprobar que actualizar un libro invalida su detalle y el listado
+    def test_update_invalidates(self):
+        detail_url = reverse('get_book_by_pk', args=[self.book.id])
+        list_url = reverse('get_all_books')
+        self.client.get(detail_url)
+        self.client.get(list_url)
+
+        data = {
+            "title": "Updated Title",
+            "user": self.user.id,
+            "author": {"full_name": "Test Author", "email": "author@example.com"},
+            "genre": [{"genre": "Test Genre"}],
+            "publication_year": 2020
+        }
+        self.client.put(reverse('update_book', args=[self.book.id]), data, format='json')
+
+        self.assertEqual(self.client.get(detail_url).data['Book']['title'], 'Updated Title')
+        self.assertEqual(self.client.get(list_url).data['Books'][0]['title'], 'Updated Title')
+
+    # Prueba para comprobar que transferir un libro a otro usuario invalida la biblioteca del propietario anterior
+    def test_transfer_invalidates_previous_owner(self):
+        list_url = reverse('get_all_books')
+        Book.objects.create(title='Other Title', author=self.author, publication_year=2001, user=self.user)
+        etag = self.client.get(list_url)['ETag']
+        other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+
+        response = self.client.put(reverse('update_book', args=[self.book.id]), {
+            "title": "Test Title",
+            "user": other.id,
+            "author": {"full_name": "Test Author", "email": "author@example.com"},
+            "genre": [{"genre": "Test Genre"}],
+            "publication_year": 2000
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['title'] for book in response.data['Books']], ['Other Title'])
+
+    # Prueba para comprobar que crear o eliminar libros invalida el listado pero no otros detalles
+    def test_create_and_delete_invalidate_listing(self):
+        list_url = reverse('get_all_books')
+        detail_url = reverse('get_book_by_pk', args=[self.book.id])
+        self.client.get(list_url)
+        self.client.get(detail_url)
+
+        other = Book.objects.create(title='Other Title', author=self.author, publication_year=2001, user=self.user)
+        self.assertEqual(len(self.client.get(list_url).data['Books']), 2)
+
+        self.client.delete(reverse('delete_book', args=[other.id]))
+        self.assertEqual(len(self.client.get(list_url).data['Books']), 1)
+
+        with self.assertNumQueries(1):
+            self.client.get(detail_url)
+
+    # Prueba para comprobar que renombrar el autor o el género invalida los libros afectados
+    def test_author_and_genre_changes_invalidate(self):
+        detail_url = reverse('get_book_by_pk', args=[self.book.id])
+        self.client.get(detail_url)
+
+        self.author.full_name = 'Renamed Author'
+        self.author.save()
+        self.assertEqual(self.client.get(detail_url).data['Book']['author']['full_name'], 'Renamed Author')
+
+        self.genre.genre = 'Renamed Genre'
+        self.genre.save()
+        self.assertEqual(self.client.get(detail_url).data['Book']['genre'][0]['genre'], 'Renamed Genre')
+
+        self.genre.book_set.clear()
+        self.assertEqual(self.client.get(detail_url).data['Book']['genre'], [])
+
+    # Prueba para comprobar que la caché de un usuario no se sirve a otro
+    def test_cache_is_per_user(self):
+        url = reverse('get_book_by_pk', args=[self.book.id])
+        self.client.get(url)
+
+        other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        token = Token.objects.create(user=other)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+# Tests para el número de consultas de las vistas protegidas por check_book_owner
+class BookOwnerQueryCountTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        self.book = Book.objects.create(title='Test Title', author=author, publication_year=2000, user=self.user)
+        self.book.genre.set([Genre.objects.create(genre=f'Genre {i}') for i in range(5)])
+        self.foreign_book = Book.objects.create(title='Other Title', author=author, publication_year=2000, user=self.other)
+
+    # Token + fecha de modificación (ETag) + libro con autor + géneros
+    def test_get_book_by_pk_queries(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('get_book_by_pk', args=[self.book.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['Book']['genre']), 5)
+
+    # Token + libro + borrado de la tabla intermedia y del libro + versión de la biblioteca + registro
+    # de la eliminación para el feed de cambios
+    def test_delete_book_queries(self):
+        with self.assertNumQueries(6):
+            response = self.client.delete(reverse('delete_book', args=[self.book.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    # Token + fecha de modificación (ETag) + consulta acotada al propietario + comprobación de existencia
+    def test_not_found_and_forbidden_queries(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('get_book_by_pk', args=[self.foreign_book.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # El token ya está en la caché de autenticación
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('get_book_by_pk', args=[self.foreign_book.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with self.assertNumQueries(2):
+            response = self.client.delete(reverse('delete_book', args=[self.foreign_book.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Book.objects.filter(id=self.foreign_book.id).exists())
+
+
+# Tests para la lectura por lotes de libros
+class GetBooksBatchAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        genres = [Genre.objects.create(genre='Genre 1'), Genre.objects.create(genre='Genre 2')]
+        self.books = []
+        for i in range(3):
+            book = Book.objects.create(title=f'Test Title {i}', author=author, publication_year=2000 + i, user=self.user)
+            book.genre.set(genres)
+            self.books.append(book)
+        self.foreign_book = Book.objects.create(title='Other Title', author=author, publication_year=2000, user=self.other)
+
+    def get_batch(self, ids, **params):
+        return self.client.get(reverse('get_books_batch'), {'ids': ','.join(str(pk) for pk in ids), **params})
+
+    # Prueba que se devuelven los libros en el orden pedido y el estado de los que faltan
+    def test_get_books_batch(self):
+        missing = self.foreign_book.id + 100
+        response = self.get_batch([self.books[2].id, missing, self.books[0].id, self.foreign_book.id])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data['Books']], [self.books[2].id, self.books[0].id])
+        # Los géneros de un libro no tienen un orden definido
+        expected = BookSerializer(self.books[2]).data
+        book = response.data['Books'][0]
+        self.assertEqual({**book, 'genre': None}, {**expected, 'genre': None})
+        self.assertCountEqual(book['genre'], expected['genre'])
+        self.assertEqual(response.data['errors'], [
+            {'id': missing, 'status': 404, 'message': 'Book not found'},
+            {'id': self.foreign_book.id, 'status': 403, 'message': 'You are not allowed to access this book'},
+        ])
+
+    # Token + versión de la biblioteca (ETag) + libros con autor + géneros, más la comprobación de los que faltan
+    def test_get_books_batch_queries(self):
+        with self.assertNumQueries(4):
+            response = self.get_batch([book.id for book in self.books])
+        self.assertEqual(len(response.data['Books']), 3)
+        self.assertEqual(response.data['errors'], [])
+
+        # El token ya está en la caché de autenticación; se añade la comprobación del libro ajeno
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.get_batch([self.books[0].id, self.foreign_book.id])
+        self.assertEqual(len(response.data['errors']), 1)
+
+    # Prueba que los ids repetidos se devuelven una sola vez y que se admite ?ids= repetido
+    def test_get_books_batch_duplicates(self):
+        response = self.client.get(reverse('get_books_batch') + f'?ids={self.books[1].id},{self.books[0].id}&ids={self.books[1].id}')
+
+        self.assertEqual([book['id'] for book in response.data['Books']], [self.books[1].id, self.books[0].id])
+
+    # Prueba que la lectura por lotes admite ?fields=
+    def test_get_books_batch_fields(self):
+        response = self.get_batch([self.books[0].id], fields='id,title')
+
+        self.assertEqual(response.data['Books'], [{'id': self.books[0].id, 'title': 'Test Title 0'}])
+
+    # Prueba los ids inválidos, vacíos o por encima del máximo
+    @override_settings(BOOKS_BATCH_MAX_IDS=2)
+    def test_get_books_batch_invalid_ids(self):
+        for ids in ('', 'abc', '1,x', '0', '-1'):
+            response = self.client.get(reverse('get_books_batch'), {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, ids)
+
+        response = self.get_batch([book.id for book in self.books])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Too many ids (maximum 2)')
+
+    # Prueba que un cambio en la biblioteca invalida la respuesta guardada en caché
+    def test_get_books_batch_invalidation(self):
+        ids = [book.id for book in self.books]
+        self.get_batch(ids)
+
+        self.client.delete(reverse('delete_book', args=[self.books[0].id]))
+        response = self.get_batch(ids)
+
+        self.assertEqual(len(response.data['Books']), 2)
+        self.assertEqual(response.data['errors'], [{'id': self.books[0].id, 'status': 404, 'message': 'Book not found'}])
+
+
+# Tests para la modificación y eliminación en bloque de libros
+class BulkBooksAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        self.genres = [Genre.objects.create(genre='Genre 1'), Genre.objects.create(genre='Genre 2')]
+        self.books = []
+        for i in range(4):
+            book = Book.objects.create(title=f'Test Title {i}', author=self.author, publication_year=2000 + i, user=self.user)
+            book.genre.set(self.genres[:i % 2 + 1])
+            self.books.append(book)
+        self.foreign_book = Book.objects.create(title='Other Title', author=self.author, publication_year=2000, user=self.other)
+        self.foreign_book.genre.set(self.genres)
+
+    def genre_names(self, book):
+        return sorted(genre.genre for genre in Book.objects.get(pk=book.pk).genre.all())
+
+    # Prueba la eliminación por ids, con el estado de los ids que no son del usuario
+    def test_bulk_delete_by_ids(self):
+        missing = self.foreign_book.id + 100
+        ids = [self.books[0].id, self.books[2].id, self.foreign_book.id, missing]
+        response = self.client.post(reverse('bulk_delete_books'), {'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(response.data['ids'], [self.books[0].id, self.books[2].id])
+        self.assertEqual([error['status'] for error in response.data['errors']], [403, 404])
+        self.assertEqual(list(Book.objects.filter(user=self.user).values_list('id', flat=True).order_by('id')), [self.books[1].id, self.books[3].id])
+        self.assertFalse(Book.genre.through.objects.filter(book_id__in=[self.books[0].id, self.books[2].id]).exists())
+        self.assertEqual(self.foreign_book.genre.count(), 2)
+
+    # Prueba la eliminación por filtro, acotada a los libros del usuario
+    def test_bulk_delete_by_filter(self):
+        response = self.client.post(reverse('bulk_delete_books'), {'filter': {'genre': ['genre 2'], 'year_to': 2002}}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ids'], [self.books[1].id])
+        self.assertTrue(Book.objects.filter(pk=self.foreign_book.pk).exists())
+
+    # Token + selección + borrado de libros y de la tabla intermedia + versión de la biblioteca +
+    # registros de las eliminaciones para el feed de cambios, dentro de un savepoint
+    def test_bulk_delete_queries(self):
+        with self.assertNumQueries(8):
+            self.client.post(reverse('bulk_delete_books'), {'filter': {'year_from': 2000}}, format='json')
+
+        self.assertFalse(Book.objects.filter(user=self.user).exists())
+
+    # Prueba que la eliminación invalida el listado en caché y cambia la versión de la biblioteca
+    def test_bulk_delete_invalidates(self):
+        self.client.get(reverse('get_all_books'))
+        version = LibraryVersion.objects.get(user=self.user).version
+
+        self.client.post(reverse('bulk_delete_books'), {'ids': [self.books[0].id]}, format='json')
+
+        response = self.client.get(reverse('get_all_books'))
+        self.assertEqual(len(response.data['Books']), 3)
+        self.assertEqual(LibraryVersion.objects.get(user=self.user).version, version + 1)
+
+    # Prueba los errores de validación de la selección
+    @override_settings(BOOKS_BULK_MAX_IDS=2)
+    def test_bulk_selection_errors(self):
+        for data in ({}, {'ids': []}, {'ids': [0]}, {'filter': {}}, {'ids': [self.books[0].id], 'filter': {'year_from': 2000}}, {'ids': [1, 2, 3]}):
+            response = self.client.post(reverse('bulk_delete_books'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+        self.assertEqual(Book.objects.filter(user=self.user).count(), 4)
+
+    # Prueba la modificación del año de publicación, que actualiza la fecha de modificación (ETag)
+    def test_bulk_update_publication_year(self):
+        etag = self.client.get(reverse('get_book_by_pk', args=[self.books[0].id]))['ETag']
+
+        response = self.client.patch(reverse('bulk_update_books'), {
+            'ids': [self.books[0].id, self.books[1].id, self.foreign_book.id], 'publication_year': 1999
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(response.data['errors'][0]['status'], 403)
+        self.assertEqual(list(Book.objects.filter(publication_year=1999).values_list('id', flat=True).order_by('id')), [self.books[0].id, self.books[1].id])
+        self.assertEqual(Book.objects.get(pk=self.foreign_book.pk).publication_year, 2000)
+        self.assertNotEqual(self.client.get(reverse('get_book_by_pk', args=[self.books[0].id]))['ETag'], etag)
+
+    # Prueba la sustitución de los géneros, que también se refleja en la búsqueda
+    def test_bulk_update_replace_genres(self):
+        response = self.client.patch(reverse('bulk_update_books'), {
+            'filter': {'author': ['test author']}, 'genre': [{'genre': 'New Genre'}, {'genre': 'genre 1'}]
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 4)
+        for book in self.books:
+            self.assertEqual(self.genre_names(book), ['Genre 1', 'New Genre'])
+        self.assertEqual(self.genre_names(self.foreign_book), ['Genre 1', 'Genre 2'])
+
+        response = self.client.get(reverse('search_books'), {'query': 'New Genre'})
+        self.assertEqual(len(response.data['Books']), 4)
+
+    # Prueba que se añaden y quitan géneros sin tocar el resto
+    def test_bulk_update_add_and_remove_genres(self):
+        ids = [book.id for book in self.books[:2]]
+        self.client.patch(reverse('bulk_update_books'), {
+            'ids': ids, 'add_genre': [{'genre': 'Genre 2'}, {'genre': 'Extra'}], 'remove_genre': [{'genre': 'GENRE 1'}]
+        }, format='json')
+
+        self.assertEqual(self.genre_names(self.books[0]), ['Extra', 'Genre 2'])
+        self.assertEqual(self.genre_names(self.books[1]), ['Extra', 'Genre 2'])
+        self.assertEqual(self.genre_names(self.books[2]), ['Genre 1'])
+
+    # Prueba los errores de validación de los cambios
+    def test_bulk_update_errors(self):
+        ids = [self.books[0].id]
+        for data in (
+            {'ids': ids},
+            {'ids': ids, 'publication_year': -1},
+            {'ids': ids, 'genre': [{'genre': 'A'}], 'add_genre': [{'genre': 'B'}]},
+            {'ids': ids, 'add_genre': []},
+            {'publication_year': 1999},
+        ):
+            response = self.client.patch(reverse('bulk_update_books'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+
+# Tests para el feed de cambios de la sincronización incremental
+class ChangeFeedTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        self.genre = Genre.objects.create(genre='Genre 1')
+        self.books = [self.create_book(f'Test Title {i}') for i in range(3)]
+        Book.objects.create(title='Other Title', author=self.author, publication_year=2000, user=self.other)
+        self.data = {
+            'title': 'New Title',
+            'author': {'full_name': 'Test Author', 'email': 'author@example.com'},
+            'genre': [{'genre': 'Genre 1'}],
+            'publication_year': 2020,
+            'user': self.user.id
+        }
+
+    def create_book(self, title):
+        book = Book.objects.create(title=title, author=self.author, publication_year=2000, user=self.user)
+        book.genre.set([self.genre])
+        return book
+
+    def get_changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        return self.client.get(reverse('get_changes_feed'), params)
+
+    # Recorre el feed desde 'since' siguiendo has_more y devuelve los cambios y el último token
+    def sync(self, since=None, page_size=50):
+        changes = []
+        while True:
+            response = self.get_changes(since, page_size=page_size)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changes += response.data['changes']
+            since = response.data['since']
+            if not response.data['has_more']:
+                return changes, since
+
+    # Sin token se devuelve la biblioteca completa del usuario, sin eliminaciones
+    def test_initial_sync(self):
+        self.books[0].delete()
+
+        changes, since = self.sync()
+
+        self.assertEqual([change['id'] for change in changes], [book.id for book in self.books[1:]])
+        self.assertFalse(any(change['deleted'] for change in changes))
+        self.assertEqual(changes[0]['Book'], serialize_book(Book.objects.get(pk=self.books[1].pk)))
+        self.assertEqual(self.sync(since)[0], [])
+
+    # Las altas, modificaciones y eliminaciones posteriores al token se devuelven en orden
+    def test_changes_since_token(self):
+        _, since = self.sync()
+
+        created = self.client.post(reverse('create_book'), self.data, format='json').data['Book']['id']
+        self.client.put(reverse('update_book', args=[self.books[0].id]), {**self.data, 'title': 'Updated'}, format='json')
+        self.client.delete(reverse('delete_book', args=[self.books[1].id]))
+
+        changes, since = self.sync(since)
+
+        self.assertEqual([(change['id'], change['deleted']) for change in changes], [
+            (created, False), (self.books[0].id, False), (self.books[1].id, True)
+        ])
+        self.assertEqual(changes[1]['Book']['title'], 'Updated')
+        self.assertNotIn('Book', changes[2])
+        self.assertEqual(self.sync(since)[0], [])
+
+    # Un libro modificado varias veces aparece una sola vez, con su estado actual
+    def test_repeated_changes(self):
+        _, since = self.sync()
+
+        for title in ('First', 'Second'):
+            self.client.put(reverse('update_book', args=[self.books[2].id]), {**self.data, 'title': title}, format='json')
+
+        changes, _ = self.sync(since)
+        self.assertEqual([change['Book']['title'] for change in changes], ['Second'])
+
+    # Un libro transferido a otro usuario aparece como eliminado para el propietario anterior
+    def test_transfer(self):
+        _, since = self.sync()
+        other_client = APIClient()
+        other_client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.other).key)
+        other_since = other_client.get(reverse('get_changes_feed')).data['since']
+
+        response = self.client.put(reverse('update_book', args=[self.books[0].id]), {**self.data, 'user': self.other.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        changes, _ = self.sync(since)
+        self.assertEqual(changes, [{'id': self.books[0].id, 'deleted': True}])
+        changes = other_client.get(reverse('get_changes_feed'), {'since': other_since}).data['changes']
+        self.assertEqual([(change['id'], change['deleted']) for change in changes], [(self.books[0].id, False)])
+
+    # La paginación recorre todos los cambios aunque una versión quede partida entre páginas
+    def test_pagination(self):
+        _, since = self.sync()
+        self.client.post(reverse('bulk_delete_books'), {'ids': [book.id for book in self.books]}, format='json')
+        self.create_book('Last')
+
+        first = self.get_changes(since, page_size=2)
+        self.assertTrue(first.data['has_more'])
+        self.assertEqual(len(first.data['changes']), 2)
+
+        changes, _ = self.sync(since, page_size=2)
+        self.assertEqual([change['deleted'] for change in changes], [True, True, True, False])
+        self.assertEqual([change['id'] for change in changes[:3]], [book.id for book in self.books])
+
+    # La importación y las operaciones en bloque también aparecen en el feed
+    def test_bulk_operations(self):
+        _, since = self.sync()
+
+        self.client.patch(reverse('bulk_update_books'), {'ids': [self.books[0].id], 'publication_year': 1999}, format='json')
+        self.client.post(reverse('import_books'), [{
+            'title': 'Imported', 'author': self.data['author'], 'genre': self.data['genre'], 'publication_year': 2001
+        }], format='json')
+
+        changes, _ = self.sync(since)
+        self.assertEqual([change['id'] for change in changes], [self.books[0].id, Book.objects.get(title='Imported').id])
+        self.assertEqual(changes[0]['Book']['publication_year'], 1999)
+
+    # Los cambios en los géneros y autores de los libros también aparecen en el feed
+    def test_related_changes(self):
+        _, since = self.sync()
+
+        self.author.full_name = 'Renamed Author'
+        self.author.save()
+
+        changes, _ = self.sync(since)
+        self.assertEqual([change['Book']['author']['full_name'] for change in changes], ['Renamed Author'] * 3)
+
+    # Una consulta sin cambios responde 304 con la ETag de la biblioteca
+    def test_not_modified(self):
+        response = self.get_changes()
+        again = self.client.get(reverse('get_changes_feed'), HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    # Prueba los tokens no válidos
+    def test_invalid_token(self):
+        for since in ('not-a-token', 'eyJ2IjotMX0', 'WzFd'):
+            response = self.get_changes(since)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, since)
+
+    # Tras purgar los registros de eliminaciones, los tokens anteriores caducan y los posteriores siguen valiendo
+    def test_prune_tombstones(self):
+        _, old = self.sync()
+        self.client.delete(reverse('delete_book', args=[self.books[0].id]))
+        _, recent = self.sync(old)
+        BookTombstone.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=100))
+
+        call_command('prune_tombstones', days=90, stdout=io.StringIO())
+
+        self.assertFalse(BookTombstone.objects.exists())
+        self.assertEqual(self.get_changes(old).status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.get_changes(recent).status_code, status.HTTP_200_OK)
+        self.assertEqual(LibraryVersion.objects.get(user=self.other).pruned_version, 0)
+
+    # Al eliminar el usuario no se crean registros de eliminación de sus libros
+    def test_delete_user(self):
+        self.books[0].delete()
+        self.user.delete()
+
+        self.assertFalse(BookTombstone.objects.exists())
+        self.assertEqual(Book.objects.count(), 1)
+
+
+# Tests de la atomicidad de las versiones fuera de una transacción (autocommit)
+class ChangeVersionTransactionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.book = Book.objects.create(
+            title='Test Title', author=Author.objects.create(full_name='Test Author'), publication_year=2000, user=self.user
+        )
+
+    # Prueba que la nueva versión no se confirma si falla la actualización de los libros que la llevan
+    # (Book.save() envía post_save fuera de cualquier transacción)
+    def test_version_rolled_back_with_books(self):
+        version = LibraryVersion.objects.get(user=self.user).version
+
+        with mock.patch('books_management.versions._library_version', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.book.save()
+
+        self.assertEqual(LibraryVersion.objects.get(user=self.user).version, version)
+
+    # Prueba que los libros importados y la nueva versión se confirman juntos
+    def test_import_in_one_transaction(self):
+        with mock.patch('books_management.bulk.mark_changed', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                import_books(self.user, [{
+                    'title': 'New Title',
+                    'author': {'full_name': 'Test Author', 'email': 'author@example.com'},
+                    'genre': [{'genre': 'Genre 1'}],
+                    'publication_year': 2020
+                }], 10)
+
+        self.assertEqual(Book.objects.count(), 1)
+
+
+# Tests de la normalización de autores y géneros
+class NormalizationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    # Prueba que los nombres que solo difieren en mayúsculas o espacios reutilizan la misma fila
+    def test_upsert_reuses_normalized_rows(self):
+        author, same, other = upsert_authors([
+            {'full_name': 'Gabriel Garcia', 'email': 'gabo@example.com'},
+            {'full_name': '  gabriel   GARCIA ', 'email': 'GABO@example.com'},
+            {'full_name': 'Gabriel Garcia', 'email': None}
+        ])
+        genres = upsert_genres(['Novela', 'novela ', 'Cuento'])
+
+        self.assertEqual(author, same)
+        self.assertNotEqual(author, other)
+        self.assertEqual(author.full_name, 'Gabriel Garcia')
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(genres[0], genres[1])
+        self.assertEqual(Genre.objects.count(), 2)
+
+    # Prueba que las claves caben aunque casefold alargue el texto hasta el máximo de cada campo
+    def test_keys_fit_expanded_casefold(self):
+        author = Author.objects.create(full_name='ß' * 100, email='ß' * 240 + '@example.com')
+        genre = Genre.objects.create(genre='ß' * 50)
+
+        author.refresh_from_db()
+        genre.refresh_from_db()
+        self.assertEqual(author.full_name_key, 'ss' * 100)
+        self.assertEqual(genre.genre_key, 'ss' * 50)
+
+    # Prueba que un autor o género existente no se vuelve a insertar
+    def test_upsert_existing_rows_single_query(self):
+        Author.objects.create(full_name='Test Author', email='author@example.com')
+        Genre.objects.create(genre='Test Genre')
+
+        with self.assertNumQueries(1):
+            upsert_authors([{'full_name': 'TEST AUTHOR', 'email': 'author@example.com'}])
+        with self.assertNumQueries(1):
+            upsert_genres(['test genre'])
+
+    # Prueba que crear libros con variantes del mismo nombre no duplica autores ni géneros
+    def test_create_book_reuses_author_and_genre(self):
+        for full_name, genre in (('Test Author', 'Test Genre'), ('test author ', 'TEST GENRE')):
+            response = self.client.post(reverse('create_book'), {
+                'title': 'Test Title',
+                'user': self.user.id,
+                'author': {'full_name': full_name, 'email': 'author@example.com'},
+                'genre': [{'genre': genre}],
+                'publication_year': 2000
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 1)
+
+    # Prueba que la fusión reasigna libros y géneros al registro con menor id
+    def test_merge_duplicates(self):
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        duplicate_author = Author.objects.create(full_name='Other', email='author@example.com')
+        genre = Genre.objects.create(genre='Test Genre')
+        duplicate_genre = Genre.objects.create(genre='Other')
+        # Actualizaciones que no pasan por save() dejan duplicados con claves desactualizadas
+        Author.objects.filter(pk=duplicate_author.pk).update(full_name='test author')
+        Genre.objects.filter(pk=duplicate_genre.pk).update(genre='TEST GENRE')
+
+        book = Book.objects.create(title='Book', author=duplicate_author, publication_year=2000, user=self.user)
+        book.genre.set([genre, duplicate_genre])
+        other = Book.objects.create(title='Other', author=author, publication_year=2000, user=self.user)
+        other.genre.set([duplicate_genre])
+
+        self.assertEqual(merge_duplicates(), (1, 1))
+
+        book.refresh_from_db()
+        self.assertEqual(book.author, author)
+        self.assertEqual(list(book.genre.all()), [genre])
+        self.assertEqual(list(other.genre.all()), [genre])
+        self.assertEqual(list(Author.objects.all()), [author])
+        self.assertEqual(list(Genre.objects.all()), [genre])
+        self.assertEqual(merge_duplicates(), (0, 0))
+
+
+# Tests de las migraciones de claves normalizadas sobre datos con duplicados
+class NormalizedKeysMigrationTestCase(TransactionTestCase):
+    before = [('books_management', '0004_composite_indexes')]
+    after = [('books_management', '0006_normalized_keys_unique')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    # Prueba que la fusión de duplicados y las restricciones únicas se aplican con libros que los referencian
+    def test_merge_duplicates_with_books(self):
+        User = self.apps.get_model('auth', 'User')
+        Author = self.apps.get_model('books_management', 'Author')
+        Genre = self.apps.get_model('books_management', 'Genre')
+        Book = self.apps.get_model('books_management', 'Book')
+        user = User.objects.create(username='testuser')
+        author = Author.objects.create(full_name='Ana', email='ana@example.com')
+        duplicate_author = Author.objects.create(full_name='ana ', email='ANA@example.com')
+        long_author = Author.objects.create(full_name='ß' * 100, email='long@example.com')
+        genre = Genre.objects.create(genre='Drama')
+        duplicate_genre = Genre.objects.create(genre='drama')
+        first = Book.objects.create(title='First', author=author, user=user, publication_year=2020)
+        second = Book.objects.create(title='Second', author=duplicate_author, user=user, publication_year=2020)
+        first.genre.add(genre, duplicate_genre)
+        second.genre.add(duplicate_genre)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Author = apps.get_model('books_management', 'Author')
+        Genre = apps.get_model('books_management', 'Genre')
+        Book = apps.get_model('books_management', 'Book')
+
+        self.assertEqual(set(Author.objects.values_list('id', flat=True)), {author.id, long_author.id})
+        self.assertEqual(Author.objects.get(id=long_author.id).full_name_key, 'ss' * 100)
+        self.assertEqual(list(Genre.objects.values_list('id', 'genre_key')), [(genre.id, 'drama')])
+        self.assertEqual(set(Book.objects.values_list('author_id', flat=True)), {author.id})
+        for book in Book.objects.all():
+            self.assertEqual(list(book.genre.values_list('id', flat=True)), [genre.id])
+
+
+# Tests para los campos parciales (?fields= y ?expand=)
+class FieldsetTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        self.genres = [Genre.objects.create(genre=f'Genre {i}') for i in range(2)]
+        for i in range(3):
+            book = Book.objects.create(title=f'Title {i}', author=self.author, publication_year=2000 + i, user=self.user)
+            book.genre.set(self.genres)
+        self.book = book
+        # Primera solicitud para guardar el token en la caché de autenticación
+        self.client.get(reverse('get_book_by_pk', args=[self.book.id]))
+
+    # Prueba que solo se devuelven los campos pedidos, en una consulta sin uniones ni precargas
+    # (además de la versión de la biblioteca para la ETag)
+    def test_list_fields(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('get_all_books'), {'fields': 'title,id'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['Books'][0], {'id': self.book.id - 2, 'title': 'Title 0'})
+
+    # Prueba que las relaciones no expandidas se devuelven como ids
+    def test_relations_as_ids(self):
+        response = self.client.get(reverse('get_all_books'), {'fields': 'id,author,genre', 'ordering': 'publication_year'})
+
+        book = response.data['Books'][0]
+        self.assertEqual(sorted(book), ['author', 'genre', 'id'])
+        self.assertEqual(book['id'], self.book.id - 2)
+        self.assertEqual(book['author'], self.author.id)
+        self.assertCountEqual(book['genre'], [genre.id for genre in self.genres])
+
+    # Prueba que ?expand= devuelve las relaciones con la misma forma que la representación completa
+    def test_expand(self):
+        full = self.client.get(reverse('get_book_by_pk', args=[self.book.id])).data['Book']
+
+        response = self.client.get(reverse('get_book_by_pk', args=[self.book.id]), {'fields': 'id', 'expand': 'author,genre'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['Book']), ['author', 'genre', 'id'])
+        self.assertEqual(response.data['Book']['author'], full['author'])
+        self.assertCountEqual(response.data['Book']['genre'], full['genre'])
+
+        # Sin ?fields= se devuelven todos los campos, con las relaciones expandidas indicadas
+        response = self.client.get(reverse('get_book_by_pk', args=[self.book.id]), {'expand': 'author'})
+        self.assertEqual(response.data['Book']['author'], full['author'])
+        self.assertCountEqual(response.data['Book']['genre'], [genre.id for genre in self.genres])
+        self.assertEqual(response.data['Book']['user'], self.user.id)
+
+    # Prueba que un campo desconocido devuelve un error
+    def test_invalid_fields(self):
+        response = self.client.get(reverse('get_all_books'), {'fields': 'id,isbn'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('get_book_by_pk', args=[self.book.id]), {'expand': 'title'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Prueba que la paginación funciona con campos que no incluyen el ordenamiento
+    def test_pagination_with_fields(self):
+        response = self.client.get(reverse('get_all_books'), {'fields': 'title', 'ordering': 'publication_year', 'page_size': 2})
+        self.assertEqual([book['title'] for book in response.data['Books']], ['Title 0', 'Title 1'])
+
+        response = self.client.get(reverse('get_all_books'), {'fields': 'title', 'cursor': response.data['next']})
+        self.assertEqual([book['title'] for book in response.data['Books']], ['Title 2'])
+
+    # Prueba que las vistas asíncronas admiten los mismos parámetros
+    async def test_async_fields(self):
+        token = await Token.objects.aget(user=self.user)
+        headers = {'Authorization': 'Token ' + token.key}
+
+        response = await self.async_client.get(reverse('async_get_book_by_pk', args=[self.book.id]), {'fields': 'id,title'}, headers=headers)
+        self.assertEqual(response.json()['Book'], {'id': self.book.id, 'title': 'Title 2'})
+
+        response = await self.async_client.get(reverse('async_get_all_books'), {'fields': 'id', 'expand': 'genre'}, headers=headers)
+        self.assertCountEqual(response.json()['Books'][0]['genre'], [{'id': genre.id, 'genre': genre.genre} for genre in self.genres])
+
+
+# Tests para las peticiones condicionales (ETag / If-None-Match / If-Match)
+class ConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        self.genre = Genre.objects.create(genre='Test Genre')
+        self.book = Book.objects.create(title='Test Title', author=self.author, publication_year=2000, user=self.user)
+        self.book.genre.set([self.genre])
+        self.detail_url = reverse('get_book_by_pk', args=[self.book.id])
+        self.list_url = reverse('get_all_books')
+
+    def update_data(self, title):
+        return {
+            'title': title,
+            'user': self.user.id,
+            'author': {'full_name': 'Test Author', 'email': 'author@example.com'},
+            'genre': [{'genre': 'Test Genre'}],
+            'publication_year': 2000
+        }
+
+    # Prueba que el detalle responde 304 sin cargar el libro cuando la ETag coincide
+    def test_detail_not_modified(self):
+        response = self.client.get(self.detail_url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        # Solo se consulta la fecha de modificación del libro
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        # Otros campos producen otra representación y otra ETag
+        self.assertNotEqual(self.client.get(self.detail_url, {'fields': 'id'})['ETag'], etag)
+
+        # Renombrar el autor cambia la representación del libro
+        self.author.full_name = 'Renamed Author'
+        self.author.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['Book']['author']['full_name'], 'Renamed Author')
+
+    # Prueba que el listado responde 304 hasta que cambia la biblioteca del usuario
+    def test_list_not_modified(self):
+        etag = self.client.get(self.list_url)['ETag']
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book.genre.add(Genre.objects.create(genre='Other Genre'))
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Los cambios en la biblioteca de otro usuario no afectan a la ETag
+        etag = response['ETag']
+        other = User.objects.create_user(username='otheruser', password='password123')
+        Book.objects.create(title='Other Title', author=self.author, publication_year=2000, user=other)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    # Prueba la concurrencia optimista con If-Match
+    def test_update_if_match(self):
+        url = reverse('update_book', args=[self.book.id])
+        etag = self.client.get(self.detail_url)['ETag']
+
+        response = self.client.put(url, self.update_data('First'), format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new_etag = response['ETag']
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(self.client.get(self.detail_url)['ETag'], new_etag)
+
+        # Una segunda modificación con la ETag antigua se rechaza
+        response = self.client.put(url, self.update_data('Second'), format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'First')
+
+        # Sin If-Match la modificación no se comprueba
+        response = self.client.put(url, self.update_data('Third'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Prueba que If-Match acepta la ETag de cualquier variante del detalle (?fields=, ?expand=)
+    def test_update_if_match_variant(self):
+        url = reverse('update_book', args=[self.book.id])
+        etag = self.client.get(self.detail_url, {'fields': 'id,title'})['ETag']
+        self.assertNotEqual(etag, self.client.get(self.detail_url)['ETag'])
+
+        response = self.client.put(url, self.update_data('First'), format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.put(url, self.update_data('Second'), format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+
+# Tests para el renderer JSON rápido y la serialización de libros sin DRF
+class FastRenderingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        author = Author.objects.create(full_name='Autor \u2028 Ñandú', email=None)
+        genres = [Genre.objects.create(genre='Género 1'), Genre.objects.create(genre='Género 2')]
+        for index in range(3):
+            book = Book.objects.create(title=f'Título "{index}" \u2029', author=author, publication_year=2000 + index, user=self.user)
+            book.genre.set(genres)
+
+    def assertSameBytes(self, data, **kwargs):
+        self.assertEqual(FastJSONRenderer().render(data, **kwargs), JSONRenderer().render(data, **kwargs))
+
+    # Prueba que el renderer produce los mismos bytes que el JSONRenderer de DRF
+    def test_renderer_matches_drf(self):
+        data = {
+            'message': 'Ñandú \u2028 \u2029 "quoted" \\ \n',
+            'errors': {'title': [ErrorDetail('This field is required.', code='required')]},
+            'created': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 1, 2),
+            'price': Decimal('1.50'),
+            'ids': (1, 2, 3),
+            'big': 2 ** 70,
+            'empty': None,
+            'flag': True
+        }
+        self.assertSameBytes(data)
+        self.assertSameBytes({1: 'non-string key'})
+        self.assertSameBytes(data, accepted_media_type='application/json; indent=4')
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    # Prueba que sin orjson se usa el codificador de la biblioteca estándar
+    def test_renderer_without_orjson(self):
+        data = {'message': 'Ñandú \u2028', 'Books': [1, 2]}
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertSameBytes(data)
+
+    # Prueba que la serialización directa coincide con BookSerializer
+    def test_serialize_book_matches_serializer(self):
+        for book in Book.objects.select_related('author').prefetch_related('genre'):
+            self.assertEqual(json.dumps(serialize_book(book)), json.dumps(BookSerializer(book).data))
+
+    # Prueba que las respuestas del listado y del detalle no cambian
+    def test_responses_match_drf(self):
+        books = Book.objects.select_related('author').prefetch_related('genre').order_by('id')
+
+        response = self.client.get(reverse('get_all_books'))
+        self.assertEqual(response.content, JSONRenderer().render({
+            'message': 'Correctly obtained books for the current user',
+            'Books': BookSerializer(books, many=True).data,
+            'next': None,
+            'previous': None
+        }))
+
+        response = self.client.get(reverse('get_book_by_pk', args=[books[0].id]))
+        self.assertEqual(response.content, JSONRenderer().render({
+            'message': 'Correctly obtained book',
+            'Book': BookSerializer(books[0]).data
+        }))
+
+
+# Tests para la compresión de respuestas
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        genre = Genre.objects.create(genre='Test Genre')
+        books = Book.objects.bulk_create([
+            Book(title=f'Test Title {index}', author=self.author, publication_year=2000, user=self.user)
+            for index in range(30)
+        ])
+        Book.genre.through.objects.bulk_create([Book.genre.through(book_id=book.id, genre_id=genre.id) for book in books])
+        self.book = books[0]
+
+    # Prueba que el listado se comprime con gzip cuando el cliente lo acepta
+    def test_gzip_list(self):
+        plain = self.client.get(reverse('get_all_books'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(reverse('get_all_books'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+        # La ETag débil sigue sirviendo para las peticiones condicionales
+        response = self.client.get(reverse('get_all_books'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    # Prueba que las respuestas pequeñas y los tipos no permitidos no se comprimen
+    def test_threshold_and_content_types(self):
+        response = self.client.get(reverse('get_book_by_pk', args=[self.book.id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        with override_settings(RESPONSE_COMPRESSION={'CONTENT_TYPES': ['text/csv']}):
+            response = self.client.get(reverse('get_all_books'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    # Prueba que la exportación se comprime fragmento a fragmento sin acumular la respuesta
+    def test_gzip_streaming_export(self):
+        plain = b''.join(self.client.get(reverse('export_books', args=['ndjson'])).streaming_content)
+
+        # Con bloques pequeños la respuesta comprimida se emite en varios fragmentos
+        with mock.patch.object(middleware, 'STREAM_BUFFER_SIZE', 256):
+            response = self.client.get(reverse('export_books', args=['ndjson']), HTTP_ACCEPT_ENCODING='gzip')
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertFalse(response.has_header('Content-Length'))
+            chunks = list(response.streaming_content)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), plain)
+
+    # Prueba que una modificación acepta la ETag débil de una respuesta comprimida
+    def test_if_match_weak_etag(self):
+        etag = self.client.get(reverse('get_book_by_pk', args=[self.book.id]))['ETag']
+        response = self.client.put(reverse('update_book', args=[self.book.id]), {
+            'title': 'Updated Title',
+            'user': self.user.id,
+            'author': {'full_name': 'Test Author', 'email': 'author@example.com'},
+            'genre': [{'genre': 'Test Genre'}],
+            'publication_year': 2000
+        }, format='json', HTTP_IF_MATCH='W/' + etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Prueba la elección de la codificación según Accept-Encoding y la preferencia del servidor
+    def test_choose_encoding(self):
+        encodings = ['zstd', 'br', 'gzip']
+        self.assertEqual(choose_encoding('gzip, br', encodings), 'br')
+        self.assertEqual(choose_encoding('gzip;q=1.0, br;q=0.5', encodings), 'gzip')
+        self.assertEqual(choose_encoding('*', encodings), 'zstd')
+        self.assertEqual(choose_encoding('*, zstd;q=0', encodings), 'br')
+        self.assertIsNone(choose_encoding('identity', encodings))
+        self.assertIsNone(choose_encoding('', encodings))
+
+    # Prueba las codificaciones opcionales cuando sus paquetes están instalados
+    def test_optional_encodings(self):
+        decoders = {
+            'br': lambda content: middleware.brotli.decompress(content),
+            'zstd': lambda content: middleware.zstandard.ZstdDecompressor().decompressobj().decompress(content),
+        }
+        plain = self.client.get(reverse('get_all_books')).content
+
+        for encoding, decode in decoders.items():
+            if encoding not in middleware.COMPRESSORS:
+                continue
+            with self.subTest(encoding=encoding):
+                response = self.client.get(reverse('get_all_books'), HTTP_ACCEPT_ENCODING=encoding)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertEqual(decode(response.content), plain)
+
+
+# Tests para la instrumentación por vista
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        reset_metrics()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        for index in range(6):
+            Book.objects.create(title=f'Test Title {index}', author=author, publication_year=2000, user=self.user)
+
+    def get_metrics(self):
+        return APIClient().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    # Prueba la cabecera Server-Timing y las métricas de una solicitud muestreada
+    @override_settings(INSTRUMENTATION={'SAMPLE_RATE': 1.0, 'METRICS_TOKEN': 'secret'})
+    def test_sampled_request(self):
+        response = self.client.get(reverse('get_all_books'))
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+$')
+        metrics = get_sampled_metrics()['get_all_books']
+        self.assertEqual(metrics['sampled_requests'], 1)
+        self.assertGreaterEqual(metrics['sql_queries'], 2)
+        self.assertGreater(metrics['render_seconds'], 0)
+        self.assertEqual(metrics['response_bytes'], len(response.content))
+
+        content = self.get_metrics()
+        self.assertIn('api_requests_total{view="get_all_books",method="GET",status="200"} 1', content)
+        self.assertIn('api_request_duration_seconds_bucket{view="get_all_books",le="+Inf"} 1', content)
+        self.assertIn('api_request_duration_seconds_count{view="get_all_books"} 1', content)
+        self.assertIn('api_sql_queries_total{view="get_all_books"}', content)
+
+    # Prueba que las solicitudes no muestreadas solo cuentan en el total y en el histograma
+    @override_settings(INSTRUMENTATION={'SAMPLE_RATE': 0.0, 'METRICS_TOKEN': 'secret'})
+    def test_unsampled_request(self):
+        response = self.client.get(reverse('get_all_books'))
+
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(get_sampled_metrics(), {})
+        self.assertIn('api_request_duration_seconds_count{view="get_all_books"} 1', self.get_metrics())
+
+    # Prueba que las consultas de las vistas asíncronas también se registran
+    @override_settings(INSTRUMENTATION={'SAMPLE_RATE': 1.0})
+    async def test_async_view(self):
+        response = await self.async_client.get(reverse('async_get_all_books'), headers={'Authorization': 'Token ' + self.token.key})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Server-Timing', response)
+        self.assertGreaterEqual(get_sampled_metrics()['async_get_all_books']['sql_queries'], 2)
+
+    # Prueba que las consultas del cuerpo de una respuesta en streaming también se registran
+    @override_settings(INSTRUMENTATION={'SAMPLE_RATE': 1.0})
+    def test_streaming_response(self):
+        response = self.client.get(reverse('export_books', args=['ndjson']))
+        self.assertNotIn('export_books', get_sampled_metrics())
+
+        content = b''.join(response.streaming_content)
+        metrics = get_sampled_metrics()['export_books']
+        # Token + libros con autor + géneros
+        self.assertEqual(metrics['sql_queries'], 3)
+        self.assertEqual(metrics['response_bytes'], len(content))
+        self.assertFalse(any(isinstance(wrapper, QueryCollector) for wrapper in connection.execute_wrappers))
+
+    # Prueba la detección de consultas repetidas (acceso al autor sin select_related)
+    def test_duplicate_queries(self):
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            authors = [book.author.full_name for book in Book.objects.all()]
+
+        self.assertEqual(len(authors), 6)
+        self.assertEqual(collector.count, 7)
+        duplicates = collector.duplicates(5)
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0][1], 6)
+
+        with self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            warn_duplicates('get_all_books', duplicates)
+        self.assertIn('Duplicate query in get_all_books (6 times)', logs.output[0])
+
+    # Prueba que el endpoint de métricas exige el token configurado
+    @override_settings(INSTRUMENTATION={'METRICS_TOKEN': 'secret'})
+    def test_metrics_token(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer other').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, status.HTTP_200_OK)
+
+    # Prueba que sin token ni direcciones permitidas el endpoint de métricas no es accesible
+    def test_metrics_closed_by_default(self):
+        self.assertEqual(APIClient().get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+    # Prueba el acceso al endpoint de métricas por dirección
+    @override_settings(INSTRUMENTATION={'METRICS_ALLOWED_IPS': ['10.0.0.5']})
+    def test_metrics_allowed_ips(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, status.HTTP_200_OK)
+        self.assertEqual(client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+# Caché compartida entre procesos para la marca de lectura de las propias escrituras en los tests de réplicas
+SHARED_STICKY_CACHE = {
+    'CACHES': {**settings.CACHES, 'replica_sticky': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'books-replica-sticky'),
+    }},
+    'REPLICA_STICKY_CACHE_ALIAS': 'replica_sticky',
+}
+
+
+# Tests para el router de réplicas de lectura (sin réplicas reales: solo se comprueba el alias elegido)
+@override_settings(REPLICA_DATABASES=['replica_1'], **SHARED_STICKY_CACHE)
+class ReplicaRouterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['replica_sticky'].clear()
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.addCleanup(set_current_request, None)
+
+    def make_request(self, method):
+        request = getattr(RequestFactory(), method)('/api/books/all')
+        request.user = self.user
+        set_current_request(request)
+        return request
+
+    # Prueba que las lecturas de una solicitud GET van a la réplica y las escrituras a la principal
+    def test_get_reads_from_replica(self):
+        self.make_request('get')
+
+        self.assertEqual(self.router.db_for_read(Book), 'replica_1')
+        self.assertEqual(self.router.db_for_write(Book), 'default')
+        # Usuarios y tokens se leen siempre de la principal
+        self.assertEqual(self.router.db_for_read(Token), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    # Prueba que las solicitudes que escriben y las lecturas fuera de una solicitud usan la principal
+    def test_primary_reads(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+        self.make_request('post')
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    # Prueba la lectura de las propias escrituras durante la ventana configurada
+    def test_sticky_after_write(self):
+        mark_sticky(self.user.pk)
+        self.make_request('get')
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+        other = User.objects.create_user(username='otheruser', password='password123')
+        request = self.make_request('get')
+        request.user = other
+        self.assertEqual(self.router.db_for_read(Book), 'replica_1')
+
+    # Prueba que una solicitud que escribe marca al usuario para leer de la principal
+    def test_write_request_marks_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        response = client.post(reverse('create_book'), {
+            'title': 'Test Title',
+            'user': self.user.id,
+            'author': {'full_name': 'Test Author', 'email': 'author@example.com'},
+            'genre': [{'genre': 'Test Genre'}],
+            'publication_year': 2000
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_sticky(self.user.pk))
+
+    # Prueba que el feed de cambios lee la versión, los libros y las eliminaciones de la principal
+    # (la réplica de estos tests no existe, así que cualquier lectura en ella fallaría)
+    def test_changes_feed_reads_from_primary(self):
+        book = Book.objects.create(
+            title='Test Title', author=Author.objects.create(full_name='Test Author'), publication_year=2000, user=self.user
+        )
+        book.genre.set([Genre.objects.create(genre='Test Genre')])
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+
+        response = client.get(reverse('get_changes_feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([change['id'] for change in response.data['changes']], [book.id])
+
+        book_id = book.id
+        book.delete()
+        response = client.get(reverse('get_changes_feed'), {'since': response.data['since']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['changes'], [{'id': book_id, 'deleted': True}])
+
+    # Prueba que el cuerpo de una respuesta en streaming, generado después de process_response, lee
+    # de la misma base de datos que la solicitud
+    def test_streaming_response_reads_from_replica(self):
+        def chunks():
+            for _ in range(2):
+                yield self.router.db_for_read(Book)
+
+        async def achunks():
+            for chunk in chunks():
+                yield chunk
+
+        async def aconsume(response):
+            return [chunk async for chunk in response]
+
+        request = RequestFactory().get('/api/books/export/ndjson')
+        request.user = self.user
+        response = middleware.ReplicaMiddleware(lambda request: StreamingHttpResponse(chunks()))(request)
+        self.assertEqual(b''.join(response.streaming_content), b'replica_1replica_1')
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+        response = middleware.ReplicaMiddleware(lambda request: StreamingHttpResponse(achunks()))(request)
+        self.assertEqual(async_to_sync(aconsume)(response.streaming_content), [b'replica_1', b'replica_1'])
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    # Prueba que, al leer de una réplica, la clave de caché incluye la ETag leída de la misma réplica
+    def test_cache_key_includes_replica_etag(self):
+        def etag_func(request, **kwargs):
+            return '"replica-etag"'
+
+        self.assertTrue(make_key('list', self.make_request('get'), {}, etag_func).endswith(':replica-etag'))
+        self.assertFalse(make_key('list', self.make_request('post'), {}, etag_func).endswith(':replica-etag'))
+
+    # Prueba que las réplicas no se pueden usar con una caché propia de cada proceso para la marca
+    @override_settings(REPLICA_STICKY_CACHE_ALIAS='default')
+    def test_requires_shared_sticky_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRouter()
+        with self.assertRaises(ImproperlyConfigured):
+            mark_sticky(self.user.pk)
+
+    # Prueba que las migraciones no se aplican a las réplicas
+    def test_allow_migrate(self):
+        self.assertFalse(self.router.allow_migrate('replica_1', 'books_management'))
+        self.assertIsNone(self.router.allow_migrate('default', 'books_management'))
+
+
+# Tests con una réplica real, que en los tests es un espejo de la base principal.
+# Se ejecutan con REPLICA_NAMES o REPLICA_HOSTS configurados.
+@skipUnless(settings.REPLICA_DATABASES, 'No read replica configured')
+@override_settings(**SHARED_STICKY_CACHE)
+class ReplicaRoutingTestCase(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        caches['replica_sticky'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.replica = connections[settings.REPLICA_DATABASES[0]]
+
+    # Prueba que el listado se lee de la réplica salvo justo después de una escritura del usuario
+    @override_settings(REPLICA_DATABASES=settings.REPLICA_DATABASES[:1])
+    def test_read_your_writes(self):
+        response = self.client.post(reverse('create_book'), {
+            'title': 'Test Title',
+            'user': self.user.id,
+            'author': {'full_name': 'Test Author', 'email': 'author@example.com'},
+            'genre': [{'genre': 'Test Genre'}],
+            'publication_year': 2000
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            response = self.client.get(reverse('get_all_books'))
+        self.assertEqual(len(response.data['Books']), 1)
+        self.assertEqual(len(replica_queries), 0)
+
+        cache.clear()
+        caches['replica_sticky'].clear()
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            response = self.client.get(reverse('get_all_books'))
+        self.assertEqual(len(response.data['Books']), 1)
+        self.assertGreater(len(replica_queries), 0)
+
+
+# Tests para las vistas asíncronas de lectura
+class AsyncReadViewsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        self.headers = {'Authorization': 'Token ' + Token.objects.create(user=self.user).key}
+        author = Author.objects.create(full_name='Test Author', email='author@example.com')
+        genre = Genre.objects.create(genre='Test Genre')
+        self.books = []
+        for i in range(3):
+            book = Book.objects.create(title=f'Title {i}', author=author, publication_year=2000 + i, user=self.user)
+            book.genre.add(genre)
+            self.books.append(book)
+        self.foreign_book = Book.objects.create(title='Other Title', author=author, publication_year=2000, user=self.other)
+
+    # Prueba para comprobar que el listado asíncrono devuelve el mismo contenido que el síncrono
+    async def test_async_get_all_books(self):
+        response = await self.async_client.get(reverse('async_get_all_books'), {'page_size': 2}, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([book['id'] for book in data['Books']], [self.books[0].id, self.books[1].id])
+        self.assertEqual(data['Books'][0]['genre'][0]['genre'], 'Test Genre')
+        self.assertIsNotNone(data['next'])
+
+        sync_response = await self.async_client.get(reverse('get_all_books'), {'page_size': 2}, headers=self.headers)
+        self.assertEqual(sync_response.json(), data)
+
+    # Prueba para obtener un libro por su PK de forma asíncrona
+    async def test_async_get_book_by_pk(self):
+        response = await self.async_client.get(reverse('async_get_book_by_pk', args=[self.books[0].id]), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['Book']['author']['full_name'], 'Test Author')
+
+        response = await self.async_client.get(reverse('async_get_book_by_pk', args=[self.foreign_book.id]), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = await self.async_client.get(reverse('async_get_book_by_pk', args=[self.foreign_book.id + 100]), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    # Prueba que las vistas asíncronas devuelven las mismas ETag y Last-Modified que las síncronas y
+    # responden 304 a una solicitud condicional
+    async def test_async_conditional_requests(self):
+        for async_url, sync_url in (
+            (reverse('async_get_all_books'), reverse('get_all_books')),
+            (reverse('async_get_book_by_pk', args=[self.books[0].id]), reverse('get_book_by_pk', args=[self.books[0].id])),
+        ):
+            response = await self.async_client.get(async_url, {'fields': 'id,title'}, headers=self.headers)
+            sync_response = await self.async_client.get(sync_url, {'fields': 'id,title'}, headers=self.headers)
+            self.assertEqual(response['ETag'], sync_response['ETag'])
+            self.assertEqual(response['Last-Modified'], sync_response['Last-Modified'])
+
+            response = await self.async_client.get(
+                async_url, {'fields': 'id,title'}, headers={**self.headers, 'If-None-Match': response['ETag']}
+            )
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    # Prueba para las vistas asíncronas sin autenticación o con un token inválido
+    async def test_async_unauthenticated(self):
+        response = await self.async_client.get(reverse('async_get_all_books'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.async_client.get(reverse('async_get_all_books'), headers={'Authorization': 'Token invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['detail'], 'Invalid token.')
+
+    # Un usuario inactivo no se guarda en la caché de tokens: tras iniciar sesión de nuevo, la vista
+    # asíncrona lo acepta
+    async def test_async_inactive_user_not_cached(self):
+        await User.objects.filter(pk=self.user.pk).aupdate(is_active=False)
+
+        response = await self.async_client.get(reverse('async_get_all_books'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNone(token_cache.get(self.headers['Authorization'].split()[1]))
+
+        await self.async_client.post(reverse('signIn'), {'username': 'testuser', 'password': 'password123'}, content_type='application/json')
+
+        response = await self.async_client.get(reverse('async_get_all_books'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# Presupuestos de consultas y tiempo de respuesta de los endpoints de libros con bibliotecas de
+# 1, 10 y 1000 libros: el número de consultas no debe crecer con el tamaño de la biblioteca
+class BookQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.data = {
+            'title': 'Budget Title',
+            'author': {'full_name': 'Budget Author', 'email': 'budget@example.com'},
+            'genre': [{'genre': 'Bench Genre 0'}, {'genre': 'Budget Genre'}],
+            'publication_year': 2000
+        }
+
+    def assertAllStatus(self, responses, status_code):
+        for size, response in responses.items():
+            self.assertEqual(response.status_code, status_code, f'{size} books')
+
+    # Token + versión de la biblioteca (ETag) + página de libros con autor + géneros de la página
+    def test_get_all_books_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].get(reverse('get_all_books')),
+            max_queries=4, max_ms=500
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+        self.assertEqual(len(responses[1000].data['Books']), settings.BOOKS_PAGE_SIZE)
+
+    # Token + versión de la biblioteca (ETag) + libro con autor + géneros
+    def test_get_book_by_pk_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].get(reverse('get_book_by_pk', args=[context[1][-1].id])),
+            max_queries=4, max_ms=200
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+
+    # Token + usuario + alta de autor y géneros + libro + géneros del libro + versiones de la biblioteca
+    def test_create_book_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].post(reverse('create_book'), {**self.data, 'user': context[1][0].user_id}, format='json'),
+            max_queries=15, max_ms=500
+        )
+        self.assertAllStatus(responses, status.HTTP_201_CREATED)
+
+    # Como la creación, más la lectura del libro y la sustitución de sus géneros
+    def test_update_book_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].put(
+                reverse('update_book', args=[context[1][-1].id]), {**self.data, 'user': context[1][0].user_id}, format='json'
+            ),
+            max_queries=20, max_ms=500
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+
+    # Token + libro + borrado de la tabla intermedia y del libro + versión de la biblioteca + registro
+    # de la eliminación
+    def test_delete_book_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].delete(reverse('delete_book', args=[context[1][-1].id])),
+            max_queries=6, max_ms=200
+        )
+        self.assertAllStatus(responses, status.HTTP_204_NO_CONTENT)
+
+    # La exportación lee por bloques de BOOKS_EXPORT_CHUNK_SIZE libros: las consultas solo crecen por bloque
+    def test_export_books_budget(self):
+        def export(context):
+            response = context[0].get(reverse('export_books', args=['ndjson']))
+            response.content_lines = b''.join(response.streaming_content).splitlines()
+            return response
+
+        responses = self.assertBudgetBySize(create_budget_library, export, max_queries=3, max_ms=2000)
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+        self.assertEqual(len(responses[1000].content_lines), 1000)
+
+    # Token + versión de la biblioteca (ETag) + libros con autor + géneros, para hasta 100 ids
+    def test_get_books_batch_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].get(reverse('get_books_batch'), {'ids': ','.join(str(book.id) for book in context[1][:100])}),
+            max_queries=4, max_ms=500
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+        self.assertEqual(len(responses[1000].data['Books']), 100)
+
+    # Selección + UPDATE del año + sustitución de géneros + versión de la biblioteca, para cualquier número de libros
+    def test_bulk_update_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].patch(reverse('bulk_update_books'), {
+                'filter': {'year_from': 1900}, 'publication_year': 1999, 'genre': [{'genre': 'Budget Genre'}]
+            }, format='json'),
+            max_queries=12, max_ms=2000
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+        self.assertEqual(responses[1000].data['updated'], 1000)
+
+    def test_bulk_delete_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].post(reverse('bulk_delete_books'), {'filter': {'year_from': 1900}}, format='json'),
+            max_queries=8, max_ms=1000
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+        self.assertEqual(responses[1000].data['deleted'], 1000)
+
+    # Token + versión de la biblioteca (ETag) + libros y registros de eliminaciones desde el token +
+    # géneros: una sincronización incremental no depende del tamaño de la biblioteca
+    def test_get_changes_budget(self):
+        def setup(size):
+            client, books = create_budget_library(size)
+            since = encode_token(LibraryVersion.objects.get(user=books[0].user).version)
+            books[-1].save()
+            return client, books, since
+
+        responses = self.assertBudgetBySize(
+            setup,
+            lambda context: context[0].get(reverse('get_changes_feed'), {'since': context[2]}),
+            max_queries=5, max_ms=500
+        )
+        self.assertAllStatus(responses, status.HTTP_200_OK)
+        for size, response in responses.items():
+            self.assertEqual(len(response.data['changes']), 1, f'{size} books')
+
+    # Prueba que el presupuesto detecta un patrón N+1 aunque no se supere el máximo de consultas
+    def test_budget_detects_n_plus_one(self):
+        def n_plus_one(context):
+            return [book.author.full_name for book in Book.objects.filter(user=context[1][0].user)]
+
+        with self.assertRaisesMessage(AssertionError, 'Query count grows with the number of books'):
+            self.assertBudgetBySize(create_budget_library, n_plus_one, max_queries=100, sizes=(1, 10))
@@ -1,12 +1,20 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 
 # Definimos las URLs de la aplicación
 urlpatterns = [
     path('create', views.create_book, name='create_book'),
+    path('import', views.import_books, name='import_books'),
     path('all', views.get_all_books, name='get_all_books'),
+    path('batch', views.get_books_batch, name='get_books_batch'),
+    path('changes', views.get_changes_feed, name='get_changes_feed'),
+    path('export/<str:export_format>', views.export_books, name='export_books'),
     path('<int:pk>', views.get_book_by_pk, name='get_book_by_pk'),
     path('update/<int:pk>', views.update_book, name='update_book'),
     path('delete/<int:pk>', views.delete_book, name='delete_book'),
+    path('bulk/update', views.bulk_update_books, name='bulk_update_books'),
+    path('bulk/delete', views.bulk_delete_books, name='bulk_delete_books'),
+    path('async/all', async_views.get_all_books, name='async_get_all_books'),
+    path('async/<int:pk>', async_views.get_book_by_pk, name='async_get_book_by_pk'),
 ]
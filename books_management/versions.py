@@ -0,0 +1,202 @@
+import hashlib
+from functools import wraps
+from django.db import connections, router, transaction
+from django.db.models import DateTimeField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.cache import get_conditional_response, parse_etags
+from django.utils.http import http_date
+from django.utils import timezone
+from .cache import invalidate
+from .models import Book, BookTombstone, LibraryVersion
+
+
+# Registra un cambio en los libros indicados: incrementa la versión de la biblioteca de cada
+# usuario e invalida la caché de respuestas. Los libros modificados guardan la nueva versión de la
+# biblioteca de su propietario y los que se van a eliminar ('deleted_ids', todavía en la tabla) dejan
+# un registro con ella; ambos son la fuente del feed de cambios. Con touch_books=True también actualiza
+# updated_at de los libros, para los cambios que no pasan por Book.save() (géneros, autores renombrados...).
+# Todo se hace en una transacción (propia, o la de quien llama sin punto de guardado) y la fila de la
+# versión queda bloqueada hasta su final: la nueva versión nunca se confirma antes que los libros o registros que la llevan,
+# y las versiones de cada usuario se confirman en orden.
+def mark_changed(user_ids=(), book_ids=(), touch_books=False, deleted_ids=()):
+    user_ids = set(user_ids)
+    book_ids = set(book_ids)
+    deleted_ids = set(deleted_ids)
+    now = timezone.now()
+
+    with transaction.atomic(using=router.db_for_write(LibraryVersion), savepoint=False):
+        if user_ids:
+            LibraryVersion.objects.filter(user_id__in=user_ids).update(version=F('version') + 1, updated_at=now)
+
+        if book_ids:
+            changes = {'change_version': _library_version()}
+            if touch_books:
+                changes['updated_at'] = now
+            Book.objects.filter(pk__in=book_ids).update(**changes)
+
+        if deleted_ids:
+            _record_deletions(deleted_ids, now)
+
+    invalidate(user_ids=user_ids, book_ids=book_ids | deleted_ids)
+
+
+# Versión actual de la biblioteca del propietario de cada libro, como expresión
+def _library_version():
+    return Coalesce(Subquery(LibraryVersion.objects.filter(user_id=OuterRef('user_id')).values('version')), 0)
+
+
+# Crea los registros de eliminación de los libros indicados con un único INSERT ... SELECT sobre los
+# propios libros, sea cual sea su número (bulk_create se dividiría en lotes en SQLite)
+def _record_deletions(book_ids, now):
+    using = router.db_for_write(BookTombstone)
+    quote = connections[using].ops.quote_name
+
+    books = Book.objects.using(using).filter(pk__in=book_ids).order_by().values_list(
+        'id', 'user_id', _library_version(), Value(now, output_field=DateTimeField())
+    )
+    select, params = books.query.get_compiler(using=using).as_sql()
+    columns = ', '.join(quote(BookTombstone._meta.get_field(name).column) for name in ('book_id', 'user', 'version', 'deleted_at'))
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(BookTombstone._meta.db_table)} ({columns}) {select}', params)
+
+
+# Construye una ETag fuerte a partir de las partes indicadas
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+# Fecha de modificación de un libro del usuario actual, o None si no existe o es de otro usuario.
+# Se guarda en la solicitud para que la ETag y Last-Modified usen una única consulta.
+def book_stamp(request, pk):
+    if getattr(request, '_book_stamp', (None, None))[0] != pk:
+        stamp = Book.objects.filter(pk=pk, user=request.user).values_list('updated_at', flat=True).first()
+        request._book_stamp = (pk, stamp)
+    return request._book_stamp[1]
+
+
+# Parte de la ETag de un libro que depende solo de su fecha de modificación
+def _book_tag(pk, updated_at):
+    return hashlib.md5(f'book:{pk}:{updated_at.isoformat()}'.encode()).hexdigest()
+
+
+# ETag de la representación de un libro: la parte de su fecha de modificación y, si hay parámetros
+# en la solicitud (por ejemplo ?fields=), un sufijo que distingue cada variante
+def make_book_etag(pk, updated_at, params=''):
+    tag = _book_tag(pk, updated_at)
+    if params:
+        tag += '-' + hashlib.md5(params.encode()).hexdigest()
+    return '"%s"' % tag
+
+
+# ETag de un libro del usuario actual, calculada sin cargarlo ni serializarlo
+def book_etag(request, pk, **kwargs):
+    stamp = book_stamp(request, pk)
+    if stamp is None:
+        return None
+    return make_book_etag(pk, stamp, request.GET.urlencode())
+
+
+def book_last_modified(request, pk, **kwargs):
+    return book_stamp(request, pk)
+
+
+# Comprueba la cabecera If-Match de una modificación. Bloquea la fila del libro hasta el final de
+# la transacción, de modo que dos modificaciones concurrentes con la misma ETag no pueden pasar
+# ambas la comprobación. Sin If-Match no hace ninguna consulta. Se aceptan también las ETag débiles
+# (W/), que es como se envían cuando la respuesta del detalle se ha comprimido, y las de cualquier
+# variante (?fields=, ?expand=): solo se compara la parte de la fecha de modificación.
+def if_match_passes(request, pk):
+    header = request.META.get('HTTP_IF_MATCH')
+    if not header:
+        return True
+
+    stamp = Book.objects.select_for_update().filter(pk=pk, user=request.user).values_list('updated_at', flat=True).first()
+    if stamp is None:
+        return False
+
+    tags = [etag.removeprefix('W/').strip('"').split('-')[0] for etag in parse_etags(header)]
+    return '*' in tags or _book_tag(pk, stamp) in tags
+
+
+# Versión de la biblioteca del usuario actual, leída una sola vez por solicitud. Se lee de la misma
+# base que los libros (una réplica en las solicitudes GET), de modo que la ETag y el contenido
+# corresponden a la misma versión; con primary=True, de la base principal. Solo si no existe se crea
+# en la principal.
+def get_library(request, primary=False):
+    if not hasattr(request, '_library'):
+        library = None if primary else LibraryVersion.objects.filter(user=request.user).first()
+        if library is None:
+            library, _ = LibraryVersion.objects.get_or_create(user=request.user)
+        request._library = library
+    return request._library
+
+
+# Versión de la biblioteca del usuario actual como (versión, fecha de modificación)
+def library_stamp(request):
+    library = get_library(request)
+    return library.version, library.updated_at
+
+
+# ETag del listado: depende de la versión de la biblioteca y de los parámetros (página, cursor, campos)
+def make_library_etag(request, library):
+    return make_etag('library', request.user.pk, library.version, library.updated_at.isoformat(), request.GET.urlencode())
+
+
+def library_etag(request, **kwargs):
+    return make_library_etag(request, get_library(request))
+
+
+def library_last_modified(request, **kwargs):
+    return library_stamp(request)[1]
+
+
+# ETag y fecha de modificación del feed de cambios, que se lee por completo de la base principal
+def changes_etag(request, **kwargs):
+    return make_library_etag(request, get_library(request, primary=True))
+
+
+def changes_last_modified(request, **kwargs):
+    return get_library(request, primary=True).updated_at
+
+
+# Versiones asíncronas: devuelven (ETag, fecha de modificación) para async_condition
+async def alibrary_validators(request, **kwargs):
+    if not hasattr(request, '_library'):
+        library = await LibraryVersion.objects.filter(user=request.user).afirst()
+        if library is None:
+            library, _ = await LibraryVersion.objects.aget_or_create(user=request.user)
+        request._library = library
+    return make_library_etag(request, request._library), request._library.updated_at
+
+
+async def abook_validators(request, pk, **kwargs):
+    stamp = await Book.objects.filter(pk=pk, user=request.user).values_list('updated_at', flat=True).afirst()
+    if stamp is None:
+        return None, None
+    return make_book_etag(pk, stamp, request.GET.urlencode()), stamp
+
+
+# Equivalente de django.views.decorators.http.condition para vistas asíncronas, cuyas funciones de
+# ETag y fecha de modificación no pueden usar el ORM síncrono: 'validators_func' es una corrutina que
+# devuelve ambas (o None). Responde 304 o 412 sin ejecutar la vista y añade las cabeceras a la respuesta.
+def async_condition(validators_func):
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag, last_modified = await validators_func(request, *args, **kwargs)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ('GET', 'HEAD'):
+                if timestamp and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(timestamp)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+
+            return response
+        return inner
+    return decorator
@@ -1,41 +1,30 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import authentication_classes, permission_classes
+from rest_framework.decorators import authentication_classes, permission_classes, parser_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.settings import api_settings
 from .models import Book
-from .serializers import BookSerializer
-
-
-# Decorador personalizado para verificar si el usuario es propietario del libro
-def check_book_owner(view_func):
-    def wrapper(request, *args, **kwargs):
-        try:
-            # Intenta obtener el libro basado en la clave primaria (pk) proporcionada en los argumentos de la solicitud
-            book = Book.objects.get(pk=kwargs['pk'])
-        except Book.DoesNotExist:
-            # Si el libro no existe, devuelve una respuesta con el mensaje de error correspondiente
-            return Response({
-                'message': 'Book not found'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Comprueba si el usuario actual es propietario del libro
-        if book.user != request.user:
-            # Si el usuario no es el propietario, devuelve una respuesta de error de permiso
-            return Response({
-                'message': 'You are not allowed to access this book'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Si el usuario es propietario, llama a la función de vista original con los mismos argumentos
-        return view_func(request, *args, **kwargs)
-    
-    return wrapper
+from .serializers import BookBulkSelectionSerializer, BookBulkUpdateSerializer, BookSerializer, serialize_book
+from .pagination import InvalidCursor, get_page_size, paginate_keyset
+from .parsers import NDJSONParser
+from .export import EXPORT_FORMATS
+from .cache import cached_response
+from .permissions import check_book_owner, get_owned_books
+from .fieldsets import KEYSET_FIELDS, Fieldset, InvalidFieldset
+from .versions import book_etag, book_last_modified, changes_etag, changes_last_modified, get_library, if_match_passes, library_etag, library_last_modified, make_book_etag
+from .changes import InvalidSyncToken, SyncTokenExpired, get_changes
+from . import bulk
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import condition
 
 
 # Vista para la creación de un nuevo libro
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 def create_book(request):
     # Serializar los datos recibidos en la solicitud
@@ -59,66 +48,249 @@ def create_book(request):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 
-# Vista para obtener todos los libros asociados al usuario actual
+# Vista para la importación masiva de libros (array JSON o NDJSON)
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def import_books(request):
+    rows = request.data
+
+    # Verifica que se haya recibido una lista de libros
+    if not isinstance(rows, list) or not rows:
+        return Response({
+            'message': 'Error when importing books',
+            'errors': 'Expected a non-empty list of books'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Obtiene el tamaño de bloque solicitado respetando el máximo configurado
+    try:
+        batch_size = int(request.GET.get('batch_size', settings.BOOKS_IMPORT_BATCH_SIZE))
+    except ValueError:
+        batch_size = settings.BOOKS_IMPORT_BATCH_SIZE
+    batch_size = max(1, min(batch_size, settings.BOOKS_IMPORT_MAX_BATCH_SIZE))
+
+    # Importa los libros válidos y recoge los errores de las filas inválidas
+    created, errors = bulk.import_books(request.user, rows, batch_size)
+
+    # Si ninguna fila es válida, devuelve los errores de validación
+    if not created:
+        return Response({
+            'message': 'Error when importing books',
+            'errors': errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'message': 'Successfully imported books',
+        'created': len(created),
+        'ids': created,
+        'errors': errors
+    }, status=status.HTTP_201_CREATED)
+
+
+# Vista para obtener todos los libros asociados al usuario actual, paginados por cursor
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@condition(etag_func=library_etag, last_modified_func=library_last_modified)
+@cached_response('list', library_etag)
 def get_all_books(request):
-    # Filtra los libros pertenecientes al usuario actual
+    # Obtiene los campos solicitados con ?fields= y ?expand= (por defecto, la representación completa)
+    try:
+        fieldset = Fieldset.from_request(request)
+    except InvalidFieldset:
+        return Response({
+            'message': 'Invalid fields or expand parameter'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Filtra los libros pertenecientes al usuario actual cargando autor y géneros en bloque,
+    # o solo las columnas y relaciones que pide el fieldset
     books = Book.objects.filter(user=request.user)
+    if fieldset is not None:
+        books = fieldset.apply(books, extra=KEYSET_FIELDS)
+    else:
+        books = books.select_related('author').prefetch_related('genre')
+
+    cursor = request.GET.get('cursor')
 
-    # Si no se encuentran libros, devuelve un mensaje de error
-    if not books:
+    # Obtiene la página solicitada con paginación keyset sobre el ordenamiento indicado
+    try:
+        books, next_cursor, previous_cursor = paginate_keyset(
+            books,
+            ordering=request.GET.get('ordering', 'id'),
+            cursor=cursor,
+            page_size=get_page_size(request)
+        )
+    except InvalidCursor:
+        return Response({
+            'message': 'Invalid cursor or ordering'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Si no se encuentran libros en la primera página, devuelve un mensaje de error
+    if not books and not cursor:
         return Response({
             'message': 'Books not found for the current user'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    # Serializa los libros encontrados y devuelve una respuesta con ellos
-    serializer = BookSerializer(books, many=True)
+    # Serializa los libros de la página y devuelve una respuesta con ellos y los cursores
+    if fieldset is not None:
+        data = [fieldset.render(book) for book in books]
+    else:
+        data = [serialize_book(book) for book in books]
 
     return Response({
         'message': 'Correctly obtained books for the current user',
-        'Books': serializer.data
+        'Books': data,
+        'next': next_cursor,
+        'previous': previous_cursor
     }, status=status.HTTP_200_OK)
 
 
-# Vista para obtener un libro específico por su clave primaria (pk)
+# Vista del feed de cambios para la sincronización incremental: devuelve, paginados, los libros
+# creados, modificados o eliminados desde el token 'since' (sin token, la biblioteca completa) y el
+# token con el que pedir la página siguiente o, al terminar, los cambios posteriores. Con la ETag de la
+# biblioteca, una consulta sin cambios responde 304.
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
-@check_book_owner
-def get_book_by_pk(request, pk):
-    # Obtiene el libro por su clave primaria (pk)
-    book = Book.objects.get(pk=pk)
+@condition(etag_func=changes_etag, last_modified_func=changes_last_modified)
+def get_changes_feed(request):
+    token = request.GET.get('since') or None
 
-    # Serializa el libro encontrado y devuelve una respuesta con él
-    serializer = BookSerializer(book)
+    try:
+        changes, next_token, has_more = get_changes(get_library(request, primary=True), token, get_page_size(request))
+    except InvalidSyncToken:
+        return Response({
+            'message': 'Invalid since token'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    # Los registros de eliminaciones posteriores al token ya se han purgado
+    except SyncTokenExpired:
+        return Response({
+            'message': 'Sync token expired, a full sync is required'
+        }, status=status.HTTP_410_GONE)
+
+    return Response({
+        'message': 'Correctly obtained changes',
+        'changes': changes,
+        'since': next_token,
+        'has_more': has_more
+    }, status=status.HTTP_200_OK)
+
+
+# Vista para exportar la biblioteca del usuario actual en NDJSON o CSV, transmitida fila a fila
+@api_view(['GET'])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def export_books(request, export_format):
+    # Comprueba que el formato solicitado esté disponible
+    if export_format not in EXPORT_FORMATS:
+        return Response({
+            'message': 'Unsupported export format'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    generator, content_type = EXPORT_FORMATS[export_format]
+
+    # Devuelve una respuesta en streaming que genera las filas a medida que se leen
+    response = StreamingHttpResponse(
+        generator(Book.objects.filter(user=request.user)),
+        content_type=f'{content_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+
+    return response
+
+
+# Vista para obtener un libro específico por su clave primaria (pk)
+@api_view(['GET'])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@condition(etag_func=book_etag, last_modified_func=book_last_modified)
+@cached_response('detail', book_etag)
+@check_book_owner(fieldsets=True)
+def get_book_by_pk(request, pk, book, fieldset):
+    # Serializa el libro encontrado (completo o con los campos solicitados) y devuelve una respuesta con él
+    data = fieldset.render(book) if fieldset is not None else serialize_book(book)
 
     return Response({
         'message': 'Correctly obtained book',
-        'Book': serializer.data
+        'Book': data
+    }, status=status.HTTP_200_OK)
+
+
+# Vista para obtener varios libros por su clave primaria en una sola solicitud (?ids=1,2,3).
+# Devuelve los libros del usuario en el orden pedido y, para cada id que falta, su estado
+# (404 si no existe, 403 si es de otro usuario). Como el listado, depende de la versión de la
+# biblioteca (ETag y caché de respuestas).
+@api_view(['GET'])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@condition(etag_func=library_etag, last_modified_func=library_last_modified)
+@cached_response('batch', library_etag)
+def get_books_batch(request):
+    # Obtiene los ids solicitados (separados por comas o repetidos) sin duplicados y en orden
+    try:
+        ids = list(dict.fromkeys(int(pk) for value in request.GET.getlist('ids') for pk in value.split(',') if pk.strip()))
+    except ValueError:
+        ids = None
+
+    if not ids or any(pk <= 0 for pk in ids):
+        return Response({
+            'message': 'Invalid ids parameter'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Limita el número de ids por solicitud
+    if len(ids) > settings.BOOKS_BATCH_MAX_IDS:
+        return Response({
+            'message': f'Too many ids (maximum {settings.BOOKS_BATCH_MAX_IDS})'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Obtiene los campos solicitados con ?fields= y ?expand= (por defecto, la representación completa)
+    try:
+        fieldset = Fieldset.from_request(request)
+    except InvalidFieldset:
+        return Response({
+            'message': 'Invalid fields or expand parameter'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Busca los libros del usuario en una única consulta y serializa los encontrados
+    books, errors = get_owned_books(request, ids, fieldset)
+    if fieldset is not None:
+        data = [fieldset.render(book) for book in books]
+    else:
+        data = [serialize_book(book) for book in books]
+
+    return Response({
+        'message': 'Correctly obtained books',
+        'Books': data,
+        'errors': errors
     }, status=status.HTTP_200_OK)
 
 
 # Vista para actualizar un libro existente
 @api_view(['PUT'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 @check_book_owner
-def update_book(request, pk):
-    # Obtiene el libro por su clave primaria (pk)
-    book = Book.objects.get(pk=pk)
+def update_book(request, pk, book):
+    with transaction.atomic():
+        # Con If-Match, comprueba que el libro no haya cambiado desde que el cliente lo leyó
+        if not if_match_passes(request, pk):
+            return Response({
+                'message': 'The book has been modified since it was retrieved'
+            }, status=status.HTTP_412_PRECONDITION_FAILED)
 
-    # Serializa el libro con los datos proporcionados en la solicitud
-    serializer = BookSerializer(book, data=request.data)
+        # Serializa el libro con los datos proporcionados en la solicitud
+        serializer = BookSerializer(book, data=request.data)
 
-    # Si los datos son válidos, guarda el libro actualizado y devuelve una respuesta de éxito
-    if serializer.is_valid():
-        serializer.save()
-        return Response({
-            'message': 'Book updated successfully',
-            'Book': serializer.data
-        }, status=status.HTTP_200_OK)
+        # Si los datos son válidos, guarda el libro actualizado y devuelve una respuesta de éxito con su nueva ETag
+        if serializer.is_valid():
+            serializer.save()
+            response = Response({
+                'message': 'Book updated successfully',
+                'Book': serializer.data
+            }, status=status.HTTP_200_OK)
+            response['ETag'] = make_book_etag(book.pk, book.updated_at)
+            return response
     
     # Si los datos no son válidos, devuelve un mensaje de error y los errores de validación
     return Response({
@@ -129,13 +301,10 @@ def update_book(request, pk):
 
 # Vista para eliminar un libro existente
 @api_view(['DELETE'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
-@check_book_owner
-def delete_book(request, pk):
-    # Obtiene el libro por su clave primaria (pk)
-    book = Book.objects.get(pk=pk)
-
+@check_book_owner(select_related=(), prefetch_related=())
+def delete_book(request, pk, book):
     # Elimina el libro de la base de datos
     book.delete()
 
@@ -143,3 +312,51 @@ def delete_book(request, pk):
     return Response({
         'message': 'Book deleted successfully'
     }, status=status.HTTP_204_NO_CONTENT)
+
+
+# Vista para eliminar en bloque libros del usuario actual, por ids o por filtro
+@api_view(['POST'])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def bulk_delete_books(request):
+    # Valida la selección de libros (ids o filtro)
+    serializer = BookBulkSelectionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'message': 'Error when deleting books',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Elimina los libros seleccionados con unas pocas sentencias en una única transacción
+    ids, errors = bulk.delete_books(request.user, serializer.validated_data)
+
+    return Response({
+        'message': 'Books deleted successfully',
+        'deleted': len(ids),
+        'ids': ids,
+        'errors': errors
+    }, status=status.HTTP_200_OK)
+
+
+# Vista para modificar en bloque el año de publicación o los géneros de libros del usuario actual
+@api_view(['PATCH'])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def bulk_update_books(request):
+    # Valida la selección de libros y los cambios solicitados
+    serializer = BookBulkUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'message': 'Error updating books',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Aplica los cambios a todos los libros seleccionados con unas pocas sentencias en una única transacción
+    ids, errors = bulk.update_books(request.user, serializer.validated_data)
+
+    return Response({
+        'message': 'Books updated successfully',
+        'updated': len(ids),
+        'ids': ids,
+        'errors': errors
+    }, status=status.HTTP_200_OK)
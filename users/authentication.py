@@ -0,0 +1,269 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from api.routers import PROCESS_LOCAL_CACHES
+
+
+# Configuración por defecto de la caché de tokens (se sobrescribe con settings.TOKEN_AUTH_CACHE)
+DEFAULTS = {
+    'LOCAL_SIZE': 10000,
+    'LOCAL_TTL': 30,
+    'CACHE_ALIAS': 'token_auth',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+# Caché LRU en memoria del proceso con tiempo de vida por entrada. Cada entrada puede pertenecer a
+# un grupo (por ejemplo el usuario del token) para eliminar todas las del grupo sin recorrer la caché.
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, group=None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, group)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    # Elimina todas las entradas del grupo
+    def delete_group(self, group):
+        with self._lock:
+            for key in list(self._groups.get(group, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._groups.clear()
+            self.hits = self.misses = 0
+
+    # Elimina una entrada y su referencia en el grupo (con el bloqueo ya adquirido)
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None or entry[2] is None:
+            return
+        keys = self._groups.get(entry[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[entry[2]]
+
+    def __len__(self):
+        return len(self._data)
+
+
+_config = get_config()
+token_cache = LRUCache(_config['LOCAL_SIZE'], _config['LOCAL_TTL'])
+
+
+# Caché de las generaciones de los tokens. Cada entrada de la LRU guarda la generación de su token y
+# solo es válida mientras coincida con la de esta caché, que la invalidación elimina: debe ser
+# compartida por todos los procesos para que un token revocado deje de aceptarse en todos ellos.
+def _generations():
+    alias = get_config()['CACHE_ALIAS']
+    cache = caches[alias]
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        raise ImproperlyConfigured(
+            f"CachedTokenAuthentication requires TOKEN_AUTH_CACHE['CACHE_ALIAS'] to be a cache shared between "
+            f"processes, '{alias}' is {type(cache).__name__}"
+        )
+    return cache
+
+
+def _generation_key(key):
+    return f'authtoken:generation:{key}'
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+# Elimina las generaciones de los tokens cuando se confirma la transacción: una solicitud que lea
+# antes el usuario todavía sin cambios obtendría ya la generación nueva y guardaría datos antiguos
+def _expire_generations(keys):
+    keys = [_generation_key(key) for key in keys]
+    if keys:
+        transaction.on_commit(lambda: _generations().delete_many(keys))
+
+
+# Claves de los tokens cargados junto al usuario (select_related('auth_token') o el usuario de la
+# autenticación), o None si no están cargados
+def loaded_token_keys(user):
+    if not User.auth_token.is_cached(user):
+        return None
+    token = User.auth_token.related.get_cached_value(user)
+    return [token.key] if token is not None else []
+
+
+# Invalida las entradas en caché de los tokens de un usuario en todos los procesos
+def invalidate_user_tokens(user_id, keys=None):
+    token_cache.delete_group(user_id)
+
+    if keys is None:
+        keys = list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+    _expire_generations(keys)
+
+
+# Invalida la entrada en caché de un token concreto en todos los procesos
+def invalidate_token(key):
+    token_cache.delete(key)
+    _expire_generations([key])
+
+
+# Métricas de la caché de tokens de este proceso
+def get_token_cache_stats():
+    total = token_cache.hits + token_cache.misses
+    return {
+        'hits': token_cache.hits,
+        'misses': token_cache.misses,
+        'hit_rate': token_cache.hits / total if total else 0.0,
+        'size': len(token_cache),
+    }
+
+
+# Busca la entrada (usuario, token) en la LRU del proceso y la devuelve si su generación sigue vigente
+def _get_cached(key):
+    cached = token_cache.get(key)
+    if cached is None or _generations().get(_generation_key(key)) != cached[2]:
+        return None
+    return cached[:2]
+
+
+async def _aget_cached(key):
+    cached = token_cache.get(key)
+    if cached is None or await _generations().aget(_generation_key(key)) != cached[2]:
+        return None
+    return cached[:2]
+
+
+def _check_active(entry):
+    if not entry[0].is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+
+# Guarda la entrada en la LRU del proceso, agrupada por usuario, con la generación leída antes de
+# consultar la base de datos. Solo se guardan usuarios activos: un usuario inactivo en caché se
+# seguiría rechazando tras reactivarlo.
+def _set_cached(key, entry, generation):
+    token_cache.set(key, (*entry, generation), group=entry[0].pk)
+
+
+# Autenticación por token que evita la consulta Token JOIN User en cada solicitud.
+# Busca primero en la LRU del proceso, comprobando la generación del token en la caché compartida,
+# y solo en último caso en la base de datos. El usuario se copia en cada solicitud para que las
+# vistas puedan modificarlo sin alterar la entrada en caché.
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        entry = _get_cached(key)
+
+        if entry is None:
+            generation = _generations().get_or_set(_generation_key(key), _new_generation, None)
+            entry = super().authenticate_credentials(key)
+            _check_active(entry)
+            _set_cached(key, entry, generation)
+
+        user, token = entry
+        _check_active(entry)
+
+        return copy.copy(user), token
+
+
+# Autenticación por token para vistas asíncronas (ASGI). Usa las mismas cachés que
+# CachedTokenAuthentication y el ORM asíncrono en caso de fallo. Devuelve el usuario,
+# None si no se envían credenciales o lanza AuthenticationFailed si no son válidas.
+async def aauthenticate(request):
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return None
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed('Invalid token header.')
+
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain invalid characters.')
+
+    entry = await _aget_cached(key)
+
+    if entry is None:
+        generation = await _generations().aget_or_set(_generation_key(key), _new_generation, None)
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        entry = (token.user, token)
+        _check_active(entry)
+        _set_cached(key, entry, generation)
+
+    _check_active(entry)
+
+    return copy.copy(entry[0])
+
+
+# Decorador para vistas asíncronas que exige un token válido, con las mismas respuestas 401 que DRF
+def async_token_required(view_func):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await aauthenticate(request)
+        except exceptions.AuthenticationFailed as exc:
+            return _unauthorized(exc.detail)
+
+        if user is None:
+            return _unauthorized(exceptions.NotAuthenticated.default_detail)
+
+        request.user = user
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _unauthorized(detail):
+    response = JsonResponse({'detail': str(detail)}, status=401)
+    response['WWW-Authenticate'] = 'Token'
+    return response
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+# Hashers con coste configurable desde settings. Mantienen el mismo algoritmo que los de Django,
+# por lo que verifican las contraseñas existentes; al cambiar el coste, Django vuelve a calcular
+# el hash de forma transparente en el siguiente inicio de sesión (must_update).
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return getattr(settings, 'PASSWORD_BCRYPT_ROUNDS', hashers.BCryptSHA256PasswordHasher.rounds)
@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user_tokens, loaded_token_keys
+
+
+# Cualquier cambio en el usuario (desactivación, contraseña, etc.) invalida sus tokens en caché
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk, keys=loaded_token_keys(instance))
+
+
+# Eliminar un token lo invalida en la caché
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
@@ -1,9 +1,15 @@
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from api.testing import QueryBudgetMixin, create_budget_library
+from .authentication import get_token_cache_stats, invalidate_user_tokens, token_cache
 
 
 # Tests para el registro
@@ -95,6 +101,56 @@ class SignInTestCase(TestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    # Prueba para comprobar que un inicio de sesión de un usuario activo no escribe en la base de datos
+    def test_sign_in_without_writes(self):
+        Token.objects.create(user=self.user)
+        url = reverse('signIn')
+        data = {'username': 'testuser', 'password': 'testpassword'}
+
+        # Usuario y token en una única consulta
+        with self.assertNumQueries(1):
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token'], self.user.auth_token.key)
+
+    # Prueba para comprobar que un usuario inactivo se reactiva
+    def test_sign_in_reactivates_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        url = reverse('signIn')
+        response = self.client.post(url, {'username': 'testuser', 'password': 'testpassword'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+    # Prueba para comprobar que la contraseña se vuelve a calcular con el hasher preferido
+    def test_sign_in_rehashes_password(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+        with override_settings(PASSWORD_HASHERS=['users.hashers.BCryptSHA256PasswordHasher', 'users.hashers.PBKDF2PasswordHasher'], PASSWORD_BCRYPT_ROUNDS=4):
+            url = reverse('signIn')
+            response = self.client.post(url, {'username': 'testuser', 'password': 'testpassword'}, format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('bcrypt_sha256$$2b$04$'))
+            self.assertTrue(self.user.check_password('testpassword'))
+
+    # Prueba para comprobar que se verifican las contraseñas guardadas con los hashers estándar de
+    # Django que no están entre los configurados, y que se vuelven a calcular con el preferido
+    def test_sign_in_with_stock_hasher(self):
+        self.assertIn('django.contrib.auth.hashers.Argon2PasswordHasher', settings.PASSWORD_HASHERS)
+        User.objects.filter(pk=self.user.pk).update(password=make_password('testpassword', hasher='bcrypt'))
+
+        url = reverse('signIn')
+        response = self.client.post(url, {'username': 'testuser', 'password': 'testpassword'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
 
 # Test para el cierre de sesion del usuario
 class SignOutTestCase(APITestCase):
@@ -112,4 +168,183 @@ class SignOutTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         self.user.refresh_from_db()
-        self.assertFalse(self.user.is_active)
\ No newline at end of file
+        self.assertFalse(self.user.is_active)
+
+
+# Tests para la autenticación por token en caché
+class CachedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        token_cache.clear()
+
+    # Prueba para comprobar que el token solo se consulta en la primera solicitud
+    def test_token_cached(self):
+        url = reverse('get_all_books')
+
+        # Token + versión de la biblioteca (ETag) + libros; después el token ya no se consulta
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        stats = get_token_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    # Prueba para comprobar que el cierre de sesión invalida la caché de inmediato
+    def test_sign_out_invalidates(self):
+        url = reverse('get_all_books')
+        self.client.get(url)
+
+        response = self.client.get('/api/user/signOut')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # Prueba para comprobar que desactivar el usuario fuera de la API invalida la caché
+    def test_deactivation_invalidates(self):
+        url = reverse('get_all_books')
+        self.client.get(url)
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # Prueba para comprobar que un usuario inactivo no se guarda en la caché
+    def test_inactive_user_not_cached(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        response = self.client.get(reverse('get_all_books'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(token_cache), 0)
+
+    # Prueba para comprobar que la LRU se invalida por usuario sin afectar a los demás
+    def test_invalidation_by_user(self):
+        other = User.objects.create_user(username='otheruser', email='other@example.com', password='password123')
+        other_token = Token.objects.create(user=other)
+        self.client.get(reverse('get_all_books'))
+        other_client = APIClient()
+        other_client.credentials(HTTP_AUTHORIZATION='Token ' + other_token.key)
+        other_client.get(reverse('get_all_books'))
+
+        invalidate_user_tokens(self.user.pk)
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertIsNotNone(token_cache.get(other_token.key))
+
+    # Prueba para comprobar que la invalidación llega a la LRU de los demás procesos: su entrada deja
+    # de ser válida al eliminarse la generación del token en la caché compartida
+    def test_invalidation_reaches_other_processes(self):
+        url = reverse('get_all_books')
+        self.client.get(url)
+        other_process_entry = token_cache.get(self.token.key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            invalidate_user_tokens(self.user.pk)
+        token_cache.set(self.token.key, other_process_entry, group=self.user.pk)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # Prueba para comprobar que cerrar sesión invalida el token sin consultar las claves del usuario
+    def test_sign_out_single_invalidation(self):
+        self.client.get(reverse('get_all_books'))
+        token_cache.clear()
+
+        # Token + actualización del usuario
+        with self.assertNumQueries(2):
+            self.client.get('/api/user/signOut')
+
+    # Prueba para comprobar que una caché de generaciones local al proceso no se admite
+    @override_settings(CACHES={**settings.CACHES, 'token_auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_requires_shared_generation_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.client.get(reverse('get_all_books'))
+
+    # Prueba para comprobar que una cabecera Authorization antigua no impide registrarse ni iniciar sesión
+    def test_sign_in_ignores_stale_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        response = self.client.post(reverse('signIn'), {'username': 'testuser', 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = {'username': 'newuser', 'password': 'password123', 'email': 'new@example.com'}
+        response = self.client.post(reverse('signUp'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    # Prueba para comprobar que tras cerrar sesión, usar el token e iniciar sesión otra vez el token vuelve a ser válido
+    def test_sign_in_after_sign_out(self):
+        url = reverse('get_changes_feed')
+        self.client.get('/api/user/signOut')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(reverse('signIn'), {'username': 'testuser', 'password': 'password123'}, format='json')
+        self.assertEqual(response.data['token'], self.token.key)
+
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    # Prueba para comprobar que la reactivación al iniciar sesión invalida una entrada inactiva en caché
+    def test_sign_in_invalidates_inactive_entry(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.user.is_active = False
+        generation = caches['token_auth'].get_or_set(f'authtoken:generation:{self.token.key}', 'generation', None)
+        token_cache.set(self.token.key, (self.user, self.token, generation), group=self.user.pk)
+
+        self.client.post(reverse('signIn'), {'username': 'testuser', 'password': 'password123'}, format='json')
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(self.client.get(reverse('get_changes_feed')).status_code, status.HTTP_200_OK)
+
+    # Prueba para comprobar que eliminar el token invalida la caché
+    def test_token_deletion_invalidates(self):
+        url = reverse('get_all_books')
+        self.client.get(url)
+
+        self.token.delete()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+# Presupuestos de consultas y tiempo de respuesta de los endpoints de usuarios: no dependen
+# del número de libros de la biblioteca
+class UserQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        token_cache.clear()
+
+    # Existencia del nombre de usuario (serializador y vista) + usuario + versión de la biblioteca + token
+    def test_sign_up_budget(self):
+        data = {'username': 'budgetuser', 'password': 'budget-password', 'email': 'budget@example.com'}
+        response = self.assertWithinBudget(lambda: APIClient().post(reverse('signUp'), data, format='json'), max_queries=8, max_ms=2000)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    # Usuario y token en una única consulta; el tiempo lo domina el hash de la contraseña
+    def test_sign_in_budget(self):
+        responses = self.assertBudgetBySize(
+            lambda size: create_budget_library(size, password='budget-password')[1][0].user.username,
+            lambda username: APIClient().post(reverse('signIn'), {'username': username, 'password': 'budget-password'}, format='json'),
+            max_queries=1, max_ms=2000
+        )
+
+        for response in responses.values():
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Token + actualización del usuario
+    def test_sign_out_budget(self):
+        responses = self.assertBudgetBySize(
+            create_budget_library,
+            lambda context: context[0].get(reverse('signOut')),
+            max_queries=2, max_ms=200
+        )
+
+        for response in responses.values():
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
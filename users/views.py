@@ -4,16 +4,18 @@ from rest_framework.authtoken.models import Token
 from rest_framework import status
 from rest_framework.decorators import authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from .serializers import UserSerializer
+from .authentication import invalidate_user_tokens, loaded_token_keys
 from datetime import datetime
 
 
 # Logica para el registro del usuario
 @api_view(['POST'])
+@authentication_classes([])
 def signUp(request):
     # Serializa los datos recibidos en la solicitud
     serializer = UserSerializer(data=request.data)
@@ -58,6 +60,7 @@ def signUp(request):
 
 # Logica para el inicio de sesion del usuario
 @api_view(['POST'])
+@authentication_classes([])
 def signIn(request):
     # Obtiene el nombre de usuario y la contraseña de la solicitud
     username = request.data.get('username', '')
@@ -69,21 +72,28 @@ def signIn(request):
             'error': 'Username and password are required fields'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Busca el usuario en la base de datos por el nombre de usuario
-    user = get_object_or_404(User, username=username)
+    # Busca el usuario y su token en una única consulta
+    user = get_object_or_404(User.objects.select_related('auth_token'), username=username)
 
-    # Verifica si la contraseña proporcionada coincide con la contraseña almacenada
+    # Verifica si la contraseña proporcionada coincide con la contraseña almacenada.
+    # Si el hash usa un hasher o un coste distinto del configurado, Django lo recalcula aquí.
     if not user.check_password(password):
         return Response({
             'error': 'Invalid password'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Modificar el campo de 'is_active'
-    user.is_active = True
-    user.save()
+    # Reactiva el usuario solo si estaba inactivo, con un UPDATE condicional de una sola columna.
+    # update() no envía señales: se invalidan aquí sus tokens en la caché de autenticación.
+    if not user.is_active:
+        User.objects.filter(pk=user.pk, is_active=False).update(is_active=True)
+        user.is_active = True
+        invalidate_user_tokens(user.pk, keys=loaded_token_keys(user))
 
-    # Obtiene o crea un token de autenticación para el usuario
-    token, created = Token.objects.get_or_create(user=user)
+    # Obtiene el token cargado junto al usuario o lo crea si todavía no existe
+    try:
+        token = user.auth_token
+    except Token.DoesNotExist:
+        token, created = Token.objects.get_or_create(user=user)
 
     # Serializa los datos del usuario para la respuesta
     serializer = UserSerializer(instance=user)
@@ -102,7 +112,7 @@ def signIn(request):
 
 # Logica para desconectar al usuario
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 def signOut(request):
     # Obtener el usuario actual
@@ -113,8 +123,8 @@ def signOut(request):
     # user.last_login = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     user.is_active = False
 
-    # Guardar el usuario
-    user.save()
+    # Guardar solo los campos modificados (la señal post_save invalida el token en la caché de autenticación)
+    user.save(update_fields=['last_login', 'is_active'])
 
     return Response({
         'message': 'User signed out successfully'